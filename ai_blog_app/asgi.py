@@ -12,5 +12,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_blog_app.settings')
+# An ASGI server runs each sync part of a request on a fresh thread, so a
+# persistent connection would never be reused and would stay open until it
+# timed out. Unless DB_CONN_MAX_AGE is set, connections here are closed at
+# the end of each request instead. To reuse them, set DB_POOL_MAX_SIZE for a
+# connection pool in each process (see settings.py), or put PgBouncer in
+# front of the database.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
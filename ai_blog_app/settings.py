@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog_generator.middleware.timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,14 +89,44 @@ WSGI_APPLICATION = 'ai_blog_app.wsgi.application'
 # }
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'Blog Database',
-        'USER': 'postgres',
-        'PASSWORD': 'root0',
-        'HOST': 'localhost',
-        'PORT': 5432,
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
+        'NAME': os.getenv('DB_NAME', 'Blog Database'),
+        'USER': os.getenv('DB_USER', 'postgres'),
+        'PASSWORD': os.getenv('DB_PASSWORD', 'root0'),
+        'HOST': os.getenv('DB_HOST', 'localhost'),
+        'PORT': int(os.getenv('DB_PORT', 5432)),
+        # Each worker thread keeps its connection for this many seconds
+        # instead of connecting for every request, and checks that it still
+        # works before reusing it. asgi.py turns this off by default (see
+        # there).
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# With DB_POOL_MAX_SIZE, each process keeps a pool of up to that many
+# connections and lends them to whichever thread runs a query, which also
+# works under ASGI. It needs psycopg 3 with its pool (psycopg[pool]) in place
+# of psycopg2, and replaces the persistent connections above.
+if os.getenv('DB_POOL_MAX_SIZE'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE')),
+        },
+    }
+# A read replica of the primary, used by the read-only views (see
+# blog_generator/db_router.py). DB_REPLICA_HOST, or DB_REPLICA_NAME for two
+# local SQLite files, turns it on; the other settings default to the primary's.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': int(os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT'])),
+        # Tests read the rows they wrote to the primary.
+        'TEST': {'MIRROR': 'default'},
+    }
 # import psycopg2
 # conn = psycopg2.connect(
 #     dbname="Blog Database",
@@ -158,8 +189,176 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
+# Longest the mail sender waits for the SMTP server at each step. It also
+# bounds how long the sender keeps queued messages to itself (see
+# blog_generator/outbox.py).
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 30))  # seconds
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
 # API Keys
 ASSEMBLYAI_API_KEY = os.getenv('ASSEMBLYAI_API_KEY')
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
\ No newline at end of file
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Video cache (transcripts and generated articles keyed by YouTube video id)
+VIDEO_CACHE_TTL = int(os.getenv('VIDEO_CACHE_TTL', 60 * 60 * 24 * 7))  # seconds
+VIDEO_CACHE_MAX_ENTRIES = int(os.getenv('VIDEO_CACHE_MAX_ENTRIES', 1000))
+VIDEO_CACHE_LEASE_TIMEOUT = int(os.getenv('VIDEO_CACHE_LEASE_TIMEOUT', 60 * 15))  # seconds
+
+# Extracted YouTube metadata is kept in the default cache for this long, so the
+# title lookup, the download and resubmissions share one extraction.
+YOUTUBE_METADATA_CACHE_TTL = int(os.getenv('YOUTUBE_METADATA_CACHE_TTL', 60 * 10))  # seconds
+
+# When served through asgi.py, run newly submitted jobs on the server's own
+# event loop instead of waiting for a run_blog_workers process.
+BLOG_ASGI_INLINE_JOBS = os.getenv('BLOG_ASGI_INLINE_JOBS', 'False') == 'True'
+
+# Optional AssemblyAI completion webhook. When set to the public URL of the
+# assemblyai-webhook view, jobs wait for the callback instead of polling.
+ASSEMBLYAI_WEBHOOK_URL = os.getenv('ASSEMBLYAI_WEBHOOK_URL')
+ASSEMBLYAI_WEBHOOK_SECRET = os.getenv('ASSEMBLYAI_WEBHOOK_SECRET')
+
+# Audio longer than TRANSCRIPTION_CHUNK_THRESHOLD seconds is split into
+# overlapping chunks that are transcribed in parallel and stitched together.
+TRANSCRIPTION_CHUNK_THRESHOLD = int(os.getenv('TRANSCRIPTION_CHUNK_THRESHOLD', 60 * 30))  # seconds
+TRANSCRIPTION_CHUNK_SECONDS = int(os.getenv('TRANSCRIPTION_CHUNK_SECONDS', 60 * 10))
+TRANSCRIPTION_CHUNK_OVERLAP = int(os.getenv('TRANSCRIPTION_CHUNK_OVERLAP', 15))
+TRANSCRIPTION_CHUNK_CONCURRENCY = int(os.getenv('TRANSCRIPTION_CHUNK_CONCURRENCY', 8))
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+
+# Write articles one section per AssemblyAI chapter, in parallel Gemini
+# calls, when the transcript has chapters. Otherwise one prompt is used.
+BLOG_CHAPTERED_GENERATION = os.getenv('BLOG_CHAPTERED_GENERATION', 'True') == 'True'
+BLOG_SECTION_CONCURRENCY = int(os.getenv('BLOG_SECTION_CONCURRENCY', 6))
+
+# Posts per page on blog-list and in each blog-list/page request.
+BLOG_LIST_PAGE_SIZE = int(os.getenv('BLOG_LIST_PAGE_SIZE', 20))
+
+# How long a rendered article on blog-details stays in the default cache.
+# Saving or deleting the post drops it sooner.
+BLOG_DETAIL_CACHE_TTL = int(os.getenv('BLOG_DETAIL_CACHE_TTL', 60 * 60 * 24))  # seconds
+
+# Batch mode: most videos queued from one request or generate_batch run.
+BATCH_MAX_VIDEOS = int(os.getenv('BATCH_MAX_VIDEOS', 500))
+
+# Caps on how many jobs an async worker runs in each stage at once, below its
+# overall --concurrency (0 = no separate cap). Keeps a large batch from sending
+# every job to AssemblyAI or Gemini at the same moment.
+BLOG_TRANSCRIPTION_CONCURRENCY = int(os.getenv('BLOG_TRANSCRIPTION_CONCURRENCY', 0))
+BLOG_GENERATION_CONCURRENCY = int(os.getenv('BLOG_GENERATION_CONCURRENCY', 0))
+
+# Threads an async worker runs the blocking stages on (title lookup, audio
+# upload, database writes). Each holds at most one database connection. 0
+# runs the stages one at a time on the thread Django keeps for sync code.
+BLOG_WORKER_THREADS = int(os.getenv('BLOG_WORKER_THREADS', 8))
+
+# Limits on calls to each external backend, shared by every process through
+# the default cache and the database (see blog_generator/limits.py): at most
+# `concurrency` calls at once and `rate` calls per second after a burst of
+# `burst`. 0 turns a limit off.
+BACKEND_LIMITS = {
+    'youtube': {
+        'concurrency': int(os.getenv('YOUTUBE_MAX_CONCURRENCY', 8)),
+        'rate': float(os.getenv('YOUTUBE_RATE_PER_SECOND', 0)),
+        'burst': int(os.getenv('YOUTUBE_RATE_BURST', 10)),
+    },
+    'assemblyai': {
+        'concurrency': int(os.getenv('ASSEMBLYAI_MAX_CONCURRENCY', 5)),
+        'rate': float(os.getenv('ASSEMBLYAI_RATE_PER_SECOND', 0)),
+        'burst': int(os.getenv('ASSEMBLYAI_RATE_BURST', 5)),
+    },
+    'gemini': {
+        'concurrency': int(os.getenv('GEMINI_MAX_CONCURRENCY', 8)),
+        'rate': float(os.getenv('GEMINI_RATE_PER_SECOND', 0)),
+        'burst': int(os.getenv('GEMINI_RATE_BURST', 5)),
+    },
+}
+# Longest a call waits for a token or slot before failing with BackendBusy.
+BACKEND_WAIT_TIMEOUT = int(os.getenv('BACKEND_WAIT_TIMEOUT', 60 * 10))  # seconds
+# A slot whose holder died is freed after this long.
+BACKEND_SLOT_TIMEOUT = int(os.getenv('BACKEND_SLOT_TIMEOUT', 60 * 30))  # seconds
+# How long every caller holds off a backend after it answers 429.
+BACKEND_RATE_LIMIT_BACKOFF = int(os.getenv('BACKEND_RATE_LIMIT_BACKOFF', 30))  # seconds
+
+# Per-user quotas checked before a job is queued; over them the request gets
+# 429 with Retry-After. 0 = no limit.
+USER_MAX_ACTIVE_JOBS = int(os.getenv('USER_MAX_ACTIVE_JOBS', 10))
+USER_DAILY_JOB_LIMIT = int(os.getenv('USER_DAILY_JOB_LIMIT', 0))
+# Refuse new work while this many jobs are waiting for a worker. 0 = no limit.
+MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 0))
+
+# Bearer token that lets Prometheus scrape /metrics. Staff users can also
+# read it when logged in.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Send a Server-Timing header with the time each request spent per stage,
+# for debugging in the browser's network panel. It exposes internal timings,
+# so it is off by default.
+BLOG_TIMING_HEADER = os.getenv('BLOG_TIMING_HEADER', 'False') == 'True'
+
+# Build the AssemblyAI and Gemini clients at startup (when their keys are
+# set) instead of on the first job. No request is sent. This imports the
+# SDKs, so it is off by default for web processes; run_blog_workers always
+# warms its workers up.
+BLOG_CLIENT_WARM_UP = os.getenv('BLOG_CLIENT_WARM_UP', 'False') == 'True'
+
+# Short videos are piped from YouTube through FFmpeg straight into the
+# AssemblyAI upload, without a temp file. Long ones (cut into chunks) and
+# videos without a direct audio URL are downloaded to MEDIA_ROOT/temp_audio.
+AUDIO_STREAMING = os.getenv('AUDIO_STREAMING', 'True') == 'True'
+# Pass the native audio stream through instead of transcoding it to mono
+# Opus: less CPU, a larger upload.
+AUDIO_STREAM_COPY = os.getenv('AUDIO_STREAM_COPY', 'False') == 'True'
+# Downloads larger than this are refused.
+AUDIO_DOWNLOAD_MAX_BYTES = int(os.getenv('AUDIO_DOWNLOAD_MAX_BYTES', 500 * 1024 * 1024))
+# temp_audio files older than this were left by a crashed worker and are
+# removed by clean_temp_audio (also run when run_blog_workers starts).
+TEMP_AUDIO_MAX_AGE = int(os.getenv('TEMP_AUDIO_MAX_AGE', 60 * 60 * 6))  # seconds
+
+# The login form signs in by email (see blog_generator/auth_backends.py);
+# ModelBackend keeps username logins working for the admin.
+AUTHENTICATION_BACKENDS = [
+    'blog_generator.auth_backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+# 'django.contrib.sessions.backends.cached_db' serves sessions from the
+# cache and writes through to the database. It saves a query on every request
+# only when the cache is Redis (REDIS_URL).
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
+# Mail is queued in the database and sent by `manage.py run_mail_sender`,
+# this many messages per SMTP connection. A message is given up after
+# MAIL_MAX_ATTEMPTS failed attempts.
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 8))
+# How long a password reset link works.
+PASSWORD_RESET_TOKEN_TTL = int(os.getenv('PASSWORD_RESET_TOKEN_TTL', 60 * 60))  # seconds
+
+# Read-only views read from these database aliases (see
+# blog_generator/db_router.py). After a client sees one of its jobs finish,
+# its reads stay on the primary for DB_REPLICA_PIN_SECONDS, longer than the
+# replica lag. A replica that cannot be reached is skipped for
+# DB_REPLICA_RETRY_SECONDS.
+DATABASE_ROUTERS = ['blog_generator.db_router.PrimaryReplicaRouter']
+DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+DB_REPLICA_RETRY_SECONDS = int(os.getenv('DB_REPLICA_RETRY_SECONDS', 30))
+
+# The default cache holds what every web and worker process must share: the
+# backend rate limits, the YouTube metadata and the rendered articles. It is
+# kept in the database (see blog_generator/cache_backends.py)
+# unless REDIS_URL points at a Redis server, which is faster and needs the
+# redis package.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'blog_generator.cache_backends.DatabaseCache',
+            'LOCATION': 'blog_cache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+        }
+    }
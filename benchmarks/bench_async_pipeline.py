@@ -0,0 +1,107 @@
+"""Compare the sync (WSGI-style) and async (ASGI-style) generation paths.
+
+    python -m benchmarks.bench_async_pipeline --jobs 200 --threads 8 --concurrency 200
+
+All backends are stubbed (see benchmarks/stubs.py), so the numbers show how
+many jobs each execution model keeps in flight while they wait on I/O:
+
+* wsgi: a fixed pool of threads, one job per thread, as when every
+  generation occupied a WSGI worker thread for its whole duration.
+* asgi: one event loop running jobs.awork, as under asgi.py or
+  ``run_blog_workers --async``.
+"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import django_env
+
+django_env.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connections  # noqa: E402
+
+from blog_generator import jobs  # noqa: E402
+from blog_generator.models import BlogPost, GenerationJob  # noqa: E402
+
+from . import stubs  # noqa: E402
+
+
+def _enqueue(user, count, offset):
+    for i in range(count):
+        jobs.enqueue_job(user, f"https://www.youtube.com/watch?v=bench{offset + i:06d}")
+
+
+def _run_wsgi(threads):
+    peak_threads = threading.active_count()
+
+    def worker(index):
+        nonlocal peak_threads
+        try:
+            while True:
+                job = jobs.claim_next_job(f"wsgi-{index}")
+                if job is None:
+                    return
+                peak_threads = max(peak_threads, threading.active_count())
+                jobs.run_job(job)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return peak_threads
+
+
+def _run_asgi(concurrency):
+    peak_threads = threading.active_count()
+
+    async def main():
+        nonlocal peak_threads
+        task = asyncio.create_task(jobs.awork('asgi', concurrency=concurrency, poll_interval=0.01, once=True))
+        while not task.done():
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+        await task
+
+    asyncio.run(main())
+    return peak_threads
+
+
+def _report(mode, count, elapsed, peak_threads):
+    completed = GenerationJob.objects.filter(status=GenerationJob.STATUS_COMPLETED).count()
+    print(
+        f"{mode:5}  jobs={count:5d}  completed={completed:5d}  wall={elapsed:7.2f}s  "
+        f"throughput={count / elapsed:7.2f} jobs/s  peak_threads={peak_threads}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads.')
+    parser.add_argument('--concurrency', type=int, default=100, help='Jobs in flight on the ASGI event loop.')
+    parser.add_argument('--transcription-latency', type=float, default=1.0)
+    parser.add_argument('--generation-latency', type=float, default=0.5)
+    args = parser.parse_args()
+
+    latencies = stubs.Latencies(transcription=args.transcription_latency, generation=args.generation_latency)
+    with django_env.test_database(), stubs.install(latencies):
+        user = User.objects.create_user(username='bench', email='bench@example.com', password='bench')
+
+        for offset, (mode, run, width) in enumerate([
+            ('wsgi', _run_wsgi, args.threads),
+            ('asgi', _run_asgi, args.concurrency),
+        ]):
+            GenerationJob.objects.all().delete()
+            BlogPost.objects.all().delete()
+            # Distinct video ids per mode so the second run cannot hit the cache.
+            _enqueue(user, args.jobs, offset * args.jobs)
+            started = time.perf_counter()
+            peak_threads = run(width)
+            _report(mode, args.jobs, time.perf_counter() - started, peak_threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Per-job cost of setting up the AssemblyAI and Gemini clients.
+
+    python -m benchmarks.bench_clients --calls 200
+
+Compares, without sending any request:
+
+* per-call: what each job used to do, i.e. set aai.settings.api_key and
+  build a Transcriber, then genai.configure() and a new GenerativeModel
+  with its generation config, plus the gRPC client that configure() had
+  just discarded and the model's first call has to rebuild,
+* pooled: clients.transcriber() and clients.blog_model(), the shared
+  clients of blog_generator/clients.py.
+
+It reports the median and p95 microseconds per job for each, and how long
+building the pooled clients took once (what warm_up() pays at startup).
+"""
+import argparse
+import statistics
+import time
+
+from . import django_env
+
+django_env.setup()
+
+import assemblyai as aai  # noqa: E402
+import google.generativeai as genai  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from google.generativeai import GenerativeModel  # noqa: E402
+from google.generativeai import client as genai_client  # noqa: E402
+
+from blog_generator import clients  # noqa: E402
+
+ASSEMBLYAI_KEY = 'bench-assemblyai-key'
+GEMINI_KEY = 'bench-gemini-key'
+
+
+def per_call():
+    aai.settings.api_key = ASSEMBLYAI_KEY
+    aai.Transcriber()
+    genai.configure(api_key=GEMINI_KEY)
+    model = GenerativeModel(clients.GEMINI_MODEL)
+    model.generation_config = clients.GENERATION_CONFIG
+    genai_client.get_default_generative_client()
+
+
+def pooled():
+    clients.transcriber()
+    clients.blog_model()
+    genai_client.get_default_generative_client()
+
+
+def _timings(setup, calls):
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        setup()
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200, help='Jobs to simulate per mode.')
+    args = parser.parse_args()
+
+    with override_settings(ASSEMBLYAI_API_KEY=ASSEMBLYAI_KEY, GEMINI_API_KEY=GEMINI_KEY):
+        clients.reset()
+        started = time.perf_counter()
+        clients.warm_up()
+        print(f"warm-up   once={(time.perf_counter() - started) * 1e6:10.1f}us")
+        for mode, setup in [('per-call', per_call), ('pooled', pooled)]:
+            # Untimed first call: per-call's configure() also drops the SDK's
+            # default client that the pooled model uses.
+            setup()
+            median, p95 = _timings(setup, args.calls)
+            print(f"{mode:8}  median={median:10.1f}us  p95={p95:10.1f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Offline load test of the web views, with every backend stubbed.
+
+    python -m benchmarks.bench_load --scenarios generate list detail --concurrency 1 8 32 --requests 20
+
+Clients call the views through Django's test client, one thread per client
+and one user per client, as a threaded WSGI server would. A worker runs
+jobs.awork on its own event loop, like ``run_blog_workers --async``. The
+scenarios are:
+
+* generate: POST generate-blog, then poll job-status until the job is done;
+  the latency is the whole wait, the job counts as an error if it fails,
+* list: GET blog-list,
+* detail: GET blog-details of one of the client's posts.
+
+YouTube, AssemblyAI and Gemini are the stand-ins of benchmarks/stubs.py;
+their latency, failure rate and payload sizes are set with the --*-latency,
+--*-failure-rate and payload options. For each scenario and concurrency
+level the script reports throughput, p50/p95/p99 latency, errors and peak
+memory: the process's peak RSS and, with --tracemalloc, the peak of Python
+allocations during that run.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from . import django_env
+
+django_env.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from blog_generator import jobs  # noqa: E402
+from blog_generator.models import BlogPost  # noqa: E402
+
+from . import stubs  # noqa: E402
+
+JOB_POLL_INTERVAL = 0.05
+JOB_TIMEOUT = 300
+ARTICLE = '<h1>Seeded Article</h1>' + '<p>' + 'word ' * 800 + '</p>'
+
+
+class Workers:
+    """jobs.awork on an event loop in a background thread, until stop()."""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(jobs.awork('bench-worker', concurrency=self.concurrency, poll_interval=0.02))
+        self._started.set()
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+
+    def start(self):
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._task.cancel)
+        self._thread.join()
+
+
+class Scenario:
+    def __init__(self, user, post_ids, rng):
+        self.client = Client()
+        self.client.force_login(user)
+        self.post_ids = post_ids
+        self.rng = rng
+
+    def generate(self, index):
+        link = f"https://www.youtube.com/watch?v=load{index:07d}"
+        response = self.client.post(reverse('generate-blog'), data=json.dumps({'link': link}), content_type='application/json')
+        if response.status_code != 202:
+            return False
+        status_url = reverse('job-status', args=[response.json()['job_id']])
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while time.monotonic() < deadline:
+            status = self.client.get(status_url).json()['status']
+            if status in ('completed', 'failed'):
+                return status == 'completed'
+            time.sleep(JOB_POLL_INTERVAL)
+        return False
+
+    def list(self, index):
+        return self.client.get(reverse('blog-list')).status_code == 200
+
+    def detail(self, index):
+        return self.client.get(reverse('blog-details', args=[self.rng.choice(self.post_ids)])).status_code == 200
+
+
+def _seed_users(count, posts_per_user):
+    users = []
+    for i in range(count):
+        user, _created = User.objects.get_or_create(username=f'load{i}', defaults={'email': f'load{i}@example.com'})
+        missing = posts_per_user - BlogPost.objects.filter(user=user).count()
+        for j in range(max(missing, 0)):
+            BlogPost.objects.create(
+                user=user,
+                youtube_title=f'Seeded post {j}',
+                youtube_link=f'https://www.youtube.com/watch?v=seed{i:03d}{j:04d}',
+                generated_content=ARTICLE,
+            )
+        users.append((user, list(BlogPost.objects.filter(user=user).values_list('id', flat=True))))
+    return users
+
+
+def _percentile(sorted_values, percent):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method='inclusive')[percent - 1]
+
+
+def run_level(scenario, concurrency, requests, users, next_index, seed):
+    results = []
+    lock = threading.Lock()
+
+    def client(number):
+        user, post_ids = users[number]
+        driver = Scenario(user, post_ids, random.Random(seed + number))
+        request = getattr(driver, scenario)
+        try:
+            for _ in range(requests):
+                with lock:
+                    index = next(next_index)
+                started = time.perf_counter()
+                try:
+                    ok = request(index)
+                except Exception:
+                    ok = False
+                with lock:
+                    results.append((time.perf_counter() - started, ok))
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def _report(scenario, concurrency, results, elapsed, heap_peak):
+    latencies = sorted(latency * 1000 for latency, _ok in results)
+    errors = sum(not ok for _latency, ok in results)
+    # ru_maxrss is in kilobytes on Linux.
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    line = (
+        f"{scenario:8}  c={concurrency:3d}  requests={len(results):5d}  errors={errors:4d}  "
+        f"throughput={len(results) / elapsed:8.2f}/s  p50={_percentile(latencies, 50):8.1f}ms  "
+        f"p95={_percentile(latencies, 95):8.1f}ms  p99={_percentile(latencies, 99):8.1f}ms  peak_rss={rss_mb:7.1f}MB"
+    )
+    if heap_peak is not None:
+        line += f"  peak_heap={heap_peak / 1024 / 1024:7.1f}MB"
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=['generate', 'list', 'detail'], default=['generate', 'list', 'detail'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='Concurrent clients to test.')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per client at each level.')
+    parser.add_argument('--posts', type=int, default=50, help='Posts seeded per client user.')
+    parser.add_argument('--worker-concurrency', type=int, default=100, help='Jobs in flight in the worker.')
+    parser.add_argument('--backend-limits', action='store_true', help='Keep the configured BACKEND_LIMITS.')
+    parser.add_argument('--tracemalloc', action='store_true', help='Also report peak Python allocations (slower).')
+    parser.add_argument('--seed', type=int, default=1)
+    for backend, default in vars(stubs.Latencies()).items():
+        parser.add_argument(f'--{backend}-latency', type=float, default=default, help='Seconds.')
+    for backend, default in vars(stubs.Failures()).items():
+        parser.add_argument(f'--{backend}-failure-rate', type=float, default=default, help='0 to 1.')
+    for payload, default in vars(stubs.Payloads()).items():
+        parser.add_argument(f"--{payload.replace('_', '-')}", type=int, default=default)
+    args = parser.parse_args()
+
+    latencies = stubs.Latencies(**{name: getattr(args, f'{name}_latency') for name in vars(stubs.Latencies())})
+    failures = stubs.Failures(**{name: getattr(args, f'{name}_failure_rate') for name in vars(stubs.Failures())})
+    payloads = stubs.Payloads(**{name: getattr(args, name) for name in vars(stubs.Payloads())})
+
+    with django_env.test_database(), \
+            stubs.install(latencies, failures, payloads, seed=args.seed, backend_limits=args.backend_limits):
+        users = _seed_users(max(args.concurrency), args.posts)
+        next_index = iter(range(10 ** 7))
+        workers = Workers(args.worker_concurrency).start()
+        if args.tracemalloc:
+            tracemalloc.start()
+        try:
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    if args.tracemalloc:
+                        tracemalloc.reset_peak()
+                    results, elapsed = run_level(scenario, concurrency, args.requests, users, next_index, args.seed)
+                    heap_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+                    _report(scenario, concurrency, results, elapsed, heap_peak)
+        finally:
+            workers.stop()
+
+
+if __name__ == '__main__':
+    main()
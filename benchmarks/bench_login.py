@@ -0,0 +1,109 @@
+"""Logins per second and database queries per login.
+
+    python -m benchmarks.bench_login --logins 500 --sessions db cached_db
+
+Each login runs a POSTed email and password through SessionMiddleware and a
+login view, and reports the throughput and the queries per login for:
+
+* legacy: the previous view, i.e. User.objects.get(email=...) and then
+  authenticate() by username, with a Profile save on every login as the
+  old post_save receiver did,
+* current: views.user_login, with EmailBackend and the receiver that leaves
+  the profile alone on logins.
+
+Password hashing dominates a real login, so by default the users get the
+fast MD5 hasher and the numbers show the rest of the path; --hasher default
+keeps the configured PASSWORD_HASHERS. --sessions picks the SESSION_ENGINEs
+to compare (cached_db and cache use the configured default cache).
+"""
+import argparse
+import time
+
+from . import django_env
+
+django_env.setup()
+
+from django.contrib.auth import authenticate, login  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.contrib.sessions.middleware import SessionMiddleware  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models.signals import post_save  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from blog_generator import views  # noqa: E402
+from blog_generator.models import Profile  # noqa: E402
+
+PASSWORD = 'bench-password'
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def legacy_login(request):
+    user = User.objects.get(email=request.POST['email'])
+    user = authenticate(request, username=user.username, password=request.POST['password'])
+    login(request, user)
+    return HttpResponse()
+
+
+def legacy_save_user_profile(sender, instance, **kwargs):
+    if hasattr(instance, 'profile'):
+        instance.profile.save()
+    else:
+        Profile.objects.create(user=instance)
+
+
+def _create_users(count):
+    users = []
+    for i in range(count):
+        users.append(User.objects.create_user(username=f'login{i}', email=f'login{i}@example.com', password=PASSWORD))
+    return users
+
+
+def run(view, users, logins):
+    handler = SessionMiddleware(view)
+    factory = RequestFactory()
+    queries = 0
+    started = time.perf_counter()
+    for i in range(logins):
+        user = users[i % len(users)]
+        request = factory.post('/login', {'email': user.email, 'password': PASSWORD})
+        # The log holds a limited number of queries; empty it so none are missed.
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = handler(request)
+        if response.status_code not in (200, 302):
+            raise RuntimeError(f"Login failed with {response.status_code}")
+        queries += len(captured)
+    elapsed = time.perf_counter() - started
+    return logins / elapsed, queries / logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=500)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--hasher', choices=['fast', 'default'], default='fast')
+    parser.add_argument(
+        '--sessions', nargs='+', choices=['db', 'cached_db', 'cache'], default=['db', 'cached_db'],
+        help='SESSION_ENGINEs to compare.',
+    )
+    args = parser.parse_args()
+
+    hashers = override_settings(PASSWORD_HASHERS=FAST_HASHERS) if args.hasher == 'fast' else override_settings()
+    with django_env.test_database(), hashers:
+        users = _create_users(args.users)
+        for engine in args.sessions:
+            with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                for mode, view in [('legacy', legacy_login), ('current', views.user_login)]:
+                    if mode == 'legacy':
+                        post_save.connect(legacy_save_user_profile, sender=User)
+                    try:
+                        per_second, queries = run(view, users, args.logins)
+                    finally:
+                        post_save.disconnect(legacy_save_user_profile, sender=User)
+                    print(f"{mode:7}  sessions={engine:9}  logins/s={per_second:8.1f}  queries/login={queries:5.2f}")
+
+
+if __name__ == '__main__':
+    main()
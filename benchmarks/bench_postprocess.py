@@ -0,0 +1,93 @@
+"""CPU time and output quality of the article post-processor.
+
+    python -m benchmarks.bench_postprocess --repeat 200 --chunk-size 40
+
+Runs every case in blog_generator/testdata/postprocess, plus one
+max-length article built from them, through:
+
+* legacy: the replace() chain clean_blog_content used before postprocess.py,
+* one-pass: postprocess.clean_html on the whole article,
+* streamed: ArticleProcessor fed --chunk-size characters at a time, as when
+  cleaning Gemini's stream.
+
+For each, it reports CPU microseconds per article and how many corpus cases
+match their expected output.
+"""
+import argparse
+import time
+from pathlib import Path
+
+from blog_generator import postprocess
+
+CORPUS = Path(__file__).resolve().parent.parent / 'blog_generator' / 'testdata' / 'postprocess'
+
+# About 8192 output tokens, the generation_config limit.
+LONG_ARTICLE_CHARS = 32 * 1024
+
+
+def legacy_clean(content):
+    content = content.strip()
+    content = content.replace('**', '')
+    content = content.replace('*', '')
+    content = content.replace('#', '')
+    content = content.replace('```html', '').replace('```', '')
+    content = content.replace("'''html", '').replace("'''", '')
+    if not content.lower().endswith('</p>'):
+        last_paragraph = content.split('</p>')[-1].strip()
+        if last_paragraph:
+            content = content.rstrip() + '</p>'
+    return content.strip()
+
+
+def streamed_clean(content, chunk_size):
+    processor = postprocess.ArticleProcessor()
+    parts = [processor.feed(content[i:i + chunk_size]) for i in range(0, len(content), chunk_size)]
+    parts.append(processor.close())
+    return ''.join(parts).strip()
+
+
+def load_corpus():
+    cases = []
+    for source in sorted(CORPUS.glob('*.in.html')):
+        expected = source.with_name(source.name.replace('.in.html', '.out.html'))
+        cases.append((source.name[:-len('.in.html')], source.read_text(), expected.read_text().rstrip('\n')))
+    return cases
+
+
+def cpu_time(clean, articles, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        for article in articles:
+            clean(article)
+    return (time.process_time() - started) / (repeat * len(articles))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=40, help='Characters per streamed chunk.')
+    args = parser.parse_args()
+
+    cases = load_corpus()
+    sources = [source for _name, source, _expected in cases]
+    long_article = '\n\n'.join(sources)
+    long_article = (long_article * (LONG_ARTICLE_CHARS // len(long_article) + 1))[:LONG_ARTICLE_CHARS]
+
+    modes = [
+        ('legacy', legacy_clean),
+        ('one-pass', postprocess.clean_html),
+        ('streamed', lambda content: streamed_clean(content, args.chunk_size)),
+    ]
+    print(f"corpus: {len(cases)} cases, long article: {len(long_article)} chars")
+    for mode, clean in modes:
+        matches = sum(clean(source) == expected for _name, source, expected in cases)
+        corpus_us = cpu_time(clean, sources, args.repeat) * 1e6
+        long_us = cpu_time(clean, [long_article], max(1, args.repeat // 10)) * 1e6
+        print(
+            f"{mode:9}  corpus_match={matches:2d}/{len(cases)}  "
+            f"cpu/corpus_article={corpus_us:9.1f}us  cpu/long_article={long_us:9.1f}us"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Search latency as a user's post count grows: full-text index vs icontains.
+
+    python -m benchmarks.bench_search --sizes 1000 5000 20000 --queries 50
+
+For each size the user's posts are filled with synthetic articles and then
+searched two ways:
+
+* index: search.search_posts, i.e. the GIN-indexed tsvector on PostgreSQL
+  or the FTS5 table on SQLite, whichever the default database is,
+* icontains: the title/content scan the search view would otherwise need.
+
+It reports the median and p95 milliseconds per query.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from . import django_env
+
+django_env.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from blog_generator import search  # noqa: E402
+from blog_generator.models import BlogPost  # noqa: E402
+
+VOCABULARY = [f"word{i}" for i in range(50000)]
+WORDS_PER_ARTICLE = 800
+PAGE_SIZE = 20
+
+
+def _article(rng):
+    paragraphs = []
+    for _ in range(WORDS_PER_ARTICLE // 100):
+        paragraphs.append('<p>' + ' '.join(rng.choices(VOCABULARY, k=100)) + '</p>')
+    return '\n'.join(paragraphs)
+
+
+def _add_posts(user, count, rng):
+    posts = []
+    for i in range(count):
+        post = BlogPost(
+            user=user,
+            youtube_title=' '.join(rng.choices(VOCABULARY, k=6)),
+            youtube_link=f"https://www.youtube.com/watch?v=bench{i:06d}",
+            generated_content=_article(rng),
+        )
+        post.set_derived_fields()
+        posts.append(post)
+    created = BlogPost.objects.bulk_create(posts, batch_size=500)
+    search.index_posts(BlogPost.objects.filter(id__in=[post.id for post in created]))
+
+
+def _icontains(posts, query):
+    return list(
+        posts
+        .filter(Q(youtube_title__icontains=query) | Q(generated_content__icontains=query))
+        .order_by('-created_at')
+        .values(*search.RESULT_FIELDS)[:PAGE_SIZE]
+    )
+
+
+def _latencies(run, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        run(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000], help='Posts per user to test.')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with django_env.test_database():
+        user = User.objects.create_user(username='bench', email='bench@example.com', password='bench')
+        posts = BlogPost.objects.filter(user=user)
+        total = 0
+        for size in sorted(args.sizes):
+            _add_posts(user, size - total, rng)
+            total = size
+            queries = rng.choices(VOCABULARY, k=args.queries)
+            for mode, run in [
+                ('index', lambda query: search.search_posts(posts, query, 1, PAGE_SIZE)),
+                ('icontains', lambda query: _icontains(posts, query)),
+            ]:
+                median, p95 = _latencies(run, queries)
+                print(f"{mode:9}  posts={size:6d}  median={median:8.2f}ms  p95={p95:8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
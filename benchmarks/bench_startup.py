@@ -0,0 +1,101 @@
+"""Boot time and memory of a web worker process.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --check     # compare with the baseline
+    python -m benchmarks.bench_startup --save      # record a new baseline
+
+Each run starts a fresh interpreter that sets Django up and imports the
+URLconf, and with it every view, as a WSGI/ASGI worker does before its first
+request. Two modes are measured:
+
+* web: what a web worker loads now. The SDKs stay unloaded until a
+  generation actually runs (see blog_generator/sdk.py),
+* web+sdks: the same plus yt_dlp, assemblyai and google.generativeai, which
+  every web worker used to import at boot.
+
+It reports the median seconds to boot and the median peak RSS, and lists
+any SDK that the web mode loaded. startup_baseline.json holds the numbers of
+the web mode on the reference machine. --check fails when they grow by more
+than --tolerance, or when the web mode loads an SDK.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASELINE = Path(__file__).with_name('startup_baseline.json')
+SDKS = ('yt_dlp', 'assemblyai', 'google.generativeai')
+
+CHILD = """
+import importlib, json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_blog_app.settings')
+import django
+django.setup()
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    # ru_maxrss is in kilobytes on Linux.
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'sdks': [name for name in %r if name in sys.modules],
+}))
+""" % (SDKS,)
+
+
+def _boot(extra_imports):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, *extra_imports], check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def measure(extra_imports, runs):
+    boots = [_boot(extra_imports) for _ in range(runs)]
+    return {
+        'seconds': statistics.median(boot['seconds'] for boot in boots),
+        'rss_mb': statistics.median(boot['rss_mb'] for boot in boots),
+        'sdks': sorted({name for boot in boots for name in boot['sdks']}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode.')
+    parser.add_argument('--check', action='store_true', help='Fail if the web mode is worse than the baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed growth over the baseline, as a fraction.')
+    parser.add_argument('--save', action='store_true', help='Write the web mode numbers to the baseline file.')
+    args = parser.parse_args()
+
+    results = {}
+    for mode, extra_imports in [('web', ()), ('web+sdks', SDKS)]:
+        results[mode] = result = measure(extra_imports, args.runs)
+        print(
+            f"{mode:8}  boot={result['seconds'] * 1000:8.1f}ms  peak_rss={result['rss_mb']:7.1f}MB  "
+            f"sdks={','.join(result['sdks']) or '-'}"
+        )
+
+    web = results['web']
+    if args.save:
+        baseline = {'seconds': round(web['seconds'], 3), 'rss_mb': round(web['rss_mb'], 1)}
+        BASELINE.write_text(json.dumps(baseline, indent=2) + '\n')
+    if args.check:
+        baseline = json.loads(BASELINE.read_text())
+        failures = [
+            f"{key}: {web[key]:.3f} > {baseline[key]:.3f} + {args.tolerance:.0%}"
+            for key in ('seconds', 'rss_mb')
+            if web[key] > baseline[key] * (1 + args.tolerance)
+        ]
+        if web['sdks']:
+            failures.append(f"web workers import {', '.join(web['sdks'])}")
+        if failures:
+            sys.exit('Startup regressed: ' + '; '.join(failures))
+        print('Startup within baseline.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""Django bootstrap shared by the benchmark scripts.
+
+Run the scripts from the repository root, e.g.
+``python -m benchmarks.bench_async_pipeline``. They use a throwaway test
+database created from the configured ``default`` database, exactly like
+``manage.py test``.
+"""
+import contextlib
+import os
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_blog_app.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,214 @@
+"""Local stand-ins for YouTube, AssemblyAI and Gemini.
+
+``install(latencies, failures, payloads)`` patches the pipeline so that no
+network traffic happens:
+
+* yt_dlp.YoutubeDL is replaced by FakeYoutubeDL, so the pipeline's own
+  metadata caching, download and transcode hooks still run,
+* AssemblyAI's shared Transcriber (see clients.override) and the status
+  request are replaced by FakeTranscriber and FakeTranscript,
+* the shared Gemini model is replaced by FakeModel, with and without
+  streaming.
+
+Each stand-in waits for its entry in ``Latencies``, fails at the rate in
+``Failures`` and returns payloads of the sizes in ``Payloads``. Where the
+sync and async pipelines call different methods, the stub offers both with the
+same behaviour. The backend limits of limits.py are turned off unless
+``backend_limits`` is set, so that the numbers show the application itself.
+"""
+import asyncio
+import contextlib
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import override_settings
+
+from blog_generator import clients
+
+
+@dataclass
+class Latencies:
+    metadata: float = 0.05
+    download: float = 0.1
+    transcode: float = 0.02
+    transcription: float = 1.0
+    generation: float = 0.5
+
+
+@dataclass
+class Failures:
+    """Chance, from 0 to 1, that a single call to each backend fails."""
+    metadata: float = 0.0
+    download: float = 0.0
+    transcription: float = 0.0
+    generation: float = 0.0
+
+
+@dataclass
+class Payloads:
+    # Roughly a ten minute video.
+    audio_bytes: int = 1024 * 1024
+    duration: int = 600
+    transcript_words: int = 1500
+    article_words: int = 800
+
+
+@dataclass
+class _Backends:
+    latencies: Latencies
+    failures: Failures
+    payloads: Payloads
+    rng: random.Random = field(default_factory=random.Random)
+
+    def fails(self, backend):
+        return self.rng.random() < getattr(self.failures, backend)
+
+
+def _words(count, rng):
+    vocabulary = ('audio', 'video', 'music', 'history', 'people', 'city', 'idea', 'story', 'time', 'sound')
+    return ' '.join(rng.choice(vocabulary) for _ in range(count))
+
+
+class FakeYoutubeDL:
+    backends = None
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def extract_info(self, link, download=False):
+        backends = self.backends
+        time.sleep(backends.latencies.metadata)
+        if backends.fails('metadata'):
+            raise Exception('Stubbed YouTube extraction failure')
+        video_id = link[-11:]
+        # No formats and no captions: the pipeline downloads and transcribes.
+        return {
+            'id': video_id,
+            'title': f"Stubbed video {video_id}",
+            'duration': backends.payloads.duration,
+            'language': 'en',
+            'webpage_url': link,
+        }
+
+    def download(self, links):
+        backends = self.backends
+        time.sleep(backends.latencies.download)
+        if backends.fails('download'):
+            raise Exception('Stubbed YouTube download failure')
+        size = backends.payloads.audio_bytes
+        for hook in self.params.get('progress_hooks') or []:
+            hook({'status': 'finished', 'downloaded_bytes': size})
+        for hook in self.params.get('postprocessor_hooks') or []:
+            hook({'status': 'started', 'postprocessor': 'ExtractAudio'})
+        time.sleep(backends.latencies.transcode)
+        with open(f"{self.params['outtmpl']}.mp3", 'wb') as f:
+            f.write(b'\0' * size)
+        for hook in self.params.get('postprocessor_hooks') or []:
+            hook({'status': 'finished', 'postprocessor': 'ExtractAudio'})
+        return 0
+
+
+class FakeTranscript:
+    _submitted = {}
+    backends = None
+
+    def __init__(self, transcript_id, status, text=None, error=None):
+        self.id = transcript_id
+        self.status = status
+        self.text = text
+        self.error = error
+
+    @classmethod
+    def get_response(cls, transcript_id):
+        ready_at, failed = cls._submitted[transcript_id]
+        if time.monotonic() < ready_at:
+            return cls(transcript_id, 'processing')
+        if failed:
+            return cls(transcript_id, 'error', error='Stubbed transcription failure')
+        return cls(transcript_id, 'completed', _words(cls.backends.payloads.transcript_words, cls.backends.rng))
+
+
+class FakeTranscriber:
+    def __init__(self, backends):
+        self.backends = backends
+
+    def submit(self, audio, config=None):
+        transcript_id = str(uuid.uuid4())
+        FakeTranscript._submitted[transcript_id] = (
+            time.monotonic() + self.backends.latencies.transcription,
+            self.backends.fails('transcription'),
+        )
+        return FakeTranscript(transcript_id, 'queued')
+
+
+class FakeModel:
+    # Streamed answers arrive in this many chunks over the generation latency.
+    STREAM_CHUNKS = 10
+
+    def __init__(self, backends):
+        self.backends = backends
+
+    def _article(self, prompt):
+        if self.backends.fails('generation'):
+            raise Exception('Stubbed Gemini failure')
+        words = self.backends.payloads.article_words
+        paragraphs = [_words(min(100, words - start), self.backends.rng) for start in range(0, words, 100)]
+        text = '<h1>Stubbed Article</h1>' + ''.join(f'<p>{paragraph}.</p>' for paragraph in paragraphs)
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        return text, usage
+
+    def _chunks(self, text, usage):
+        size = -(-len(text) // self.STREAM_CHUNKS)
+        chunks = [SimpleNamespace(text=text[i:i + size]) for i in range(0, len(text), size)]
+        chunks[-1].usage_metadata = usage
+        return chunks
+
+    def generate_content(self, prompt, stream=False):
+        text, usage = self._article(prompt)
+        if not stream:
+            time.sleep(self.backends.latencies.generation)
+            return SimpleNamespace(text=text, usage_metadata=usage)
+
+        def chunks():
+            for chunk in self._chunks(text, usage):
+                time.sleep(self.backends.latencies.generation / self.STREAM_CHUNKS)
+                yield chunk
+        return chunks()
+
+    async def generate_content_async(self, prompt, stream=False):
+        text, usage = self._article(prompt)
+        if not stream:
+            await asyncio.sleep(self.backends.latencies.generation)
+            return SimpleNamespace(text=text, usage_metadata=usage)
+
+        async def chunks():
+            for chunk in self._chunks(text, usage):
+                await asyncio.sleep(self.backends.latencies.generation / self.STREAM_CHUNKS)
+                yield chunk
+        return chunks()
+
+
+@contextlib.contextmanager
+def install(latencies=None, failures=None, payloads=None, seed=1, backend_limits=False):
+    backends = _Backends(latencies or Latencies(), failures or Failures(), payloads or Payloads(), random.Random(seed))
+    FakeYoutubeDL.backends = backends
+    FakeTranscript.backends = backends
+
+    limits = contextlib.nullcontext() if backend_limits else override_settings(BACKEND_LIMITS={})
+    with limits, \
+            mock.patch('blog_generator.pipeline.yt_dlp.YoutubeDL', FakeYoutubeDL), \
+            mock.patch('blog_generator.pipeline.TRANSCRIPT_POLL_INITIAL_INTERVAL', 0.05), \
+            mock.patch('blog_generator.pipeline.TRANSCRIPT_POLL_MAX_INTERVAL', 0.05), \
+            mock.patch('blog_generator.pipeline.get_transcript_response', side_effect=FakeTranscript.get_response), \
+            clients.override(transcriber=FakeTranscriber(backends), blog_model=FakeModel(backends)):
+        yield backends
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import BlogPost
+from .models import BlogPost, GenerationJob, OutgoingEmail, VideoCacheEntry
 
 # Register your models here.
 admin.site.register(BlogPost)
+admin.site.register(GenerationJob)
+admin.site.register(VideoCacheEntry)
+admin.site.register(OutgoingEmail)
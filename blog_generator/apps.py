@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BlogGeneratorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog_generator'
+
+    def ready(self):
+        if settings.BLOG_CLIENT_WARM_UP:
+            from . import clients
+            clients.warm_up()
@@ -0,0 +1,99 @@
+"""The waits of the pipeline, as coroutines for the async worker (see jobs.arun_job).
+
+Everything else, from yt_dlp to the AssemblyAI upload and the database,
+stays in pipeline.py and jobs.py and runs on worker threads. Polling a
+submitted transcript and the Gemini calls happen on the event loop, so a
+single process can keep many jobs in flight while they wait.
+"""
+import asyncio
+import logging
+
+from django.conf import settings
+
+from . import limits, metrics, pipeline
+
+
+async def await_transcript(transcript_id):
+    """Poll a submitted transcript until it is done; returns 'completed' or 'error'."""
+    intervals = pipeline.transcript_poll_intervals()
+    with metrics.span('transcription_wait'):
+        while True:
+            await asyncio.sleep(next(intervals))
+            status = await asyncio.to_thread(pipeline.get_transcript_status, transcript_id)
+            if status in ('completed', 'error'):
+                return status
+
+
+async def agenerate_blog_from_transcription(transcription):
+    model = pipeline.get_blog_model()
+    prompt = pipeline.build_blog_prompt(transcription)
+
+    try:
+        async with limits.abackend('gemini'):
+            with metrics.span('generation'):
+                response = await model.generate_content_async(prompt)
+        metrics.record_usage(response)
+        return pipeline.clean_blog_content(response.text)
+    except Exception as e:
+        logging.error(f"Error generating blog content: {str(e)}")
+        raise
+
+
+async def astream_blog_from_transcription(transcription):
+    model = pipeline.get_blog_model()
+    prompt = pipeline.build_blog_prompt(transcription)
+
+    try:
+        chunk = None
+        async with limits.abackend('gemini'):
+            with metrics.span('generation'):
+                response = await model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks that only carry finish metadata have no text parts.
+                        continue
+                    if text:
+                        yield text
+        metrics.record_usage(chunk)
+    except Exception as e:
+        logging.error(f"Error streaming blog content: {str(e)}")
+        raise
+
+
+async def agenerate_chaptered_blog(outline, on_progress=None):
+    """Async version of pipeline.generate_chaptered_blog; `on_progress` is a coroutine function."""
+    model = pipeline.get_blog_model()
+    semaphore = asyncio.Semaphore(settings.BLOG_SECTION_CONCURRENCY)
+
+    async def generate(prompt):
+        async with semaphore, limits.abackend('gemini'):
+            with metrics.span('generation'):
+                response = await model.generate_content_async(prompt)
+        metrics.record_usage(response)
+        return response.text
+
+    frame = asyncio.ensure_future(generate(pipeline.build_frame_prompt(outline)))
+    sections = [
+        asyncio.ensure_future(generate(pipeline.build_section_prompt(chapter, outline['entities'])))
+        for chapter in outline['chapters']
+    ]
+    try:
+        head, tail = pipeline.split_frame(await frame)
+        parts = [pipeline.clean_blog_content(head)]
+        for section in sections:
+            parts.append(pipeline.clean_blog_content(await section))
+            if on_progress:
+                await on_progress('\n'.join(parts))
+        parts.append(pipeline.clean_blog_content(tail))
+        # Each part is cleaned and balanced on its own (see pipeline).
+        content = '\n'.join(parts)
+        if on_progress:
+            await on_progress(content)
+        return content
+    except Exception as e:
+        logging.error(f"Error generating chaptered blog content: {str(e)}")
+        for task in [frame, *sections]:
+            task.cancel()
+        raise
@@ -0,0 +1,25 @@
+"""Sign-in by email address.
+
+The login form asks for an email, not a username. EmailBackend looks the
+user up on auth_user.email, which migration 0017 indexes, and checks the
+password in the same step. ModelBackend stays in AUTHENTICATION_BACKENDS
+for username logins such as the admin's.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        UserModel = get_user_model()
+        user = UserModel._default_manager.filter(email=email).order_by('pk').first()
+        if user is None:
+            # Hash anyway, so a missing account takes as long as a wrong
+            # password (as ModelBackend does).
+            UserModel().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
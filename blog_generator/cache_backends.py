@@ -0,0 +1,43 @@
+"""The default cache, kept in the database so every process shares it.
+
+The backend rate limits, the YouTube metadata and the rendered articles all
+live in the default cache. Every web and worker process must see the same
+values. Django's DatabaseCache shares them through the
+``blog_cache`` table, which migration 0019 creates, but its incr() reads the
+value and then writes it back. Two processes taking a token at the same
+moment would then both count one, and the token bucket in limits.py relies on
+every incr() counting.
+
+DatabaseCache here makes incr() and decr() atomic, and they keep the key's
+expiry instead of resetting it to the default timeout.
+"""
+import base64
+import pickle
+
+from asgiref.sync import sync_to_async
+from django.core.cache.backends import db
+from django.db import connections, router, transaction
+
+
+class DatabaseCache(db.DatabaseCache):
+    def incr(self, key, delta=1, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        using = router.db_for_write(self.cache_model_class)
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        table, value_column, key_column = quote_name(self._table), quote_name('value'), quote_name('cache_key')
+
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            # Writing first takes the row lock (on SQLite, the database's write
+            # lock), so a concurrent incr() waits here until this one commits.
+            cursor.execute(f"UPDATE {table} SET {value_column} = {value_column} WHERE {key_column} = %s", [cache_key])
+            value = self.get(key, self._missing_key, version=version)
+            if value is self._missing_key:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            encoded = base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode('latin1')
+            cursor.execute(f"UPDATE {table} SET {value_column} = %s WHERE {key_column} = %s", [encoded, cache_key])
+        return value
+
+    async def aincr(self, key, delta=1, version=None):
+        return await sync_to_async(self.incr, thread_sensitive=True)(key, delta, version)
@@ -0,0 +1,129 @@
+import html
+import re
+import xml.etree.ElementTree as ElementTree
+
+# Caption formats we can parse, best first. srv3 is YouTube's timed-text XML;
+# it has no rolling repeats, so it needs less clean-up than auto VTT.
+PREFERRED_FORMATS = ('srv3', 'vtt')
+
+# Tried after the video's own language, or alone when it is unknown.
+FALLBACK_LANGUAGES = ('en',)
+
+# Quality heuristic. Normal speech runs at 130-160 words per minute; captions
+# far below that cover only part of the video (or just "[Music]" cues).
+MIN_WORDS = 30
+MIN_WORDS_PER_MINUTE = 40
+MIN_UNIQUE_WORD_RATIO = 0.15
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_ANNOTATION_RE = re.compile(r'\[[^\]]*\]')
+_WHITESPACE_RE = re.compile(r'\s+')
+_TIMING_RE = re.compile(r'^\S+\s+-->\s+\S+')
+
+
+def _best_format(formats):
+    by_ext = {fmt.get('ext'): fmt for fmt in formats or [] if fmt.get('url')}
+    for ext in PREFERRED_FORMATS:
+        if ext in by_ext:
+            return by_ext[ext]
+    return None
+
+
+def _matching_langs(available, language):
+    langs = [lang for lang in available if lang == language or lang.startswith(f"{language}-")]
+    # Exact match first, then YouTube's "-orig" (untranslated) track, then regional variants.
+    return sorted(langs, key=lambda lang: (lang != language, not lang.endswith('-orig'), lang))
+
+
+def select_tracks(info):
+    """Return the caption tracks worth trying for a video, best first.
+
+    Each track is a dict with lang, kind ('manual' or 'automatic'), ext and url.
+    """
+    language = info.get('language')
+    languages = [language] if language else []
+    languages += [lang for lang in FALLBACK_LANGUAGES if lang not in languages]
+
+    sources = (
+        ('manual', info.get('subtitles') or {}),
+        ('automatic', info.get('automatic_captions') or {}),
+    )
+    candidates = []
+    if not language:
+        # Without a detected language, the untranslated auto track is the
+        # best guess at what is actually spoken.
+        candidates += [('automatic', lang) for lang in sources[1][1] if lang.endswith('-orig')]
+    for lang in languages:
+        for kind, available in sources:
+            candidates += [(kind, match) for match in _matching_langs(available, lang)[:1]]
+
+    tracks = []
+    seen = set()
+    for kind, lang in candidates:
+        if (kind, lang) in seen:
+            continue
+        seen.add((kind, lang))
+        fmt = _best_format(dict(sources)[kind].get(lang))
+        if fmt:
+            tracks.append({'lang': lang, 'kind': kind, 'ext': fmt['ext'], 'url': fmt['url']})
+    return tracks
+
+
+def _clean_line(line):
+    line = html.unescape(_TAG_RE.sub('', line))
+    line = _ANNOTATION_RE.sub('', line)
+    return _WHITESPACE_RE.sub(' ', line).strip()
+
+
+def _join_lines(lines):
+    # Auto-generated captions repeat the previous line at the top of each cue
+    # so that two lines are on screen; keep each line once.
+    text = []
+    for line in lines:
+        if line and (not text or text[-1] != line):
+            text.append(line)
+    return ' '.join(text)
+
+
+def parse_vtt(content):
+    lines = []
+    in_cue = False
+    for raw in content.splitlines():
+        raw = raw.strip()
+        if not raw:
+            in_cue = False
+            continue
+        if _TIMING_RE.match(raw):
+            in_cue = True
+            continue
+        if in_cue:
+            lines.append(_clean_line(raw))
+    return _join_lines(lines)
+
+
+def parse_srv3(content):
+    root = ElementTree.fromstring(content)
+    lines = []
+    for paragraph in root.iter('p'):
+        text = ''.join(paragraph.itertext())
+        for line in text.splitlines():
+            lines.append(_clean_line(line))
+    return _join_lines(lines)
+
+
+def parse_captions(content, ext):
+    if ext == 'srv3':
+        return parse_srv3(content)
+    if ext == 'vtt':
+        return parse_vtt(content)
+    raise ValueError(f"Unsupported caption format: {ext}")
+
+
+def is_usable(text, duration=None):
+    words = text.split()
+    if len(words) < MIN_WORDS:
+        return False
+    if duration and len(words) / (duration / 60) < MIN_WORDS_PER_MINUTE:
+        return False
+    unique = len({word.lower() for word in words})
+    return unique / len(words) >= MIN_UNIQUE_WORD_RATIO
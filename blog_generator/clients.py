@@ -0,0 +1,124 @@
+"""Process-wide AssemblyAI and Gemini clients.
+
+The pipeline used to set the SDKs' global API keys and build a new
+Transcriber and GenerativeModel for every job. genai.configure() also drops
+the SDK's cached gRPC clients, so no Gemini connection outlived its job.
+Here each client is built once per process, from settings.ASSEMBLYAI_API_KEY
+and settings.GEMINI_API_KEY, and then shared by every thread:
+
+* transcriber() wraps one aai.Client, whose httpx pool keeps connections
+  to AssemblyAI open between uploads and status checks,
+* blog_model() is one GenerativeModel with the generation config. Its
+  gRPC channel is opened on first use and then reused.
+
+A client is rebuilt when its key changes (override_settings in tests) or,
+for AssemblyAI, when aai.settings changes, e.g. a base_url pointing at
+FakeAssemblyAI. BlogGeneratorConfig.ready() calls warm_up() so the first
+job does not pay for the setup.
+
+Gemini's async calls share one channel per process. That works because the
+pipeline runs its async jobs on a single event loop per process: the ASGI
+server's, or the one of run_blog_workers --async.
+
+Tests and benchmarks can swap in fakes for the whole process:
+
+    with clients.override(transcriber=FakeTranscriber(), blog_model=FakeModel()):
+        ...
+"""
+import contextlib
+import logging
+import threading
+
+from django.conf import settings
+
+from .sdk import aai, genai, genai_client
+
+GEMINI_MODEL = 'gemini-pro'
+
+# Adjusted generation config for more complete and coherent output
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.8,
+    "top_k": 40,
+    "max_output_tokens": 8192  # Ensure we get a complete response
+}
+
+_lock = threading.Lock()
+# name -> (the configuration it was built with, client)
+_clients = {}
+_overrides = {}
+
+
+def _shared(name, config, build):
+    entry = _clients.get(name)
+    if entry is None or entry[0] != config:
+        with _lock:
+            entry = _clients.get(name)
+            if entry is None or entry[0] != config:
+                entry = (config, build(config))
+                _clients[name] = entry
+    return entry[1]
+
+
+def _assemblyai_settings():
+    config = aai.settings.copy()
+    config.api_key = settings.ASSEMBLYAI_API_KEY
+    return config
+
+
+def assemblyai_client():
+    """The shared aai.Client; its http_client serves direct API calls."""
+    return _shared('assemblyai', _assemblyai_settings(), lambda config: aai.Client(settings=config))
+
+
+def transcriber():
+    if 'transcriber' in _overrides:
+        return _overrides['transcriber']
+    client = assemblyai_client()
+    return _shared('transcriber', client, lambda client: aai.Transcriber(client=client))
+
+
+def _build_blog_model(api_key):
+    # Only the global configuration takes a key; it changes only with the key.
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(GEMINI_MODEL, generation_config=GENERATION_CONFIG)
+
+
+def blog_model():
+    if 'blog_model' in _overrides:
+        return _overrides['blog_model']
+    return _shared('blog_model', settings.GEMINI_API_KEY, _build_blog_model)
+
+
+@contextlib.contextmanager
+def override(**fakes):
+    """Use the given transcriber and/or blog_model in place of the real clients."""
+    unknown = set(fakes) - {'transcriber', 'blog_model'}
+    if unknown:
+        raise TypeError(f"Unknown clients: {', '.join(sorted(unknown))}")
+    previous = dict(_overrides)
+    _overrides.update(fakes)
+    try:
+        yield
+    finally:
+        _overrides.clear()
+        _overrides.update(previous)
+
+
+def reset():
+    """Forget the shared clients; the next call builds new ones."""
+    with _lock:
+        _clients.clear()
+
+
+def warm_up():
+    """Build the clients whose keys are configured, so the first job starts quickly."""
+    try:
+        if settings.ASSEMBLYAI_API_KEY:
+            transcriber()
+        if settings.GEMINI_API_KEY:
+            blog_model()
+            # The model picks up the SDK's default client on its first call.
+            genai_client.get_default_generative_client()
+    except Exception as e:
+        logging.error(f"Client warm-up error: {str(e)}")
@@ -0,0 +1,130 @@
+"""Send the reads of read-only views to a replica database.
+
+Everything goes to the primary ('default') unless a view is wrapped in
+replica_reads. Inside such a view, reads go to one of the aliases listed in
+DB_REPLICAS. Reads stay on the primary in these cases:
+
+* no replica is configured, or none can be reached. A replica that fails to
+  connect is skipped for DB_REPLICA_RETRY_SECONDS,
+* the client was told about a change to its posts in the last
+  DB_REPLICA_PIN_SECONDS (see pin_to_primary()), so e.g. the post a job
+  just finished is listed even if the replica has not caught up yet. The
+  pin is a signed cookie, so checking it costs no query,
+* the view has called read_from_primary() (a view that writes and then
+  reads its write back must), or is inside a transaction on the primary.
+
+Writes and migrations always go to the primary, and so does the database
+cache: its counters must not lag. Replicas get their schema and rows
+through replication.
+"""
+import contextvars
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+
+PRIMARY = 'default'
+
+# What DatabaseCache's table passes to the router as its app label.
+CACHE_APP_LABEL = 'django_cache'
+
+# The signed cookie that keeps a client's reads on the primary.
+PIN_COOKIE = 'db_primary_pin'
+
+# The alias reads go to in the current view, or None outside replica_reads.
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+# alias -> time.monotonic() until which it is considered down.
+_down_until = {}
+
+
+def pin_to_primary(response):
+    """Keep the reads of the client `response` goes to on the primary until the replicas have caught up."""
+    if settings.DB_REPLICAS:
+        response.set_signed_cookie(
+            PIN_COOKIE, '1', salt=PIN_COOKIE, max_age=settings.DB_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+        )
+    return response
+
+
+def _pinned(request):
+    # The signature's timestamp bounds the pin even if the client keeps the cookie.
+    pin = request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_COOKIE, max_age=settings.DB_REPLICA_PIN_SECONDS)
+    return pin is not None
+
+
+def _healthy(alias):
+    if time.monotonic() < _down_until.get(alias, 0):
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError as e:
+        logging.error(f"Replica {alias} unavailable, reading from the primary: {str(e)}")
+        _down_until[alias] = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+        return False
+    return True
+
+
+def choose_replica(pinned=False):
+    """Return the alias the reads of a read-only view should use."""
+    if not settings.DB_REPLICAS or pinned:
+        return PRIMARY
+    replicas = list(settings.DB_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if _healthy(alias):
+            return alias
+    return PRIMARY
+
+
+def reading_from_replica():
+    return _read_alias.get() not in (None, PRIMARY)
+
+
+def replica_reads(view):
+    """Run a read-only view's queries on a replica (see the module docstring)."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # The session and user are loaded from the primary: a session
+        # created by the login just before may not be replicated yet.
+        pinned = request.user.is_authenticated and _pinned(request)
+        alias = choose_replica(pinned)
+        token = _read_alias.set(alias)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+def read_from_primary():
+    """Send the rest of the current view's reads to the primary."""
+    if _read_alias.get() is not None:
+        _read_alias.set(PRIMARY)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or alias == PRIMARY or model._meta.app_label == CACHE_APP_LABEL:
+            return PRIMARY
+        if transaction.get_connection(PRIMARY).in_atomic_block:
+            return PRIMARY
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *settings.DB_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DB_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,299 @@
+"""Local stand-ins for external services, for tests and offline runs.
+
+FakeAssemblyAI speaks enough of the AssemblyAI v2 HTTP API (upload, create
+transcript, get transcript) for the real ``assemblyai`` SDK to talk to it::
+
+    with FakeAssemblyAI(latency=0.2) as fake:
+        aai.settings.base_url = fake.base_url
+        ...
+
+``text`` and ``fail`` may also be callables that receive the uploaded audio
+bytes, to give each upload its own transcript or failure.
+
+Like the real service it can refuse work with HTTP 429: ``max_concurrency``
+caps the uploads and transcript requests in progress at once and
+``max_per_second`` the number started in any one second. ``upload_latency``
+makes each upload take that long. ``peak_concurrency`` and ``rejected``
+record what happened.
+
+FakeSMTPServer accepts mail over plain SMTP (no TLS or AUTH) and keeps it in
+``messages``; ``connections`` counts the sessions opened. ``fail_next``
+makes that many of the next messages get a temporary 451 error::
+
+    with FakeSMTPServer() as smtp, override_settings(EMAIL_PORT=smtp.port, ...):
+        ...
+"""
+import collections
+import json
+import threading
+import time
+import uuid
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeAssemblyAI:
+    def __init__(
+        self, latency=0.0, text='This is a transcript from the fake AssemblyAI server', fail=False,
+        max_concurrency=None, max_per_second=None, upload_latency=0.0,
+    ):
+        self.latency = latency
+        self.text = text
+        self.fail = fail
+        self.max_concurrency = max_concurrency
+        self.max_per_second = max_per_second
+        self.upload_latency = upload_latency
+        self.in_flight = 0
+        self.peak_concurrency = 0
+        self.rejected = 0
+        self._started = collections.deque()
+        self.transcripts = {}
+        self.uploads = 0
+        self._audio = {}
+        self.status_requests = 0
+        self._delivered = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    data = b''
+                    while True:
+                        line = self.rfile.readline().strip()
+                        if not line:
+                            # The client gave up partway through the body.
+                            return None
+                        size = int(line, 16)
+                        if size == 0:
+                            self.rfile.readline()
+                            return data
+                        data += self.rfile.read(size)
+                        self.rfile.readline()
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            def do_POST(self):
+                body = self._read_body()
+                if body is None:
+                    return
+                if self.path not in ('/v2/upload', '/v2/transcript'):
+                    return self._send(404, {'error': 'Not found'})
+                if not fake._admit():
+                    return self._send(429, {'error': 'Too Many Requests'})
+                try:
+                    if self.path == '/v2/upload':
+                        time.sleep(fake.upload_latency)
+                        upload_url = f"{fake.base_url}/uploads/{uuid.uuid4()}"
+                        with fake._lock:
+                            fake.uploads += 1
+                            fake._audio[upload_url] = body
+                        payload = {'upload_url': upload_url}
+                    else:
+                        payload = fake._create(json.loads(body))
+                finally:
+                    # Done before answering, so the client's next request
+                    # never overlaps this one.
+                    with fake._lock:
+                        fake.in_flight -= 1
+                self._send(200, payload)
+
+            def do_GET(self):
+                if self.path.startswith('/v2/transcript/'):
+                    transcript_id = self.path.rsplit('/', 1)[-1]
+                    with fake._lock:
+                        fake.status_requests += 1
+                    if transcript_id not in fake.transcripts:
+                        return self._send(404, {'error': 'Transcript not found'})
+                    return self._send(200, fake._view(transcript_id))
+                self._send(404, {'error': 'Not found'})
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._started and self._started[0] <= now - 1:
+                self._started.popleft()
+            if (
+                (self.max_concurrency and self.in_flight >= self.max_concurrency)
+                or (self.max_per_second and len(self._started) >= self.max_per_second)
+            ):
+                self.rejected += 1
+                return False
+            self._started.append(now)
+            self.in_flight += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.in_flight)
+            return True
+
+    def _create(self, request):
+        transcript_id = str(uuid.uuid4())
+        with self._lock:
+            audio = self._audio.get(request.get('audio_url'), b'')
+            self.transcripts[transcript_id] = {
+                'request': request,
+                'ready_at': time.monotonic() + self.latency,
+                'fail': self.fail(audio) if callable(self.fail) else self.fail,
+                'text': self.text(audio) if callable(self.text) else self.text,
+            }
+        return self._view(transcript_id)
+
+    def _status(self, transcript_id):
+        record = self.transcripts[transcript_id]
+        if time.monotonic() < record['ready_at']:
+            return 'processing'
+        return 'error' if record['fail'] else 'completed'
+
+    def _view(self, transcript_id):
+        request = self.transcripts[transcript_id]['request']
+        status = self._status(transcript_id)
+        payload = {
+            'id': transcript_id,
+            'audio_url': request.get('audio_url'),
+            'status': status,
+            'webhook_url': request.get('webhook_url'),
+        }
+        if status == 'completed':
+            payload['text'] = self.transcripts[transcript_id]['text']
+        elif status == 'error':
+            payload['error'] = 'Fake transcription failure'
+        return payload
+
+    def due_webhooks(self):
+        """Return the callbacks AssemblyAI would have sent by now, each once.
+
+        Each item is ``(url, headers, payload)``. Tests deliver them with the
+        Django test client instead of the fake calling back over HTTP.
+        """
+        due = []
+        with self._lock:
+            for transcript_id, record in self.transcripts.items():
+                request = record['request']
+                status = self._status(transcript_id)
+                if not request.get('webhook_url') or status == 'processing' or transcript_id in self._delivered:
+                    continue
+                self._delivered.add(transcript_id)
+                headers = {}
+                if request.get('webhook_auth_header_name'):
+                    headers[request['webhook_auth_header_name']] = request.get('webhook_auth_header_value')
+                due.append((request['webhook_url'], headers, {'transcript_id': transcript_id, 'status': status}))
+        return due
+
+
+
+class FakeSMTPServer:
+    def __init__(self, fail_next=0):
+        self.fail_next = fail_next
+        self.connections = 0
+        self.messages = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _reply(self, line):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                with fake._lock:
+                    fake.connections += 1
+                self._reply('220 fake-smtp ready')
+                sender, recipients = None, []
+                for raw in self.rfile:
+                    command = raw.decode('utf-8').rstrip('\r\n')
+                    verb = command[:4].upper()
+                    if verb in ('EHLO', 'HELO'):
+                        self._reply('250 fake-smtp')
+                    elif verb == 'MAIL':
+                        sender, recipients = command.split(':', 1)[1].strip(), []
+                        self._reply('250 OK')
+                    elif verb == 'RCPT':
+                        recipients.append(command.split(':', 1)[1].strip())
+                        self._reply('250 OK')
+                    elif verb == 'DATA':
+                        self._reply('354 End data with <CR><LF>.<CR><LF>')
+                        lines = []
+                        for data in self.rfile:
+                            if data in (b'.\r\n', b'.\n'):
+                                break
+                            lines.append(data)
+                        with fake._lock:
+                            failing = fake.fail_next > 0
+                            if failing:
+                                fake.fail_next -= 1
+                            else:
+                                fake.messages.append({
+                                    'from': sender, 'to': recipients, 'data': b''.join(lines).decode('utf-8'),
+                                })
+                        self._reply('451 Try again later' if failing else '250 OK')
+                    elif verb in ('RSET', 'NOOP'):
+                        sender, recipients = None, []
+                        self._reply('250 OK')
+                    elif verb == 'QUIT':
+                        self._reply('221 Bye')
+                        return
+                    else:
+                        self._reply('502 Command not implemented')
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
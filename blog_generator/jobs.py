@@ -0,0 +1,727 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import async_pipeline, limits, metrics, pipeline, postprocess, video_cache
+from .models import BlogPost, GenerationBatch, GenerationJob, Transcript
+
+# A running job whose heartbeat is older than this is assumed to belong to a
+# crashed worker and is put back on the queue.
+STALE_JOB_TIMEOUT = timedelta(minutes=30)
+
+# A parked job whose webhook has not arrived after this long is checked by
+# polling AssemblyAI, in case the callback was lost or the async worker
+# polling for it stopped.
+WEBHOOK_GRACE_PERIOD = timedelta(minutes=5)
+WAITING_CHECK_INTERVAL = 60
+
+# How often a streaming job writes the text generated so far to its row.
+STREAM_FLUSH_INTERVAL = 0.25
+
+# The threads arun_job runs blocking stages on, created on first use.
+_executor = None
+
+
+def enqueue_job(user, link, stream=False):
+    return GenerationJob.objects.create(
+        user=user,
+        youtube_link=link,
+        video_id=video_cache.extract_video_id(link) or '',
+        stream=stream,
+    )
+
+
+def enqueue_regeneration(blog_post, stream=False):
+    """Queue a job that rewrites `blog_post` from its stored transcript."""
+    return GenerationJob.objects.create(
+        user_id=blog_post.user_id,
+        youtube_link=blog_post.youtube_link,
+        youtube_title=blog_post.youtube_title,
+        video_id=video_cache.extract_video_id(blog_post.youtube_link) or '',
+        blog_post=blog_post,
+        regenerate=True,
+        stream=stream,
+    )
+
+
+def enqueue_batch(user, links, title='', stream=False):
+    """Queue one job per video in `links` (video, playlist or channel URLs) as a GenerationBatch.
+
+    Raises ValueError if the links contain no videos and limits.QuotaExceeded
+    if the user may not queue that many.
+    """
+    videos = pipeline.expand_links(links, limit=settings.BATCH_MAX_VIDEOS)
+    if not videos:
+        raise ValueError("No videos found")
+    refusal = limits.check_admission(user, new_jobs=len(videos))
+    if refusal:
+        raise limits.QuotaExceeded(*refusal)
+    with transaction.atomic():
+        batch = GenerationBatch.objects.create(user=user, title=title[:200])
+        # One INSERT for the whole playlist. Titles listed with the playlist
+        # are kept, so those jobs skip the title lookup.
+        GenerationJob.objects.bulk_create([
+            GenerationJob(
+                user=user,
+                batch=batch,
+                youtube_link=link,
+                youtube_title=video_title[:200],
+                video_id=video_cache.extract_video_id(link) or '',
+                stream=stream,
+            )
+            for link, video_title in videos
+        ])
+    return batch
+
+
+def claim_next_job(worker_name, batch_id=None):
+    """Atomically move the oldest queued job to running and return it.
+
+    The conditional UPDATE is what makes the claim safe between worker
+    processes: only one of them can flip a given row from queued to running.
+    """
+    candidates = GenerationJob.objects.filter(status=GenerationJob.STATUS_QUEUED)
+    if batch_id is not None:
+        candidates = candidates.filter(batch_id=batch_id)
+    candidates = (
+        candidates
+        .order_by('created_at')
+        .values_list('id', flat=True)[:10]
+    )
+    for job_id in candidates:
+        now = timezone.now()
+        claimed = GenerationJob.objects.filter(
+            id=job_id, status=GenerationJob.STATUS_QUEUED
+        ).update(
+            status=GenerationJob.STATUS_RUNNING,
+            worker=worker_name,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            return GenerationJob.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs(timeout=STALE_JOB_TIMEOUT):
+    cutoff = timezone.now() - timeout
+    return GenerationJob.objects.filter(
+        status=GenerationJob.STATUS_RUNNING,
+        heartbeat_at__lt=cutoff,
+    ).update(status=GenerationJob.STATUS_QUEUED, worker='', stage='')
+
+
+def _set_stage(job, stage):
+    job.stage = stage
+    job.heartbeat_at = timezone.now()
+    job.save(update_fields=['stage', 'heartbeat_at'])
+
+
+def _record_timings(job):
+    """Add the stage timings of this run to the job's, for a job resumed after a webhook."""
+    timings = dict(job.timings or {})
+    for stage, seconds in (metrics.current_timings() or {}).items():
+        timings[stage] = round(timings.get(stage, 0) + seconds, 3)
+    job.timings = timings
+
+
+def _fail(job, message):
+    job.status = GenerationJob.STATUS_FAILED
+    job.error = message
+    job.finished_at = timezone.now()
+    _record_timings(job)
+    job.save(update_fields=['status', 'error', 'finished_at', 'timings'])
+    metrics.JOBS.inc(status=job.status)
+    return job
+
+
+def _complete(job, blog_post):
+    job.status = GenerationJob.STATUS_COMPLETED
+    job.blog_post = blog_post
+    job.stage = ''
+    job.finished_at = timezone.now()
+    _record_timings(job)
+    job.save(update_fields=['status', 'blog_post', 'stage', 'finished_at', 'timings'])
+    metrics.JOBS.inc(status=job.status)
+    return job
+
+
+def _park(job, transcript_id):
+    job.status = GenerationJob.STATUS_WAITING
+    job.transcript_id = transcript_id
+    job.heartbeat_at = timezone.now()
+    _record_timings(job)
+    job.save(update_fields=['status', 'transcript_id', 'heartbeat_at', 'timings'])
+
+
+def _set_source(job, source):
+    job.transcript_source = source
+    job.save(update_fields=['transcript_source'])
+
+
+def _store_outline(video_id, outline):
+    # Stored before the transcript, so whoever finds the transcript in the
+    # cache also finds its outline.
+    if outline and video_id:
+        video_cache.put(video_id, 'outline', outline)
+
+
+def _cached_outline(video_id):
+    return video_cache.get(video_id, 'outline') if video_id else None
+
+
+def _transcribe(job, link, video_id, park=False):
+    """Return (transcript, outline); the transcript is None after parking the job.
+
+    A transcription AssemblyAI has to run parks the job on the submitted
+    transcript when the webhook is configured or with `park` (see arun_job).
+    """
+    if job.transcript_id:
+        # Resumed by the completion webhook or by check_waiting_jobs.
+        transcription, outline = pipeline.fetch_transcript(job.transcript_id)
+        if transcription and video_id:
+            _store_outline(video_id, outline)
+            video_cache.put(video_id, 'transcript', transcription)
+        _set_source(job, GenerationJob.SOURCE_ASR)
+        return transcription, outline
+
+    if not (park or settings.ASSEMBLYAI_WEBHOOK_URL):
+        results = []
+
+        def compute():
+            transcription, source, outline = pipeline.get_transcript(link)
+            _store_outline(video_id, outline)
+            results.append((source, outline))
+            return transcription
+
+        transcription = video_cache.get_or_compute(video_id, 'transcript', compute)
+        if results:
+            source, outline = results[0]
+        else:
+            source, outline = GenerationJob.SOURCE_CACHE, _cached_outline(video_id)
+        _set_source(job, source)
+        return transcription, outline
+
+    if video_id:
+        cached = video_cache.get(video_id, 'transcript', count=True)
+        if cached is not None:
+            _set_source(job, GenerationJob.SOURCE_CACHE)
+            return cached, _cached_outline(video_id)
+
+    # Captions need no upload or webhook round trip, so try them first.
+    transcription = pipeline.get_caption_transcript(link)
+    if transcription:
+        if video_id:
+            video_cache.put(video_id, 'transcript', transcription)
+        _set_source(job, GenerationJob.SOURCE_CAPTIONS)
+        return transcription, None
+
+    if pipeline.is_long_media(pipeline.get_video_info(link).get('duration')):
+        # Long audio is transcribed as parallel chunks, which finish in about
+        # the time of one short video, so it is not parked on a webhook.
+        outlines = []
+
+        def compute_long():
+            transcription, outline = pipeline.transcribe_audio(link)
+            _store_outline(video_id, outline)
+            outlines.append(outline)
+            return transcription
+
+        transcription = video_cache.get_or_compute(video_id, 'transcript', compute_long)
+        _set_source(job, GenerationJob.SOURCE_ASR)
+        return transcription, outlines[0] if outlines else _cached_outline(video_id)
+
+    if video_id:
+        # Share a transcription already submitted for the same video.
+        transcript_id = (
+            GenerationJob.objects
+            .filter(video_id=video_id, status=GenerationJob.STATUS_WAITING)
+            .exclude(transcript_id='')
+            .values_list('transcript_id', flat=True)
+            .first()
+        )
+        if transcript_id:
+            _set_source(job, GenerationJob.SOURCE_ASR)
+            _park(job, transcript_id)
+            return None, None
+
+    _set_source(job, GenerationJob.SOURCE_ASR)
+    transcript_id = pipeline.submit_transcription(
+        link, settings.ASSEMBLYAI_WEBHOOK_URL, settings.ASSEMBLYAI_WEBHOOK_SECRET
+    )
+    _park(job, transcript_id)
+    return None, None
+
+
+def resume_transcript_jobs(transcript_id, status):
+    """Requeue (or fail) the jobs parked on a transcript once AssemblyAI is done."""
+    waiting = GenerationJob.objects.filter(transcript_id=transcript_id, status=GenerationJob.STATUS_WAITING)
+    if status == 'completed':
+        return waiting.update(status=GenerationJob.STATUS_QUEUED, worker='')
+    if status == 'error':
+        return waiting.update(
+            status=GenerationJob.STATUS_FAILED,
+            error="Transcription failed. Please try again with a shorter video or contact support.",
+            finished_at=timezone.now(),
+        )
+    return 0
+
+
+def check_waiting_jobs(grace=WEBHOOK_GRACE_PERIOD):
+    """Poll AssemblyAI for parked jobs whose webhook is overdue, or whose async worker stopped."""
+    now = timezone.now()
+    transcript_ids = set(
+        GenerationJob.objects.filter(
+            status=GenerationJob.STATUS_WAITING,
+            heartbeat_at__lt=now - grace,
+        ).values_list('transcript_id', flat=True)
+    )
+    resumed = 0
+    for transcript_id in transcript_ids:
+        try:
+            status = pipeline.get_transcript_status(transcript_id)
+        except Exception as e:
+            logging.error(f"Failed to check transcript {transcript_id}: {str(e)}")
+            continue
+        if status in ('completed', 'error'):
+            resumed += resume_transcript_jobs(transcript_id, status)
+        else:
+            GenerationJob.objects.filter(
+                transcript_id=transcript_id, status=GenerationJob.STATUS_WAITING
+            ).update(heartbeat_at=now)
+    return resumed
+
+
+class _PartialArticle:
+    """A streamed article, cleaned as it arrives (see _generate_article)."""
+
+    def __init__(self):
+        self.processor = postprocess.ArticleProcessor()
+        self.chunks = []
+        self.last_flush = time.monotonic()
+
+    def feed(self, chunk):
+        """Add `chunk`; returns the article so far when it is due to be published, else None."""
+        self.chunks.append(self.processor.feed(chunk))
+        if time.monotonic() - self.last_flush < STREAM_FLUSH_INTERVAL:
+            return None
+        self.last_flush = time.monotonic()
+        return ''.join(self.chunks)
+
+    def close(self):
+        self.chunks.append(self.processor.close())
+        return ''.join(self.chunks)
+
+
+def _publish(job, content):
+    GenerationJob.objects.filter(id=job.id).update(partial_content=content, heartbeat_at=timezone.now())
+
+
+def _generate_article(job, transcription, outline=None):
+    if pipeline.use_chaptered_generation(outline):
+        on_progress = functools.partial(_publish, job) if job.stream else None
+        return pipeline.generate_chaptered_blog(outline, on_progress)
+
+    if not job.stream:
+        return pipeline.generate_blog_from_transcription(transcription)
+
+    # Publish partial output on the job row so job_events can forward it to
+    # the browser while Gemini is still writing. It is cleaned as it arrives,
+    # so the browser shows the same HTML that will be saved.
+    article = _PartialArticle()
+    for chunk in pipeline.stream_blog_from_transcription(transcription):
+        content = article.feed(chunk)
+        if content is not None:
+            _publish(job, content)
+    content = article.close()
+    _publish(job, content)
+    return content.strip()
+
+
+def _transcript_metadata(link):
+    # The title and download steps have normally just cached the video info.
+    # If not, the transcript is stored without it rather than going back to
+    # YouTube.
+    info = pipeline.cached_video_info(link) or {}
+    duration = info.get('duration')
+    return {'language': info.get('language') or '', 'duration': int(duration) if duration else None}
+
+
+def _store_transcript(job, blog_post, transcription, outline):
+    Transcript.objects.create(
+        blog_post=blog_post,
+        text=transcription,
+        outline=outline,
+        source=job.transcript_source,
+        **_transcript_metadata(job.youtube_link),
+    )
+
+
+def _stored_transcript(job):
+    """Return the transcript a regeneration job starts from, or None after failing the job."""
+    _set_stage(job, 'generation')
+    transcript = Transcript.objects.filter(blog_post_id=job.blog_post_id).first()
+    if transcript is None:
+        _fail(job, "No stored transcript for this blog post")
+    return transcript
+
+
+def _save_regenerated(job, blog_content):
+    if not blog_content:
+        return _fail(job, "Failed to generate blog article")
+    _set_stage(job, 'save')
+    blog_post = job.blog_post
+    blog_post.generated_content = blog_content
+    with metrics.span('save'):
+        blog_post.save(update_fields=['generated_content'])
+    return _complete(job, blog_post)
+
+
+def _regenerate(job):
+    """Rewrite the job's blog post from its stored transcript; only the LLM stage runs."""
+    transcript = _stored_transcript(job)
+    if transcript is None:
+        return job
+    try:
+        # Not through the video cache: that would hand back the article
+        # being replaced.
+        blog_content = _generate_article(job, transcript.text, transcript.outline)
+    except Exception as e:
+        logging.error(f"Blog regeneration failed: {str(e)}")
+        return _fail(job, "Failed to generate blog content. Please try again.")
+    return _save_regenerated(job, blog_content)
+
+
+def _fetch_title(job):
+    if not job.youtube_title:
+        _set_stage(job, 'title')
+        job.youtube_title = pipeline.yt_title(job.youtube_link)
+        job.save(update_fields=['youtube_title'])
+
+
+def _transcription_stage(job, video_id, park=False):
+    """Return the job's (transcript, outline), or None once the job has failed or is parked."""
+    _set_stage(job, 'transcription')
+    try:
+        transcription, outline = _transcribe(job, job.youtube_link, video_id, park)
+    except Exception as e:
+        logging.error(f"Transcription failed: {str(e)}")
+        _fail(job, "Transcription failed. Please try again with a shorter video or contact support.")
+        return None
+    if job.status == GenerationJob.STATUS_WAITING:
+        return None
+    if not transcription:
+        _fail(job, "Failed to get transcript")
+        return None
+    metrics.TRANSCRIPT_CHARACTERS.inc(len(transcription), source=job.transcript_source or 'unknown')
+    _set_stage(job, 'generation')
+    return transcription, outline
+
+
+def _save_article(job, blog_content, transcription, outline):
+    if not blog_content:
+        return _fail(job, "Failed to generate blog article")
+
+    _set_stage(job, 'save')
+    try:
+        with metrics.span('save'):
+            blog_post = BlogPost.objects.create(
+                user_id=job.user_id,
+                youtube_title=job.youtube_title,
+                youtube_link=job.youtube_link,
+                generated_content=blog_content
+            )
+    except Exception as e:
+        logging.error(f"Failed to save blog: {str(e)}")
+        return _fail(job, "Failed to save blog article. Please try again.")
+    try:
+        _store_transcript(job, blog_post, transcription, outline)
+    except Exception as e:
+        # The article is saved; only regenerating it later is lost.
+        logging.error(f"Failed to store transcript: {str(e)}")
+
+    return _complete(job, blog_post)
+
+
+def run_job(job):
+    """Run every pipeline stage for a claimed job and record the outcome."""
+    with metrics.collect():
+        return _run_job(job)
+
+
+def _run_job(job):
+    video_id = video_cache.extract_video_id(job.youtube_link)
+    try:
+        if job.regenerate:
+            return _regenerate(job)
+
+        _fetch_title(job)
+        transcribed = _transcription_stage(job, video_id)
+        if transcribed is None:
+            return job
+        transcription, outline = transcribed
+
+        try:
+            blog_content = video_cache.get_or_compute(
+                video_id, 'article', lambda: _generate_article(job, transcription, outline)
+            )
+        except Exception as e:
+            logging.error(f"Blog generation failed: {str(e)}")
+            return _fail(job, "Failed to generate blog content. Please try again.")
+        return _save_article(job, blog_content, transcription, outline)
+    except Exception as e:
+        logging.error(f"Error running job {job.id}: {str(e)}")
+        return _fail(job, "An unexpected error occurred. Please try again.")
+
+
+def work(worker_name, poll_interval=2.0, once=False):
+    """Claim and run jobs until stopped, or until the queue is empty if `once`."""
+    last_waiting_check = 0
+    while True:
+        close_old_connections()
+        if time.monotonic() - last_waiting_check >= WAITING_CHECK_INTERVAL:
+            check_waiting_jobs()
+            last_waiting_check = time.monotonic()
+        job = claim_next_job(worker_name)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+
+
+def _stage_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.BLOG_WORKER_THREADS, thread_name_prefix='blog-stage')
+    return _executor
+
+
+def _in_thread(func):
+    """Return a coroutine function that runs the blocking stage `func` for arun_job.
+
+    Stages run on the BLOG_WORKER_THREADS threads of one executor, so an async
+    worker holds at most that many database connections; with 0 they run one
+    at a time on the thread Django keeps for sync code. Like work() between
+    jobs, each stage closes its thread's connection before and after if it
+    is past CONN_MAX_AGE or broken.
+    """
+    def stage(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    if not settings.BLOG_WORKER_THREADS:
+        return sync_to_async(stage)
+    return sync_to_async(stage, thread_sensitive=False, executor=_stage_executor())
+
+
+async def _agenerate_article(job, transcription, outline=None):
+    """_generate_article with the Gemini calls on the event loop."""
+    publish = _in_thread(_publish)
+    if pipeline.use_chaptered_generation(outline):
+        on_progress = functools.partial(publish, job) if job.stream else None
+        return await async_pipeline.agenerate_chaptered_blog(outline, on_progress)
+
+    if not job.stream:
+        return await async_pipeline.agenerate_blog_from_transcription(transcription)
+
+    article = _PartialArticle()
+    async for chunk in async_pipeline.astream_blog_from_transcription(transcription):
+        content = article.feed(chunk)
+        if content is not None:
+            await publish(job, content)
+    content = article.close()
+    await publish(job, content)
+    return content.strip()
+
+
+async def _acached_article(job, video_id, transcription, outline, poll_interval=1.0):
+    """video_cache.get_or_compute for the article, waiting on the event loop."""
+    if not video_id:
+        return await _agenerate_article(job, transcription, outline)
+
+    claim = _in_thread(video_cache.claim)
+    value, key = await claim(video_id, 'article')
+    while value is None and key is None:
+        await asyncio.sleep(poll_interval)
+        value, key = await claim(video_id, 'article', waited=True)
+    if key is None:
+        return value
+
+    try:
+        value = await _agenerate_article(job, transcription, outline)
+        await _in_thread(video_cache.store)(video_id, 'article', value)
+        return value
+    finally:
+        await _in_thread(video_cache.release_lease)(key)
+
+
+async def _aregenerate(job):
+    transcript = await _in_thread(_stored_transcript)(job)
+    if transcript is None:
+        return job
+    try:
+        blog_content = await _agenerate_article(job, transcript.text, transcript.outline)
+    except Exception as e:
+        logging.error(f"Blog regeneration failed: {str(e)}")
+        return await _in_thread(_fail)(job, "Failed to generate blog content. Please try again.")
+    return await _in_thread(_save_regenerated)(job, blog_content)
+
+
+def _unpark(job, status):
+    """Take back a job arun_job parked, now that its transcript is `status`.
+
+    Returns False if the transcription failed, or if check_waiting_jobs in
+    another worker requeued the job first.
+    """
+    if status != 'completed':
+        resume_transcript_jobs(job.transcript_id, status)
+        job.refresh_from_db()
+        return False
+    job.heartbeat_at = timezone.now()
+    taken = GenerationJob.objects.filter(id=job.id, status=GenerationJob.STATUS_WAITING).update(
+        status=GenerationJob.STATUS_RUNNING, heartbeat_at=job.heartbeat_at,
+    )
+    if taken:
+        job.status = GenerationJob.STATUS_RUNNING
+    return bool(taken)
+
+
+async def _await_parked(job):
+    """Wait on the event loop for the transcript `job` is parked on; True once the job is ours again."""
+    try:
+        status = await async_pipeline.await_transcript(job.transcript_id)
+    except Exception as e:
+        # The job stays parked until check_waiting_jobs finds it.
+        logging.error(f"Failed to check transcript {job.transcript_id}: {str(e)}")
+        return False
+    return await _in_thread(_unpark)(job, status)
+
+
+def stage_limits(transcription=None, generation=None):
+    """Semaphores for arun_job that cap how many jobs are in each stage at once; 0 or None is no cap."""
+    return {
+        stage: asyncio.Semaphore(limit)
+        for stage, limit in (('transcription', transcription), ('generation', generation))
+        if limit
+    }
+
+
+def _stage_slot(limits, stage):
+    return (limits or {}).get(stage) or contextlib.nullcontext()
+
+
+async def arun_job(job, limits=None):
+    """Async version of run_job, for running many jobs on one event loop.
+
+    It runs the stages of run_job on worker threads (see _in_thread); only
+    the Gemini calls and the wait for AssemblyAI happen on the loop. For
+    that wait the job is parked on its transcript as for the webhook. With
+    no webhook configured, arun_job polls the transcript itself and then
+    finishes the job.
+
+    `limits` comes from stage_limits(), shared by the jobs running together.
+    """
+    with metrics.collect():
+        job = await _arun_job(job, limits)
+    while job.status == GenerationJob.STATUS_WAITING and not settings.ASSEMBLYAI_WEBHOOK_URL:
+        with metrics.collect():
+            if not await _await_parked(job):
+                return job
+            job = await _arun_job(job, limits)
+    return job
+
+
+async def _arun_job(job, limits):
+    video_id = video_cache.extract_video_id(job.youtube_link)
+    try:
+        if job.regenerate:
+            async with _stage_slot(limits, 'generation'):
+                return await _aregenerate(job)
+
+        await _in_thread(_fetch_title)(job)
+        async with _stage_slot(limits, 'transcription'):
+            transcribed = await _in_thread(_transcription_stage)(job, video_id, park=True)
+        if transcribed is None:
+            return job
+        transcription, outline = transcribed
+
+        try:
+            async with _stage_slot(limits, 'generation'):
+                blog_content = await _acached_article(job, video_id, transcription, outline)
+        except Exception as e:
+            logging.error(f"Blog generation failed: {str(e)}")
+            return await _in_thread(_fail)(job, "Failed to generate blog content. Please try again.")
+        return await _in_thread(_save_article)(job, blog_content, transcription, outline)
+    except Exception as e:
+        logging.error(f"Error running job {job.id}: {str(e)}")
+        return await _in_thread(_fail)(job, "An unexpected error occurred. Please try again.")
+
+
+async def awork(worker_name, concurrency=100, poll_interval=2.0, once=False, limits=None, batch_id=None):
+    """Run up to `concurrency` jobs at a time on the current event loop.
+
+    Per-stage caps default to BLOG_TRANSCRIPTION_CONCURRENCY and
+    BLOG_GENERATION_CONCURRENCY. With `batch_id`, only that batch's jobs are claimed.
+    """
+    if limits is None:
+        limits = stage_limits(settings.BLOG_TRANSCRIPTION_CONCURRENCY, settings.BLOG_GENERATION_CONCURRENCY)
+    running = set()
+    last_waiting_check = 0
+    while True:
+        if time.monotonic() - last_waiting_check >= WAITING_CHECK_INTERVAL:
+            await _in_thread(check_waiting_jobs)()
+            last_waiting_check = time.monotonic()
+        while len(running) < concurrency:
+            job = await _in_thread(claim_next_job)(worker_name, batch_id)
+            if job is None:
+                break
+            running.add(asyncio.create_task(arun_job(job, limits)))
+
+        if not running:
+            if once:
+                return
+            await asyncio.sleep(poll_interval)
+            continue
+        _, running = await asyncio.wait(running, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+
+
+# Jobs started inside the ASGI server process; kept so the tasks are not
+# garbage collected while they run.
+_inline_tasks = set()
+
+
+async def astart_inline_job(job, worker_name):
+    """Claim a freshly queued job and run it on the server's event loop.
+
+    Returns False if a worker claimed the job first. Only call this from an
+    ASGI request; under WSGI the request's event loop ends with the response.
+    """
+    now = timezone.now()
+    claimed = await GenerationJob.objects.filter(
+        id=job.id, status=GenerationJob.STATUS_QUEUED
+    ).aupdate(
+        status=GenerationJob.STATUS_RUNNING,
+        worker=worker_name,
+        started_at=now,
+        heartbeat_at=now,
+    )
+    if not claimed:
+        return False
+    job.status = GenerationJob.STATUS_RUNNING
+    task = asyncio.create_task(arun_job(job))
+    _inline_tasks.add(task)
+    task.add_done_callback(_inline_tasks.discard)
+    return True
@@ -0,0 +1,319 @@
+"""Admission control for external backends and per-user job quotas.
+
+Every call to YouTube, AssemblyAI or Gemini goes through backend() (or
+abackend() on the event loop). That context manager:
+
+1. takes a token from the backend's token bucket, waiting if it is empty,
+2. takes one of the backend's concurrency slots, waiting if all are in use.
+
+It raises BackendBusy if it could not do both within BACKEND_WAIT_TIMEOUT.
+When the block raises the provider's own rate limit error (HTTP 429), the
+backend is blocked for every caller for BACKEND_RATE_LIMIT_BACKOFF seconds
+(see report_rate_limited()), so that retries do not pile on.
+
+The token buckets and blocks live in the default cache under "limits:" keys
+and rely only on the atomic add/incr operations. That cache is shared by
+every web and worker process (the database, or Redis; see cache_backends.py),
+and so are the limits. The concurrency slots are BackendSlot rows, each
+taken and given back by a single conditional UPDATE.
+
+check_admission() is the per-user side. Views call it before queuing work
+and answer 429 with Retry-After when it refuses.
+"""
+import asyncio
+import contextlib
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Subquery
+from django.utils import timezone
+
+from .models import BackendSlot, GenerationJob
+
+PREFIX = 'limits:'
+
+# A caller waiting for a concurrency slot checks again after
+# SLOT_POLL_INTERVAL * retry_delay(attempt) seconds, at most SLOT_POLL_MAX_INTERVAL.
+SLOT_POLL_INTERVAL = 0.1
+SLOT_POLL_MAX_INTERVAL = 5
+
+# Longest pause retry_delay() returns.
+RETRY_DELAY_CAP = 60
+
+# Retry-After for a user who already has USER_MAX_ACTIVE_JOBS in progress
+# and for a full queue; jobs usually take a minute or two.
+ACTIVE_JOBS_RETRY_AFTER = 30
+QUEUE_FULL_RETRY_AFTER = 60
+
+_RATE_LIMIT_ERRORS = ('ResourceExhausted', 'TooManyRequests', 'RateLimitError')
+
+
+class BackendBusy(Exception):
+    def __init__(self, backend, retry_after):
+        super().__init__(f"{backend} is at capacity; retry in {retry_after:.0f}s")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _config(backend):
+    return settings.BACKEND_LIMITS.get(backend) or {}
+
+
+def _bucket_keys(backend):
+    return f"{PREFIX}{backend}:start", f"{PREFIX}{backend}:taken"
+
+
+def _blocked_key(backend):
+    return f"{PREFIX}{backend}:blocked"
+
+
+def _blocked_for(blocked_until):
+    return max((blocked_until or 0) - time.time(), 0)
+
+
+def _token_wait(backend, start, taken, now):
+    """Seconds until the token just counted in `taken` may be used.
+
+    The bucket is a counter of tokens taken against the tokens earned since
+    `start` (a full bucket, then `rate` per second). Returns the wait and
+    how many idle tokens above the burst size to forfeit.
+    """
+    config = _config(backend)
+    rate, burst = config['rate'], config.get('burst') or 1
+    # Another process may have started the bucket just after `now` was read.
+    earned = burst + max(now - start, 0) * rate
+    # Tokens earned while idle beyond a full bucket are forfeited, so a
+    # quiet hour does not turn into an unlimited burst.
+    forfeit = int(earned - (taken - 1) - burst)
+    taken += max(forfeit, 0)
+    wait = max((taken - earned) / rate, 0)
+    return wait, max(forfeit, 0)
+
+
+def _reserve_token(backend):
+    start_key, taken_key = _bucket_keys(backend)
+    now = time.time()
+    cache.add(start_key, now, timeout=None)
+    cache.add(taken_key, 0, timeout=None)
+    start = cache.get(start_key, now)
+    taken = cache.incr(taken_key)
+    wait, forfeit = _token_wait(backend, start, taken, now)
+    if forfeit:
+        cache.incr(taken_key, forfeit)
+    return wait
+
+
+async def _areserve_token(backend):
+    start_key, taken_key = _bucket_keys(backend)
+    now = time.time()
+    await cache.aadd(start_key, now, timeout=None)
+    await cache.aadd(taken_key, 0, timeout=None)
+    start = await cache.aget(start_key, now)
+    taken = await cache.aincr(taken_key)
+    wait, forfeit = _token_wait(backend, start, taken, now)
+    if forfeit:
+        await cache.aincr(taken_key, forfeit)
+    return wait
+
+
+def _free_slots(now):
+    # Nobody holds the slot, or its holder's lease ran out.
+    return Q(holder='') | Q(expires_at__lt=now)
+
+
+def _slots(backend):
+    return BackendSlot.objects.filter(backend=backend, slot__lt=_config(backend)['concurrency'])
+
+
+def _slot_update(backend, holder):
+    """The UPDATE that gives `holder` one free slot of `backend`, and its values.
+
+    The outer filter repeats the subquery's condition, so that of two
+    callers picking the same row only the first one's UPDATE matches it.
+    """
+    now = timezone.now()
+    # A random free slot, so that concurrent callers rarely pick the same one.
+    candidate = _slots(backend).filter(_free_slots(now)).order_by('?').values('id')[:1]
+    queryset = BackendSlot.objects.filter(_free_slots(now), id__in=Subquery(candidate))
+    expires_at = now + timedelta(seconds=settings.BACKEND_SLOT_TIMEOUT)
+    return queryset, {'holder': holder, 'expires_at': expires_at}
+
+
+def _slot_counts():
+    return {'total': Count('id'), 'free': Count('id', filter=_free_slots(timezone.now()))}
+
+
+def _missing_slots(backend):
+    return [BackendSlot(backend=backend, slot=slot) for slot in range(_config(backend)['concurrency'])]
+
+
+def _acquire_slot(backend, holder):
+    """Take a slot of `backend` for `holder`; returns whether one was free."""
+    while True:
+        queryset, values = _slot_update(backend, holder)
+        if queryset.update(**values):
+            return True
+        counts = _slots(backend).aggregate(**_slot_counts())
+        if counts['total'] < _config(backend)['concurrency']:
+            # The rows are created on first use, and more when the limit is raised.
+            BackendSlot.objects.bulk_create(_missing_slots(backend), ignore_conflicts=True)
+        elif not counts['free']:
+            return False
+        # Otherwise another caller took the slot this one picked; try another.
+
+
+async def _aacquire_slot(backend, holder):
+    while True:
+        queryset, values = _slot_update(backend, holder)
+        if await queryset.aupdate(**values):
+            return True
+        counts = await _slots(backend).aaggregate(**_slot_counts())
+        if counts['total'] < _config(backend)['concurrency']:
+            await BackendSlot.objects.abulk_create(_missing_slots(backend), ignore_conflicts=True)
+        elif not counts['free']:
+            return False
+
+
+def _release_slot(backend, holder):
+    # After a lease timeout the slot may belong to someone else by now, so
+    # only a slot `holder` still holds is freed.
+    BackendSlot.objects.filter(backend=backend, holder=holder).update(holder='', expires_at=None)
+
+
+async def _arelease_slot(backend, holder):
+    await BackendSlot.objects.filter(backend=backend, holder=holder).aupdate(holder='', expires_at=None)
+
+
+def _slot_poll_delay(attempt, deadline):
+    return min(SLOT_POLL_INTERVAL * retry_delay(attempt), SLOT_POLL_MAX_INTERVAL, max(deadline - time.monotonic(), 0))
+
+
+@contextlib.contextmanager
+def backend(name, slot=True):
+    """Hold a token and (with `slot`) a concurrency slot of backend `name` for the block."""
+    config = _config(name)
+    deadline = time.monotonic() + settings.BACKEND_WAIT_TIMEOUT
+    wait = _reserve_token(name) if config.get('rate') else 0
+    wait = max(wait, _blocked_for(cache.get(_blocked_key(name))))
+    if time.monotonic() + wait > deadline:
+        if config.get('rate'):
+            cache.decr(_bucket_keys(name)[1])
+        raise BackendBusy(name, wait)
+    time.sleep(wait)
+
+    held = False
+    holder = uuid.uuid4().hex
+    if slot and config.get('concurrency'):
+        attempt = 0
+        while not (held := _acquire_slot(name, holder)):
+            if time.monotonic() >= deadline:
+                raise BackendBusy(name, SLOT_POLL_MAX_INTERVAL)
+            time.sleep(_slot_poll_delay(attempt, deadline))
+            attempt += 1
+    try:
+        yield
+    except Exception as e:
+        if is_rate_limit_error(e):
+            report_rate_limited(name)
+        raise
+    finally:
+        if held:
+            _release_slot(name, holder)
+
+
+@contextlib.asynccontextmanager
+async def abackend(name, slot=True):
+    """Async version of backend(); waits without blocking the event loop."""
+    config = _config(name)
+    deadline = time.monotonic() + settings.BACKEND_WAIT_TIMEOUT
+    wait = await _areserve_token(name) if config.get('rate') else 0
+    wait = max(wait, _blocked_for(await cache.aget(_blocked_key(name))))
+    if time.monotonic() + wait > deadline:
+        if config.get('rate'):
+            await cache.adecr(_bucket_keys(name)[1])
+        raise BackendBusy(name, wait)
+    await asyncio.sleep(wait)
+
+    held = False
+    holder = uuid.uuid4().hex
+    if slot and config.get('concurrency'):
+        attempt = 0
+        while not (held := await _aacquire_slot(name, holder)):
+            if time.monotonic() >= deadline:
+                raise BackendBusy(name, SLOT_POLL_MAX_INTERVAL)
+            await asyncio.sleep(_slot_poll_delay(attempt, deadline))
+            attempt += 1
+    try:
+        yield
+    except Exception as e:
+        if is_rate_limit_error(e):
+            await areport_rate_limited(name)
+        raise
+    finally:
+        if held:
+            await _arelease_slot(name, holder)
+
+
+def is_rate_limit_error(error):
+    """Whether `error` is a provider refusing a call for rate (HTTP 429)."""
+    if getattr(error, 'code', None) == 429 or getattr(error, 'status_code', None) == 429:
+        return True
+    # yt_dlp only passes the HTTP error on as text.
+    return type(error).__name__ in _RATE_LIMIT_ERRORS or 'HTTP Error 429' in str(error)
+
+
+def report_rate_limited(name, retry_after=None):
+    """Stop every caller from using backend `name` for `retry_after` seconds."""
+    retry_after = retry_after or settings.BACKEND_RATE_LIMIT_BACKOFF
+    cache.set(_blocked_key(name), time.time() + retry_after, timeout=retry_after)
+
+
+async def areport_rate_limited(name, retry_after=None):
+    retry_after = retry_after or settings.BACKEND_RATE_LIMIT_BACKOFF
+    await cache.aset(_blocked_key(name), time.time() + retry_after, timeout=retry_after)
+
+
+def retry_delay(attempt):
+    """Exponential backoff with jitter, so failed callers do not retry in lockstep."""
+    return min(2 ** attempt, RETRY_DELAY_CAP) * random.uniform(0.5, 1.0)
+
+
+def check_admission(user, new_jobs=1):
+    """Return (message, retry_after) if `user` may not queue `new_jobs` more jobs now, else None."""
+    active_statuses = [GenerationJob.STATUS_QUEUED, GenerationJob.STATUS_RUNNING, GenerationJob.STATUS_WAITING]
+    if settings.MAX_QUEUED_JOBS:
+        if GenerationJob.objects.filter(status=GenerationJob.STATUS_QUEUED).count() >= settings.MAX_QUEUED_JOBS:
+            return "The service is busy. Please try again shortly.", QUEUE_FULL_RETRY_AFTER
+
+    jobs = GenerationJob.objects.filter(user=user)
+    if settings.USER_MAX_ACTIVE_JOBS:
+        # Batch jobs are paced by the workers' stage limits instead.
+        active = jobs.filter(status__in=active_statuses, batch__isnull=True)
+        if active.count() >= settings.USER_MAX_ACTIVE_JOBS:
+            return "Too many articles in progress. Please wait for one to finish.", ACTIVE_JOBS_RETRY_AFTER
+
+    if settings.USER_DAILY_JOB_LIMIT:
+        window_start = timezone.now() - timedelta(days=1)
+        recent = list(
+            jobs.filter(created_at__gte=window_start).order_by('-created_at')
+            .values_list('created_at', flat=True)[:settings.USER_DAILY_JOB_LIMIT]
+        )
+        if len(recent) + new_jobs > settings.USER_DAILY_JOB_LIMIT:
+            # Capacity frees up as the jobs that fill the quota leave the window.
+            freed_needed = len(recent) + new_jobs - settings.USER_DAILY_JOB_LIMIT
+            if freed_needed > len(recent):
+                return "This request is larger than the daily limit.", None
+            frees_at = recent[-freed_needed] + timedelta(days=1)
+            retry_after = max(1, int((frees_at - timezone.now()).total_seconds()) + 1)
+            return "Daily article limit reached.", retry_after
+    return None
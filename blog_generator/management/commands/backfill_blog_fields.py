@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog_generator import search
+from blog_generator.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Fill in BlogPost's derived fields (excerpt, plain text, word count, reading time) for existing posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts read and updated per batch.')
+        parser.add_argument(
+            '--all', dest='recompute_all', action='store_true',
+            help='Recompute every post, not only those that have never been filled in.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        posts = BlogPost.objects.order_by('id').only('id', 'generated_content')
+        if not options['recompute_all']:
+            posts = posts.filter(plain_text='').exclude(generated_content='')
+
+        # iterator() streams rows instead of caching the queryset, so memory
+        # stays at one batch of articles however many posts there are.
+        started = time.monotonic()
+        updated = 0
+        batch = []
+        for post in posts.iterator(chunk_size=batch_size):
+            post.set_derived_fields()
+            # Changes the ETag, so cached detail pages are re-rendered.
+            post.updated_at = timezone.now()
+            batch.append(post)
+            if len(batch) == batch_size:
+                updated += self._flush(batch, started)
+        if batch:
+            updated += self._flush(batch, started)
+
+        elapsed = time.monotonic() - started
+        rate = updated / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} post(s) in {elapsed:.1f}s ({rate:.0f} posts/s)"))
+
+    def _flush(self, batch, started):
+        BlogPost.objects.bulk_update(batch, [*BlogPost.DERIVED_FIELDS, 'updated_at'])
+        search.index_posts(BlogPost.objects.filter(id__in=[post.id for post in batch]))
+        count = len(batch)
+        batch.clear()
+        self.stdout.write(f"  {count} post(s) updated, {time.monotonic() - started:.1f}s elapsed")
+        return count
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog_generator import pipeline
+
+
+class Command(BaseCommand):
+    help = 'Delete audio files left in MEDIA_ROOT/temp_audio by crashed or killed workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age', type=int, default=settings.TEMP_AUDIO_MAX_AGE,
+            help='Only delete files last modified at least this many seconds ago.',
+        )
+
+    def handle(self, *args, **options):
+        removed = pipeline.clean_temp_audio(options['max_age'])
+        self.stdout.write(f"Removed {removed} temp audio file(s)")
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import socket
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Queue blog generation for every video in playlists, channels or lists of links, and optionally run it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('links', nargs='*', help='Video, playlist or channel URLs.')
+        parser.add_argument('--file', help='Read more links from this file, one per line.')
+        parser.add_argument('--user', required=True, help='Username that will own the articles.')
+        parser.add_argument('--title', default='', help='Name for the batch.')
+        parser.add_argument(
+            '--run', action='store_true',
+            help="Run the batch in this process (on an event loop, like run_blog_workers --async) and report throughput.",
+        )
+        parser.add_argument('--concurrency', type=int, default=50, help='Jobs in flight with --run.')
+        parser.add_argument(
+            '--transcription-concurrency', type=int, default=settings.BLOG_TRANSCRIPTION_CONCURRENCY,
+            help='Jobs transcribing at once with --run (0 = no separate cap).',
+        )
+        parser.add_argument(
+            '--generation-concurrency', type=int, default=settings.BLOG_GENERATION_CONCURRENCY,
+            help='Jobs generating at once with --run (0 = no separate cap).',
+        )
+        parser.add_argument('--progress-interval', type=float, default=10.0, help='Seconds between progress lines.')
+
+    def handle(self, *args, **options):
+        from blog_generator import limits
+        from blog_generator.jobs import enqueue_batch
+
+        links = list(options['links'])
+        if options['file']:
+            with open(options['file']) as f:
+                links += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']}")
+
+        started = time.monotonic()
+        try:
+            batch = enqueue_batch(user, links, title=options['title'])
+        except (ValueError, limits.QuotaExceeded) as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Queued batch {batch.id}: {batch.jobs.count()} video(s) in {time.monotonic() - started:.1f}s"
+        )
+        if options['run']:
+            # async_to_sync keeps the worker's database calls on this thread's connection.
+            async_to_sync(self._run)(batch, options)
+
+    async def _run(self, batch, options):
+        from blog_generator.jobs import awork, stage_limits
+
+        limits = stage_limits(options['transcription_concurrency'], options['generation_concurrency'])
+        worker_name = f"{socket.gethostname()}-{os.getpid()}-batch{batch.id}"
+        started = time.monotonic()
+        task = asyncio.create_task(awork(
+            worker_name, concurrency=max(1, options['concurrency']), poll_interval=0.5, once=True,
+            limits=limits, batch_id=batch.id,
+        ))
+        while True:
+            done, _ = await asyncio.wait([task], timeout=options['progress_interval'])
+            self._report(await sync_to_async(batch.progress)(), time.monotonic() - started)
+            if done:
+                await task
+                return
+
+    def _report(self, progress, elapsed):
+        # Wall-clock rate for the run so far, including jobs still in flight.
+        per_hour = progress['completed'] / elapsed * 3600 if elapsed else 0
+        self.stdout.write(
+            f"[{elapsed:7.1f}s] {progress['done']}/{progress['total']} done  "
+            f"completed={progress['completed']} failed={progress['failed']} "
+            f"running={progress['running']} waiting={progress['waiting']} queued={progress['queued']}  "
+            f"throughput={per_hour:.1f} videos/hour"
+        )
@@ -0,0 +1,90 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_main(worker_name, poll_interval, once, concurrency=None, metrics_port=None):
+    # Imported here so that spawned (non-forked) children can set Django up
+    # before the models are loaded.
+    import django
+    django.setup()
+
+    from blog_generator import clients
+    clients.warm_up()
+
+    if metrics_port:
+        from blog_generator import metrics
+        metrics.start_http_server(metrics_port)
+
+    from blog_generator.jobs import awork, work
+    if concurrency:
+        asyncio.run(awork(worker_name, concurrency=concurrency, poll_interval=poll_interval, once=once))
+    else:
+        work(worker_name, poll_interval=poll_interval, once=once)
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker processes that execute queued blog generation jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker processes.')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained.')
+        parser.add_argument(
+            '--async', dest='use_async', action='store_true',
+            help='Run jobs concurrently on an event loop in each worker process.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=100,
+            help='Jobs in flight per worker process with --async.',
+        )
+        parser.add_argument(
+            '--metrics-port', type=int,
+            help='Serve each worker\'s Prometheus metrics on /metrics, from this port upwards.',
+        )
+
+    def handle(self, *args, **options):
+        from blog_generator.jobs import requeue_stale_jobs
+        from blog_generator.pipeline import clean_temp_audio
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+        removed = clean_temp_audio()
+        if removed:
+            self.stdout.write(f"Removed {removed} orphaned temp audio file(s)")
+
+        workers = max(1, options['workers'])
+        base_name = f"{socket.gethostname()}-{os.getpid()}"
+        concurrency = max(1, options['concurrency']) if options['use_async'] else None
+        metrics_port = options['metrics_port']
+        if workers == 1:
+            _worker_main(f"{base_name}-0", options['poll_interval'], options['once'], concurrency, metrics_port)
+            return
+
+        # Children must not share the parent's database connection.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(
+                    f"{base_name}-{i}", options['poll_interval'], options['once'], concurrency,
+                    metrics_port + i if metrics_port else None,
+                ),
+                daemon=True,
+            )
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {workers} blog worker(s)"))
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
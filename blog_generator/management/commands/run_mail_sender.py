@@ -0,0 +1,21 @@
+import os
+import socket
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Send the queued outgoing mail, in batches over reused SMTP connections.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to wait when nothing is due.')
+        parser.add_argument('--batch-size', type=int, help='Messages sent per connection (default MAIL_BATCH_SIZE).')
+        parser.add_argument('--once', action='store_true', help='Exit once nothing is due.')
+
+    def handle(self, *args, **options):
+        from blog_generator.outbox import work
+
+        work(
+            f"{socket.gethostname()}-{os.getpid()}",
+            poll_interval=options['poll_interval'], once=options['once'], batch_size=options['batch_size'],
+        )
@@ -0,0 +1,233 @@
+"""Timings and counts of the generation pipeline in the Prometheus text format.
+
+Each stage of a job runs inside span(), which feeds the
+blog_stage_duration_seconds histogram:
+
+    metadata            yt_dlp extraction of the video info
+    captions            fetching and checking YouTube captions
+    download            downloading the audio, when it cannot be streamed
+    transcode           FFmpeg converting that download to mp3
+    upload              uploading the audio to AssemblyAI and submitting it;
+                        streamed audio is downloaded and transcoded meanwhile
+    transcription_wait  waiting for AssemblyAI to finish
+    generation          Gemini calls
+    save                writing the article to the database
+
+The counters record audio bytes, audio duration, transcript characters,
+Gemini tokens and job outcomes.
+
+The metrics live in the memory of each process. render() writes them out for
+the /metrics view of the web process. run_blog_workers --metrics-port serves
+each worker's from a port of its own. Prometheus adds the processes up.
+
+Spans also go to the collector of the code around them (see collect()).
+run_job keeps per-job stage totals on the job this way. With
+BLOG_TIMING_HEADER, the middleware sends a request's spans as a
+Server-Timing header.
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stages take from well under a second (a cached lookup) to half an hour (a
+# long transcription).
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_registry = []
+_timings = contextvars.ContextVar('blog_generator_timings', default=None)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with _lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + (('le', _format_value(float(bound))),), cumulative
+            yield f"{self.name}_count", labels, cumulative
+            yield f"{self.name}_sum", labels, total
+
+
+STAGE_SECONDS = Histogram(
+    'blog_stage_duration_seconds', 'Time spent in each stage of generating an article.', STAGE_BUCKETS, ['stage'],
+)
+REQUEST_SECONDS = Histogram(
+    'blog_http_request_duration_seconds', 'Time to answer a request, by view.', REQUEST_BUCKETS, ['view'],
+)
+JOBS = Counter('blog_jobs_total', 'Generation jobs finished, by outcome.', ['status'])
+AUDIO_BYTES = Counter(
+    'blog_audio_bytes_total', 'Audio bytes downloaded from YouTube and uploaded to AssemblyAI.', ['direction'],
+)
+TEMP_AUDIO_BYTES = Counter(
+    'blog_temp_audio_bytes_total', 'Audio bytes downloaded to temp_audio because they could not be streamed.',
+)
+AUDIO_SECONDS = Counter('blog_audio_duration_seconds_total', 'Duration of the audio sent for transcription.')
+TRANSCRIPT_CHARACTERS = Counter(
+    'blog_transcript_characters_total', 'Characters of transcript text, by where it came from.', ['source'],
+)
+GEMINI_TOKENS = Counter('blog_gemini_tokens_total', 'Gemini tokens used, by prompt or output.', ['kind'])
+
+
+class _Collector:
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.totals[stage] = self.totals.get(stage, 0) + seconds
+
+
+@contextlib.contextmanager
+def collect():
+    """Gather the spans of the enclosed code, including its tasks and to_thread calls.
+
+    Yields a dict of seconds per stage that fills in as spans end. Work
+    handed to an executor only reports here if wrapped with bind().
+    """
+    collector = _Collector()
+    token = _timings.set(collector)
+    try:
+        yield collector.totals
+    finally:
+        _timings.reset(token)
+
+
+def bind(func):
+    """Return `func` bound to a copy of the current context, to hand to an executor once.
+
+    Spans in the thread that runs it then reach the caller's collect().
+    """
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def current_timings():
+    """Seconds per stage gathered so far by the innermost collect(), or None."""
+    collector = _timings.get()
+    return dict(collector.totals) if collector else None
+
+
+def observe(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    collector = _timings.get()
+    if collector is not None:
+        collector.add(stage, seconds)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Time the block as `stage`, whether it succeeds or fails."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def record_usage(response):
+    """Count the tokens of a Gemini response, or of the last chunk of a stream."""
+    usage = getattr(response, 'usage_metadata', None)
+    for kind, field in (('prompt', 'prompt_token_count'), ('output', 'candidates_token_count')):
+        count = getattr(usage, field, None)
+        if isinstance(count, int) and count:
+            GEMINI_TOKENS.inc(count, kind=kind)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def start_http_server(port, addr=''):
+    """Serve render() on http://addr:port/metrics from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,37 @@
+"""Per-request timing: the request duration histogram and an optional Server-Timing header."""
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from . import metrics
+
+
+def _finish(request, response, timings, started):
+    elapsed = time.perf_counter() - started
+    match = getattr(request, 'resolver_match', None)
+    metrics.REQUEST_SECONDS.observe(elapsed, view=(match and match.url_name) or 'unmatched')
+    if settings.BLOG_TIMING_HEADER:
+        # Shown per stage in the browser's network panel.
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+        entries.append(f"total;dur={elapsed * 1000:.1f}")
+        response['Server-Timing'] = ', '.join(entries)
+    return response
+
+
+@sync_and_async_middleware
+def timing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            with metrics.collect() as timings:
+                response = await get_response(request)
+            return _finish(request, response, timings, started)
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            with metrics.collect() as timings:
+                response = get_response(request)
+            return _finish(request, response, timings, started)
+    return middleware
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0005_cachecounter_videocacheentry_videocachelease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='partial_content',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='stream',
+            field=models.BooleanField(default=False),
+        ),
+    ]
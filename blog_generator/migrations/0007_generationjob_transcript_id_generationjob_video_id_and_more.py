@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0006_generationjob_partial_content_generationjob_stream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='transcript_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='generationjob',
+            name='video_id',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='generationjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('waiting', 'Waiting for transcript'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0007_generationjob_transcript_id_generationjob_video_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='transcript_source',
+            field=models.CharField(blank=True, choices=[('captions', 'YouTube captions'), ('asr', 'Speech recognition'), ('cache', 'Cached transcript')], max_length=20),
+        ),
+    ]
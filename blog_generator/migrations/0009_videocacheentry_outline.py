@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0008_generationjob_transcript_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videocacheentry',
+            name='outline',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0009_videocacheentry_outline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='blog_genera_user_id_51fbdc_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.5 on 2026-10-18 01:56
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX blog_generator_blogpost_search_idx ON blog_generator_blogpost USING gin (search_vector)",
+    """
+    UPDATE blog_generator_blogpost SET search_vector =
+        setweight(to_tsvector('english'::regconfig, COALESCE(youtube_title, '')), 'A')
+        || setweight(to_tsvector('english'::regconfig, COALESCE(plain_text, '')), 'B')
+    """,
+]
+POSTGRES_BACKWARD = ["DROP INDEX IF EXISTS blog_generator_blogpost_search_idx"]
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE blog_generator_blogpost_fts USING fts5(youtube_title, plain_text)",
+    """
+    INSERT INTO blog_generator_blogpost_fts (rowid, youtube_title, plain_text)
+    SELECT id, youtube_title, plain_text FROM blog_generator_blogpost
+    """,
+]
+SQLITE_BACKWARD = ["DROP TABLE IF EXISTS blog_generator_blogpost_fts"]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0011_blogpost_excerpt_blogpost_plain_text_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
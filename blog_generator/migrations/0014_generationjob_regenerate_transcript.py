@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0013_blogpost_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='regenerate',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='Transcript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('compressed_text', models.BinaryField()),
+                ('compressed_outline', models.BinaryField(blank=True, null=True)),
+                ('language', models.CharField(blank=True, max_length=20)),
+                ('duration', models.PositiveIntegerField(blank=True, null=True)),
+                ('source', models.CharField(blank=True, choices=[('captions', 'YouTube captions'), ('asr', 'Speech recognition'), ('cache', 'Cached transcript')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blog_post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='transcript', to='blog_generator.blogpost')),
+            ],
+        ),
+    ]
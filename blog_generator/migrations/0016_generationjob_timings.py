@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0015_generationbatch_generationjob_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.5 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_generator', '0019_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackendSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('backend', models.CharField(max_length=20)),
+                ('slot', models.PositiveIntegerField()),
+                ('holder', models.CharField(blank=True, default='', max_length=32)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('backend', 'slot'), name='unique_backend_slot')],
+            },
+        ),
+    ]
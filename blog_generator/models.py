@@ -1,7 +1,24 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Count, Max, Min
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.text import Truncator
+import hashlib
+import json
+import logging
+import math
+import zlib
+from datetime import timedelta
+
+from . import postprocess, search
+
+# Length of BlogPost.excerpt, and the reading speed behind reading_time.
+EXCERPT_CHARS = 200
+READING_WORDS_PER_MINUTE = 200
 
 # Create your models here.
 class BlogPost(models.Model):
@@ -10,13 +27,270 @@ class BlogPost(models.Model):
     youtube_link = models.URLField()
     generated_content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Derived from generated_content on save (see set_derived_fields), so
+    # pages never have to parse article HTML to show them.
+    excerpt = models.CharField(max_length=EXCERPT_CHARS, blank=True, default='')
+    plain_text = models.TextField(blank=True, default='')
+    word_count = models.PositiveIntegerField(default=0)
+    reading_time = models.PositiveSmallIntegerField(default=0)  # minutes
+    # PostgreSQL only, GIN-indexed; see search.py. Unused on SQLite.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    DERIVED_FIELDS = ['excerpt', 'plain_text', 'word_count', 'reading_time']
+
+    class Meta:
+        indexes = [
+            # blog_list pages through a user's posts newest first; id breaks
+            # ties between posts saved in the same instant.
+            models.Index(fields=['user', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return self.youtube_title
 
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+            if 'generated_content' in update_fields:
+                kwargs['update_fields'].update(self.DERIVED_FIELDS)
+        super().save(*args, **kwargs)
+        if update_fields is None or {'youtube_title', 'generated_content'} & set(update_fields):
+            search.index_posts(BlogPost.objects.filter(pk=self.pk))
+
+    def set_derived_fields(self):
+        text = postprocess.plain_text(self.generated_content)
+        words = len(text.split())
+        self.plain_text = text
+        self.excerpt = Truncator(' '.join(text.split())).chars(EXCERPT_CHARS)
+        self.word_count = words
+        self.reading_time = math.ceil(words / READING_WORDS_PER_MINUTE) if words else 0
+
+class GenerationBatch(models.Model):
+    """A set of jobs queued together from a playlist, a channel or a list of links."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.title or f"Batch {self.id}"
+
+    def progress(self):
+        """Job counts by status and, once jobs have finished, completed videos per hour."""
+        counts = dict(self.jobs.order_by().values_list('status').annotate(count=Count('id')))
+        times = self.jobs.aggregate(started=Min('started_at'), finished=Max('finished_at'))
+        completed = counts.get(GenerationJob.STATUS_COMPLETED, 0)
+        progress = {status: counts.get(status, 0) for status, _label in GenerationJob.STATUS_CHOICES}
+        progress['total'] = sum(counts.values())
+        progress['done'] = completed + counts.get(GenerationJob.STATUS_FAILED, 0)
+        progress['videos_per_hour'] = None
+        if completed and times['started'] and times['finished'] and times['finished'] > times['started']:
+            hours = (times['finished'] - times['started']).total_seconds() / 3600
+            progress['videos_per_hour'] = round(completed / hours, 1)
+        return progress
+
+class GenerationJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_WAITING = 'waiting'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_WAITING, 'Waiting for transcript'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    SOURCE_CAPTIONS = 'captions'
+    SOURCE_ASR = 'asr'
+    SOURCE_CACHE = 'cache'
+    SOURCE_CHOICES = [
+        (SOURCE_CAPTIONS, 'YouTube captions'),
+        (SOURCE_ASR, 'Speech recognition'),
+        (SOURCE_CACHE, 'Cached transcript'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    youtube_link = models.URLField()
+    youtube_title = models.CharField(max_length=200, blank=True)
+    video_id = models.CharField(max_length=20, blank=True, db_index=True)
+    transcript_id = models.CharField(max_length=100, blank=True, db_index=True)
+    transcript_source = models.CharField(max_length=20, choices=SOURCE_CHOICES, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    stage = models.CharField(max_length=50, blank=True)
+    error = models.TextField(blank=True)
+    stream = models.BooleanField(default=False)
+    partial_content = models.TextField(blank=True)
+    blog_post = models.ForeignKey(BlogPost, on_delete=models.SET_NULL, null=True, blank=True)
+    # Rewrite blog_post from its stored Transcript instead of starting from the video.
+    regenerate = models.BooleanField(default=False)
+    batch = models.ForeignKey(GenerationBatch, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    worker = models.CharField(max_length=100, blank=True)
+    # Seconds spent in each pipeline stage (see metrics.py).
+    timings = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.youtube_link} ({self.status})"
+
+class Transcript(models.Model):
+    """The transcript an article was written from, kept so it can be regenerated.
+
+    Text and outline are stored zlib-compressed in their own table; use the
+    text and outline properties. Nothing reads this table unless a single
+    post's transcript is asked for.
+    """
+    blog_post = models.OneToOneField(BlogPost, on_delete=models.CASCADE, related_name='transcript')
+    compressed_text = models.BinaryField()
+    compressed_outline = models.BinaryField(null=True, blank=True)  # chapters and entities, as JSON
+    language = models.CharField(max_length=20, blank=True)
+    duration = models.PositiveIntegerField(null=True, blank=True)  # seconds
+    source = models.CharField(max_length=20, choices=GenerationJob.SOURCE_CHOICES, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Transcript of {self.blog_post_id}"
+
+    @property
+    def text(self):
+        return zlib.decompress(bytes(self.compressed_text)).decode()
+
+    @text.setter
+    def text(self, value):
+        self.compressed_text = zlib.compress(value.encode())
+
+    @property
+    def outline(self):
+        if self.compressed_outline is None:
+            return None
+        return json.loads(zlib.decompress(bytes(self.compressed_outline)))
+
+    @outline.setter
+    def outline(self, value):
+        self.compressed_outline = None if value is None else zlib.compress(json.dumps(value).encode())
+
+class VideoCacheEntry(models.Model):
+    video_id = models.CharField(max_length=20, unique=True)
+    transcript = models.TextField(null=True, blank=True)
+    article = models.TextField(null=True, blank=True)
+    # Chapters and entities from AssemblyAI, for chaptered generation.
+    outline = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.video_id
+
+class VideoCacheLease(models.Model):
+    key = models.CharField(max_length=50, unique=True)
+    expires_at = models.DateTimeField()
+
+class CacheCounter(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+class BackendSlot(models.Model):
+    """One of the concurrency slots of an external backend (see limits.py).
+
+    A free slot has no holder; a held one is free again after expires_at.
+    """
+    backend = models.CharField(max_length=20)
+    slot = models.PositiveIntegerField()
+    holder = models.CharField(max_length=32, blank=True, default='')
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['backend', 'slot'], name='unique_backend_slot'),
+        ]
+
+def hash_reset_token(token):
+    """Reset tokens are random, so a plain SHA-256 is enough to keep them
+    unusable to anyone who reads the table."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    reset_token = models.CharField(max_length=100, null=True, blank=True)
+    # SHA-256 of the password reset token from the emailed link, and when
+    # it stops working. Only the hash is stored.
+    reset_token_hash = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    reset_token_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    TRACKED_FIELDS = ('reset_token_hash', 'reset_token_expires_at')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_values = self._tracked_values()
+
+    def _tracked_values(self):
+        return tuple(getattr(self, field) for field in self.TRACKED_FIELDS)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._saved_values = self._tracked_values()
+
+    def has_changed(self):
+        return self._tracked_values() != self._saved_values
+
+    def set_reset_token(self, token, ttl):
+        self.reset_token_hash = hash_reset_token(token)
+        self.reset_token_expires_at = timezone.now() + timedelta(seconds=ttl)
+
+    def clear_reset_token(self):
+        self.reset_token_hash = None
+        self.reset_token_expires_at = None
+
+    @classmethod
+    def clear_expired_reset_tokens(cls):
+        """Forget every expired token in one UPDATE; returns how many."""
+        return cls.objects.filter(reset_token_expires_at__lte=timezone.now()).update(
+            reset_token_hash=None, reset_token_expires_at=None,
+        )
+
+class OutgoingEmail(models.Model):
+    """A message waiting for the mail sender (see outbox.py)."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # When a pending message is due. A sender that claims it moves this
+    # forward by a lease, so a crashed sender's messages become due again.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -24,11 +298,32 @@ def create_user_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    """Save the user's loaded profile if it changed, or create a missing one.
+
+    Every login saves the user with update_fields=['last_login'], which
+    needs no profile work at all.
+    """
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
     try:
-        if hasattr(instance, 'profile'):
-            instance.profile.save()
+        if User.profile.is_cached(instance):
+            if instance.profile.has_changed():
+                instance.profile.save()
         else:
-            Profile.objects.create(user=instance)
+            # Users from before profiles existed get one on their next save.
+            Profile.objects.get_or_create(user=instance)
     except Exception as e:
-        print(f"Error saving profile: {e}")
+        logging.error(f"Error saving profile: {str(e)}")
+
+@receiver(post_delete, sender=BlogPost)
+def remove_blog_post_from_search(sender, instance, using, **kwargs):
+    search.remove_posts(using, [instance.pk])
+
+def blog_detail_cache_key(post_id):
+    return f"blog-detail:{post_id}"
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def invalidate_blog_detail(sender, instance, **kwargs):
+    cache.delete(blog_detail_cache_key(instance.pk))
@@ -0,0 +1,169 @@
+"""Outgoing mail, sent by a background worker instead of inside requests.
+
+queue_mail() only stores the message as an OutgoingEmail row, so a slow or
+unreachable mail server never holds up a web worker. run_mail_sender (see
+work()) claims the due messages in batches of MAIL_BATCH_SIZE and sends each
+batch over one SMTP connection. A message that fails is retried with
+exponential backoff and marked failed after MAIL_MAX_ATTEMPTS attempts.
+
+Claiming moves a message's next_attempt_at forward with a conditional
+UPDATE, so several senders never send the same message. The lease covers
+sending the whole batch, and is renewed for each message just before it is
+sent; a sender whose lease ran out (and whose message another sender has
+claimed since) skips it. The messages of a sender that dies mid-batch
+become due again once the lease runs out.
+
+The sender also clears expired password reset tokens every
+TOKEN_CLEANUP_INTERVAL seconds.
+"""
+import logging
+import smtplib
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import OutgoingEmail, Profile
+
+# A send is a few SMTP commands, each of which may take up to EMAIL_TIMEOUT
+# seconds; a claim leaves this many timeouts for each message.
+SEND_LEASE_TIMEOUTS = 4
+# Used for the lease when EMAIL_TIMEOUT is not set.
+DEFAULT_SEND_TIMEOUT = 60
+
+# Retries wait 30s, 1m, 2m, ... up to an hour.
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 60 * 60
+
+TOKEN_CLEANUP_INTERVAL = 60 * 10
+
+
+def queue_mail(subject, body, to, from_email=None):
+    return OutgoingEmail.objects.create(
+        subject=subject, body=body, to=list(to), from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+    )
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def _send_lease():
+    """How long a sender may take to send one message."""
+    return timedelta(seconds=SEND_LEASE_TIMEOUTS * (settings.EMAIL_TIMEOUT or DEFAULT_SEND_TIMEOUT))
+
+
+def claim_due(worker_name, limit):
+    """Claim up to `limit` due messages for `worker_name` and return them, oldest first."""
+    now = timezone.now()
+    due = OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at').values_list('id', flat=True)[:limit])
+    if not ids:
+        return []
+    # A per-claim worker value tells this claim's rows apart from earlier ones.
+    claim = f"{worker_name}:{uuid.uuid4().hex[:8]}"
+    # Enough time to connect and then send every message of the batch.
+    due.filter(id__in=ids).update(next_attempt_at=now + _send_lease() * (len(ids) + 1), worker=claim)
+    return list(OutgoingEmail.objects.filter(worker=claim, status=OutgoingEmail.STATUS_PENDING).order_by('id'))
+
+
+def _claimed(email):
+    return OutgoingEmail.objects.filter(id=email.id, worker=email.worker, status=OutgoingEmail.STATUS_PENDING)
+
+
+def _renew_lease(email):
+    """Extend the claim on `email` for one send; False if it is no longer this sender's."""
+    return bool(_claimed(email).update(next_attempt_at=timezone.now() + _send_lease()))
+
+
+def _release(emails):
+    # Due again at once, for this or any other sender.
+    OutgoingEmail.objects.filter(
+        id__in=[email.id for email in emails], status=OutgoingEmail.STATUS_PENDING,
+        worker__in={email.worker for email in emails},
+    ).update(next_attempt_at=timezone.now(), worker='')
+
+
+def _record_failure(email, error):
+    attempts = email.attempts + 1
+    logging.error(f"Sending email {email.id} failed (attempt {attempts}): {str(error)}")
+    update = {'attempts': attempts, 'last_error': str(error)}
+    if attempts >= settings.MAIL_MAX_ATTEMPTS:
+        update['status'] = OutgoingEmail.STATUS_FAILED
+    else:
+        update['next_attempt_at'] = timezone.now() + timedelta(seconds=retry_delay(attempts))
+    _claimed(email).update(**update)
+
+
+def _connection_lost(error):
+    # SMTP errors are OSErrors too, but apart from a disconnect they leave
+    # the session usable; errors that are not OSErrors (e.g. a bad header)
+    # happen before anything is sent.
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def send_batch(worker_name, batch_size=None):
+    """Send one batch of due messages over a single connection; returns (claimed, sent)."""
+    emails = claim_due(worker_name, batch_size or settings.MAIL_BATCH_SIZE)
+    if not emails:
+        return 0, 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for email in emails:
+            _record_failure(email, e)
+        return len(emails), 0
+
+    sent = 0
+    try:
+        for index, email in enumerate(emails):
+            if not _renew_lease(email):
+                logging.warning(f"Lost the claim on email {email.id}; leaving it to its new sender")
+                continue
+            message = EmailMessage(email.subject, email.body, email.from_email or None, email.to, connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                _record_failure(email, e)
+                if _connection_lost(e):
+                    # Reconnect once for the rest of the batch rather than
+                    # letting each send open and close its own connection.
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception as e:
+                        logging.error(f"Reconnecting to the mail server failed: {str(e)}")
+                        # The rest of the batch has not been tried; hand it back.
+                        _release(emails[index + 1:])
+                        break
+                continue
+            _claimed(email).update(
+                status=OutgoingEmail.STATUS_SENT, attempts=email.attempts + 1, sent_at=timezone.now(), last_error='',
+            )
+            sent += 1
+    finally:
+        connection.close()
+    return len(emails), sent
+
+
+def work(worker_name, poll_interval=5.0, once=False, batch_size=None):
+    """Send mail until stopped, or until nothing is due if `once`."""
+    last_cleanup = 0
+    while True:
+        close_old_connections()
+        if time.monotonic() - last_cleanup >= TOKEN_CLEANUP_INTERVAL:
+            Profile.clear_expired_reset_tokens()
+            last_cleanup = time.monotonic()
+        claimed, _sent = send_batch(worker_name, batch_size)
+        if not claimed:
+            if once:
+                return
+            time.sleep(poll_interval)
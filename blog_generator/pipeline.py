@@ -0,0 +1,931 @@
+from django.conf import settings
+from django.core.cache import cache
+import copy
+import difflib
+import hashlib
+import os
+import re
+import subprocess
+import time
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from . import captions, clients, limits, metrics, postprocess
+from .sdk import aai, yt_dlp
+from .video_cache import extract_video_id
+
+# Audio for transcription: one channel at 16 kHz is what the recogniser
+# uses, so more only adds bytes to download, store and upload.
+ASR_SAMPLE_RATE = 16000
+STREAM_BITRATE = '32k'
+DOWNLOAD_BITRATE = '64'
+# Protocols FFmpeg reads from directly, and the pipe-friendly container for
+# each native codec that AUDIO_STREAM_COPY can pass through unchanged.
+STREAM_PROTOCOLS = ('http', 'https', 'm3u8', 'm3u8_native')
+STREAM_COPY_CONTAINERS = {'opus': 'ogg', 'vorbis': 'ogg', 'mp4a': 'adts', 'aac': 'adts', 'mp3': 'mp3'}
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Status checks while AssemblyAI is transcribing start quickly and back off,
+# so short videos finish sooner and long ones send fewer requests.
+TRANSCRIPT_POLL_INITIAL_INTERVAL = 1.0
+TRANSCRIPT_POLL_MAX_INTERVAL = 15.0
+TRANSCRIPT_POLL_BACKOFF = 1.5
+
+# Long audio is cut at a pause when one is this close to the planned cut
+# (as a fraction of the chunk length). silencedetect parameters below.
+CHUNK_SILENCE_WINDOW = 0.1
+SILENCE_NOISE = '-30dB'
+SILENCE_MIN_DURATION = 0.5
+
+# Chunk transcripts are joined at the longest run of words they share within
+# this many words of the boundary; shorter runs are treated as coincidence.
+STITCH_WINDOW_WORDS = 80
+STITCH_MIN_MATCH = 3
+
+# Chaptered generation: the frame call puts this marker where the chapter
+# sections go, between the introduction and the conclusion.
+SECTIONS_MARKER = '<!-- sections -->'
+CHAPTERED_MIN_CHAPTERS = 2
+MAX_PROMPT_ENTITIES = 30
+
+# Header carrying ASSEMBLYAI_WEBHOOK_SECRET on completion callbacks.
+WEBHOOK_AUTH_HEADER = 'X-Webhook-Secret'
+
+# The parts of the yt_dlp info dict that the title lookup and the download
+# need. The full dict lists every format YouTube offers and is too large to
+# keep in the cache.
+_INFO_KEYS = (
+    'id', 'title', 'duration', 'webpage_url', 'original_url',
+    'extractor', 'extractor_key', 'language', 'format_id',
+)
+
+def yt_title(link):
+    try:
+        info = get_video_info(link)
+        return info.get('title', 'Untitled Video')
+    except Exception as e:
+        logging.error(f"Error getting title: {str(e)}")
+        return 'Untitled Video'
+
+def get_temp_dir():
+    return Path(settings.MEDIA_ROOT) / 'temp_audio'
+
+def get_temp_filepath():
+    temp_dir = get_temp_dir()
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    return temp_dir / f"{uuid.uuid4()}.mp3"
+
+def clean_temp_audio(max_age=None):
+    """Delete temp_audio files older than `max_age` seconds and return how many.
+
+    Every job removes its own files, so old ones were left by a worker that
+    crashed or was killed mid-job. TEMP_AUDIO_MAX_AGE is well above the
+    longest download and transcription, so files in use are never touched.
+    """
+    if max_age is None:
+        max_age = settings.TEMP_AUDIO_MAX_AGE
+    cutoff = time.time() - max_age
+    removed = 0
+    if not get_temp_dir().is_dir():
+        return removed
+    for path in get_temp_dir().iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            # Removed by its own job meanwhile.
+            continue
+    return removed
+
+def _metadata_cache_key(link):
+    video_id = extract_video_id(link)
+    if not video_id:
+        video_id = hashlib.sha256(link.encode('utf-8')).hexdigest()
+    return f"yt-info:{video_id}"
+
+def _trim_info(info):
+    trimmed = {key: info[key] for key in _INFO_KEYS if key in info}
+    chosen = next(
+        (fmt for fmt in info.get('formats') or [] if fmt.get('format_id') == info.get('format_id')),
+        None,
+    )
+    if chosen is None and info.get('url'):
+        chosen = {key: value for key, value in info.items() if key not in ('formats', 'thumbnails', 'subtitles', 'automatic_captions')}
+    if chosen is not None:
+        trimmed['formats'] = [chosen]
+        trimmed['audio_url'] = chosen.get('url')
+    # Only the caption tracks we would actually try, not every translation.
+    trimmed['caption_tracks'] = captions.select_tracks(info)
+    return trimmed
+
+def get_video_info(link):
+    """Return the metadata and chosen audio format for a video.
+
+    The extraction runs once and is cached for YOUTUBE_METADATA_CACHE_TTL
+    seconds, so the title lookup, the download and any resubmission of the
+    same video share a single round trip to YouTube.
+    """
+    key = _metadata_cache_key(link)
+    info = cache.get(key)
+    if info is None:
+        with metrics.span('metadata'):
+            info = _trim_info(get_youtube_video(link))
+        cache.set(key, info, settings.YOUTUBE_METADATA_CACHE_TTL)
+    return info
+
+def cached_video_info(link):
+    """Return the video's metadata if it is already cached, without extracting it."""
+    return cache.get(_metadata_cache_key(link))
+
+def _download_hooks():
+    """yt_dlp hooks that time the download and the FFmpeg transcode as separate stages."""
+    started = {'download': time.perf_counter()}
+
+    def on_progress(progress):
+        if progress['status'] == 'finished':
+            metrics.observe('download', time.perf_counter() - started['download'])
+            size = progress.get('downloaded_bytes') or progress.get('total_bytes') or 0
+            metrics.AUDIO_BYTES.inc(size, direction='download')
+            # Only downloads touch the disk; streamed audio never does.
+            metrics.TEMP_AUDIO_BYTES.inc(size)
+
+    def on_postprocess(progress):
+        if progress['postprocessor'] != 'ExtractAudio':
+            return
+        if progress['status'] == 'started':
+            started['transcode'] = time.perf_counter()
+        elif progress['status'] == 'finished' and 'transcode' in started:
+            metrics.observe('transcode', time.perf_counter() - started.pop('transcode'))
+
+    return [on_progress], [on_postprocess]
+
+class AudioStreamError(Exception):
+    pass
+
+class AudioStream:
+    """The audio FFmpeg writes to its stdout, read as an upload body.
+
+    Reading past the end raises AudioStreamError if FFmpeg failed, so a
+    broken stream fails the upload instead of sending truncated audio.
+    `size` counts the bytes read so far.
+    """
+    def __init__(self, process):
+        self.process = process
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.process.stdout.read(size)
+        if data:
+            self.size += len(data)
+        else:
+            returncode = self.process.wait()
+            if returncode:
+                error = self.process.stderr.read().decode('utf-8', 'replace').strip()
+                raise AudioStreamError(f"FFmpeg exited with {returncode}: {error}")
+        return data
+
+    def __iter__(self):
+        # httpx sends an iterable body in chunks, without a Content-Length.
+        while chunk := self.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.stdout.close()
+        self.process.stderr.close()
+        self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _stream_format(info):
+    formats = info.get('formats') or [{}]
+    return formats[0]
+
+def can_stream_audio(info):
+    """Whether the audio can go straight from YouTube to AssemblyAI through FFmpeg.
+
+    Long media is cut into chunks at pauses, which needs the whole file.
+    """
+    return (
+        settings.AUDIO_STREAMING
+        and bool(info.get('audio_url'))
+        and _stream_format(info).get('protocol', 'https') in STREAM_PROTOCOLS
+        and not is_long_media(info.get('duration'))
+    )
+
+def open_audio_stream(info):
+    """Start FFmpeg on the video's audio URL and return its output as an AudioStream.
+
+    With AUDIO_STREAM_COPY the native stream is passed through when its
+    codec has a container that can be written to a pipe. Otherwise it is
+    transcoded to low-bitrate mono Opus, which is all speech recognition
+    needs.
+    """
+    fmt = _stream_format(info)
+    command = [settings.FFMPEG_BINARY, '-hide_banner', '-nostats', '-loglevel', 'error']
+    headers = ''.join(f"{name}: {value}\r\n" for name, value in (fmt.get('http_headers') or {}).items())
+    if headers:
+        command += ['-headers', headers]
+    command += ['-i', info['audio_url'], '-vn']
+    container = STREAM_COPY_CONTAINERS.get((fmt.get('acodec') or '').split('.')[0])
+    if settings.AUDIO_STREAM_COPY and container:
+        command += ['-c:a', 'copy', '-f', container]
+    else:
+        command += [
+            '-ac', '1', '-ar', str(ASR_SAMPLE_RATE),
+            '-c:a', 'libopus', '-b:a', STREAM_BITRATE, '-application', 'voip', '-f', 'ogg',
+        ]
+    command.append('pipe:1')
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return AudioStream(process)
+
+def download_audio(link, info=None):
+    """Download the audio to a temp file, for when it cannot be streamed.
+
+    The file is mono, low-bitrate MP3 and no larger than
+    AUDIO_DOWNLOAD_MAX_BYTES. The caller deletes it; clean_temp_audio()
+    removes what a crashed worker leaves behind.
+    """
+    output_path = get_temp_filepath()
+    progress_hooks, postprocessor_hooks = _download_hooks()
+    
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': DOWNLOAD_BITRATE,
+        }],
+        'postprocessor_args': {'extractaudio': ['-ac', '1', '-ar', str(ASR_SAMPLE_RATE)]},
+        'max_filesize': settings.AUDIO_DOWNLOAD_MAX_BYTES,
+        'outtmpl': str(output_path.with_suffix('')),
+        'quiet': True,
+        # Add options for large file handling
+        'buffersize': 1024 * 1024,  # 1MB buffer size
+        'socket_timeout': 300,  # 5 minutes timeout
+        'retries': 10,  # Number of retries
+        'fragment_retries': 10,
+        'continuedl': True,  # Continue partial downloads
+        # Back off between those retries instead of retrying at once.
+        'retry_sleep_functions': {'http': limits.retry_delay, 'fragment': limits.retry_delay},
+        'progress_hooks': progress_hooks,
+        'postprocessor_hooks': postprocessor_hooks,
+    }
+    
+    if os.path.dirname(settings.FFMPEG_BINARY):
+        ydl_opts['ffmpeg_location'] = settings.FFMPEG_BINARY
+
+    try:
+        if info is None:
+            info = get_video_info(link)
+        with limits.backend('youtube'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if info.get('formats'):
+                try:
+                    # Download straight from the already extracted format
+                    # instead of resolving the video again.
+                    ydl.process_ie_result(copy.deepcopy(info), download=True)
+                except yt_dlp.utils.DownloadError as e:
+                    # The cached media URL may have expired; resolve it afresh.
+                    logging.error(f"Download from cached info failed, re-extracting: {str(e)}")
+                    cache.delete(_metadata_cache_key(link))
+                    ydl.download([link])
+            else:
+                ydl.download([link])
+            final_path = output_path.with_suffix('.mp3')
+            if not final_path.exists():
+                # yt_dlp skips a download over max_filesize without raising.
+                raise FileNotFoundError("Audio download failed")
+            return str(final_path)
+    except Exception as e:
+        logging.error(f"Download error: {str(e)}")
+        for path in get_temp_dir().glob(f"{output_path.stem}*"):
+            path.unlink(missing_ok=True)
+        raise
+
+def get_transcription_config():
+    # Enhanced configuration for better transcription
+    return aai.TranscriptionConfig(
+        language_detection=True,
+        punctuate=True,
+        format_text=True,
+        content_safety=False,
+        webhook_url=None,
+        speaker_labels=False,
+        auto_chapters=True,  # Enable auto-chapters for better segmentation
+        entity_detection=True  # Better entity recognition
+    )
+
+def transcript_poll_intervals():
+    interval = TRANSCRIPT_POLL_INITIAL_INTERVAL
+    while True:
+        yield interval
+        interval = min(interval * TRANSCRIPT_POLL_BACKOFF, TRANSCRIPT_POLL_MAX_INTERVAL)
+
+def finish_transcript_text(text):
+    # Verify the transcription is complete and ends with proper punctuation
+    text = text.strip()
+    if not text.endswith(('.', '!', '?')):
+        text += '.'
+    return text
+
+def download_captions(url):
+    with limits.backend('youtube'), yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        return ydl.urlopen(url).read().decode('utf-8')
+
+def get_caption_transcript(link):
+    """Return a transcript built from the video's YouTube captions.
+
+    Manual subtitles are preferred over automatic captions. Returns None when
+    there are no captions in a language we want, or when none of them pass
+    the captions.is_usable check; the caller then falls back to speech
+    recognition.
+    """
+    try:
+        info = get_video_info(link)
+    except Exception as e:
+        logging.error(f"Error getting captions: {str(e)}")
+        return None
+
+    with metrics.span('captions'):
+        return _usable_captions(info)
+
+def _usable_captions(info):
+    for track in info.get('caption_tracks') or []:
+        try:
+            text = captions.parse_captions(download_captions(track['url']), track['ext'])
+        except Exception as e:
+            logging.error(f"Failed to read {track['kind']} captions ({track['lang']}): {str(e)}")
+            continue
+        if captions.is_usable(text, info.get('duration')):
+            return finish_transcript_text(text)
+        logging.info(f"Skipping low quality {track['kind']} captions ({track['lang']})")
+    return None
+
+def get_transcript(link):
+    """Return (transcript, source, outline), trying captions before audio transcription.
+
+    Captions have no outline; see build_outline for what ASR provides.
+    """
+    text = get_caption_transcript(link)
+    if text:
+        return text, 'captions', None
+    text, outline = transcribe_audio(link)
+    return text, 'asr', outline
+
+def build_outline(transcript, offset=0):
+    """Return the auto_chapters and entity_detection results of a transcript.
+
+    Each chapter carries its own slice of the transcript text so that it can
+    be written up on its own. `offset` (in ms) shifts the chapter times of a
+    chunk to the position of the chunk in the full audio.
+    """
+    words = getattr(transcript, 'words', None) or []
+    chapters = []
+    for chapter in getattr(transcript, 'chapters', None) or []:
+        chapters.append({
+            'start': chapter.start + offset,
+            'end': chapter.end + offset,
+            'headline': chapter.headline,
+            'gist': chapter.gist,
+            'summary': chapter.summary,
+            'text': ' '.join(word.text for word in words if chapter.start <= word.start < chapter.end),
+        })
+    entities = [entity.text for entity in getattr(transcript, 'entities', None) or []]
+    return {'chapters': chapters, 'entities': list(dict.fromkeys(entities))}
+
+def merge_outlines(outlines):
+    return {
+        'chapters': [chapter for outline in outlines for chapter in outline['chapters']],
+        'entities': list(dict.fromkeys(entity for outline in outlines for entity in outline['entities'])),
+    }
+
+def upload_audio(transcriber, audio, config):
+    """Upload and submit `audio`: a file path, or a callable that opens an AudioStream.
+
+    submit() returns once the audio is queued; callers poll themselves.
+    """
+    if callable(audio):
+        with audio() as stream:
+            transcript = transcriber.submit(stream, config=config)
+        size = stream.size
+    else:
+        transcript = transcriber.submit(str(audio), config=config)
+        size = Path(audio).stat().st_size
+    metrics.AUDIO_BYTES.inc(size, direction='upload')
+    return transcript
+
+def _transcribe_file(transcriber, audio, config, max_retries=3):
+    for attempt in range(max_retries):
+        try:
+            # We poll ourselves so the interval can back off.
+            with limits.backend('assemblyai'), metrics.span('upload'):
+                transcript = upload_audio(transcriber, audio, config)
+
+            intervals = transcript_poll_intervals()
+            with metrics.span('transcription_wait'):
+                while transcript.status != 'completed':
+                    if transcript.status == 'error':
+                        raise Exception(f"Transcription failed: {transcript.error}")
+                    time.sleep(next(intervals))
+                    transcript = get_transcript_response(transcript.id)
+
+            return transcript
+
+        except AudioStreamError:
+            # Streaming again would fail the same way; the caller downloads.
+            raise
+        except Exception as e:
+            logging.error(f"Transcription attempt {attempt + 1} failed: {str(e)}")
+            if attempt == max_retries - 1:
+                raise
+            time.sleep(limits.retry_delay(attempt))
+
+def is_long_media(duration):
+    return bool(duration) and duration > settings.TRANSCRIPTION_CHUNK_THRESHOLD
+
+def detect_silences(audio_path):
+    """Return the (start, end) seconds of each pause in an audio file."""
+    result = subprocess.run(
+        [
+            settings.FFMPEG_BINARY, '-hide_banner', '-nostats', '-i', str(audio_path),
+            '-af', f"silencedetect=noise={SILENCE_NOISE}:d={SILENCE_MIN_DURATION}",
+            '-f', 'null', '-',
+        ],
+        capture_output=True, text=True, check=True,
+    )
+    starts = re.findall(r'silence_start: ([\d.]+)', result.stderr)
+    ends = re.findall(r'silence_end: ([\d.]+)', result.stderr)
+    return [(float(start), float(end)) for start, end in zip(starts, ends)]
+
+def plan_chunks(duration, chunk_seconds, overlap, silences=()):
+    """Split `duration` seconds into (start, end) windows of about `chunk_seconds`.
+
+    Each cut moves to the middle of a nearby pause if there is one, so fewer
+    words are split in half, and every window after the first starts
+    `overlap` seconds early so stitch_transcripts can line the texts up.
+    """
+    pauses = [(start + end) / 2 for start, end in silences]
+    window = chunk_seconds * CHUNK_SILENCE_WINDOW
+    boundaries = [0.0]
+    while duration - boundaries[-1] > chunk_seconds:
+        target = boundaries[-1] + chunk_seconds
+        near = [pause for pause in pauses if abs(pause - target) <= window]
+        boundaries.append(min(near, key=lambda pause: abs(pause - target)) if near else target)
+    boundaries.append(float(duration))
+    return [(max(0.0, start - overlap), end) for start, end in zip(boundaries, boundaries[1:])]
+
+def plan_audio_chunks(audio_path, duration):
+    try:
+        silences = detect_silences(audio_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logging.error(f"Silence detection failed, splitting at fixed times: {str(e)}")
+        silences = []
+    return plan_chunks(
+        duration, settings.TRANSCRIPTION_CHUNK_SECONDS, settings.TRANSCRIPTION_CHUNK_OVERLAP, silences
+    )
+
+def split_audio(audio_path, windows):
+    """Cut each (start, end) window out of the audio into its own temp file."""
+    paths = []
+    try:
+        for start, end in windows:
+            path = get_temp_filepath()
+            subprocess.run(
+                [
+                    settings.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+                    '-ss', f"{start:.3f}", '-t', f"{end - start:.3f}", '-i', str(audio_path),
+                    '-c', 'copy', str(path),
+                ],
+                check=True,
+            )
+            paths.append(path)
+        return paths
+    except Exception:
+        for path in paths:
+            path.unlink(missing_ok=True)
+        raise
+
+def _normalize_word(word):
+    return re.sub(r"[^\w']", '', word.lower())
+
+def stitch_transcripts(texts):
+    """Join chunk transcripts, dropping the words repeated in each overlap.
+
+    The chunks are joined at the longest run of words they share near the
+    boundary: the earlier chunk is kept up to the run and the later one from
+    it. The later chunk's copy wins because it was transcribed with the
+    context that follows, and words garbled at either cut are dropped.
+    """
+    words = []
+    for text in texts:
+        new = (text or '').split()
+        if words and new:
+            tail = [_normalize_word(word) for word in words[-STITCH_WINDOW_WORDS:]]
+            head = [_normalize_word(word) for word in new[:STITCH_WINDOW_WORDS]]
+            match = difflib.SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(
+                0, len(tail), 0, len(head)
+            )
+            if match.size >= STITCH_MIN_MATCH:
+                cut = len(words) - len(tail) + match.a
+                words = words[:cut] + new[match.b:]
+                continue
+        words += new
+    return ' '.join(words)
+
+def transcribe_chunks(audio_path, duration, transcriber, config):
+    """Transcribe long audio as overlapping chunks, several at a time.
+
+    A chunk that fails is retried on its own; the others are not redone.
+    Returns the stitched text and the merged outline of all chunks.
+    """
+    windows = plan_audio_chunks(audio_path, duration)
+    chunk_paths = split_audio(audio_path, windows)
+    try:
+        with ThreadPoolExecutor(max_workers=settings.TRANSCRIPTION_CHUNK_CONCURRENCY) as pool:
+            futures = [
+                pool.submit(metrics.bind(_transcribe_file), transcriber, path, config)
+                for path in chunk_paths
+            ]
+            transcripts = [future.result() for future in futures]
+        outline = merge_outlines([
+            build_outline(transcript, offset=int(start * 1000))
+            for transcript, (start, _end) in zip(transcripts, windows)
+        ])
+        return stitch_transcripts([transcript.text for transcript in transcripts]), outline
+    finally:
+        for path in chunk_paths:
+            path.unlink(missing_ok=True)
+
+def get_transcription(link):
+    return transcribe_audio(link)[0]
+
+def transcribe_audio(link):
+    """Transcribe a video's audio and return (text, outline)."""
+    audio_path = None
+
+    try:
+        info = get_video_info(link)
+        transcriber = clients.transcriber()
+        config = get_transcription_config()
+        if info.get('duration'):
+            metrics.AUDIO_SECONDS.inc(info['duration'])
+
+        if can_stream_audio(info):
+            try:
+                transcript = _transcribe_file(transcriber, lambda: open_audio_stream(info), config)
+                return finish_transcript_text(transcript.text), build_outline(transcript)
+            except (AudioStreamError, OSError) as e:
+                logging.error(f"Audio streaming failed, downloading instead: {str(e)}")
+                # The media URL may have expired; resolve it afresh.
+                cache.delete(_metadata_cache_key(link))
+                info = get_video_info(link)
+
+        audio_path = Path(download_audio(link, info))
+        if not audio_path.exists():
+            raise FileNotFoundError("Audio file not found")
+
+        if is_long_media(info.get('duration')):
+            text, outline = transcribe_chunks(audio_path, info['duration'], transcriber, config)
+        else:
+            transcript = _transcribe_file(transcriber, audio_path, config)
+            text, outline = transcript.text, build_outline(transcript)
+        return finish_transcript_text(text), outline
+        
+    except Exception as e:
+        logging.error(f"Transcription error: {str(e)}")
+        raise
+    finally:
+        if audio_path and audio_path.exists():
+            try:
+                audio_path.unlink()
+            except OSError:
+                pass
+
+def submit_transcription(link, webhook_url=None, webhook_secret=None):
+    """Upload the audio and queue a transcription that reports to `webhook_url`, if given.
+
+    Returns the AssemblyAI transcript id without waiting for the result.
+    """
+    audio_path = None
+    try:
+        info = get_video_info(link)
+        config = get_transcription_config()
+        if webhook_url and webhook_secret:
+            config.set_webhook(webhook_url, WEBHOOK_AUTH_HEADER, webhook_secret)
+        elif webhook_url:
+            config.set_webhook(webhook_url)
+        if info.get('duration'):
+            metrics.AUDIO_SECONDS.inc(info['duration'])
+
+        transcript = None
+        if can_stream_audio(info):
+            try:
+                with limits.backend('assemblyai'), metrics.span('upload'):
+                    transcript = upload_audio(clients.transcriber(), lambda: open_audio_stream(info), config)
+            except (AudioStreamError, OSError) as e:
+                logging.error(f"Audio streaming failed, downloading instead: {str(e)}")
+                cache.delete(_metadata_cache_key(link))
+                info = get_video_info(link)
+        if transcript is None:
+            audio_path = Path(download_audio(link, info))
+            if not audio_path.exists():
+                raise FileNotFoundError("Audio file not found")
+            with limits.backend('assemblyai'), metrics.span('upload'):
+                transcript = upload_audio(clients.transcriber(), audio_path, config)
+        if transcript.status == 'error':
+            raise Exception(f"Transcription failed: {transcript.error}")
+        return transcript.id
+    except Exception as e:
+        logging.error(f"Transcription submit error: {str(e)}")
+        raise
+    finally:
+        if audio_path and audio_path.exists():
+            try:
+                audio_path.unlink()
+            except OSError:
+                pass
+
+def get_transcript_response(transcript_id):
+    """Fetch the current state of a transcript with a single request.
+
+    Transcript.get_by_id blocks until the transcript is finished, polling on
+    the SDK's own fixed interval, so status checks go through the API layer.
+    """
+    return aai.api.get_transcript(clients.assemblyai_client().http_client, transcript_id)
+
+def get_transcript_status(transcript_id):
+    status = get_transcript_response(transcript_id).status
+    return getattr(status, 'value', status)
+
+def fetch_transcript(transcript_id):
+    """Return (text, outline) of a finished transcript, or (None, None) if it is still running."""
+    transcript = get_transcript_response(transcript_id)
+    if transcript.status == 'error':
+        raise Exception(f"Transcription failed: {transcript.error}")
+    if transcript.status != 'completed':
+        return None, None
+    return finish_transcript_text(transcript.text), build_outline(transcript)
+
+def get_blog_model():
+    return clients.blog_model()
+
+def build_blog_prompt(transcription):
+    prompt = f"""Based on the following transcript from a YouTube video, 
+    write a comprehensive blog article. Format it using HTML tags as follows:
+    
+    1. Use <h1> tags for the main title
+    2. Use <h2> tags for section headings
+    3. Use <strong> tags for bold text (do not use markdown ** symbols)
+    4. Wrap paragraphs in <p> tags
+    5. Throughout the content:
+       - Make important key points bold using <strong> tags
+       - Emphasize significant statistics and numbers using <strong> tags
+       - Highlight crucial phrases and main takeaways using <strong> tags
+       - Make names, dates, and key concepts stand out using <strong> tags
+    
+    IMPORTANT: 
+    - Ensure all sentences are complete
+    - Cover all main points from the transcript
+    - Each section should have a proper conclusion
+    - The article should have a clear introduction and conclusion
+    - Do not use markdown symbols like * or ** for formatting
+    - Do not use # for headings
+    - Use only HTML tags for all formatting
+    - Start directly with the <h1> tag
+    - End with a proper concluding paragraph
+    
+    Here's the transcript:
+    
+    {transcription}
+    
+    Generate the blog article with HTML formatting:"""
+    return prompt
+
+def clean_blog_content(content):
+    return postprocess.clean_html(content)
+
+def generate_blog_from_transcription(transcription):
+    model = get_blog_model()
+    prompt = build_blog_prompt(transcription)
+    
+    try:
+        with limits.backend('gemini'), metrics.span('generation'):
+            response = model.generate_content(prompt)
+        metrics.record_usage(response)
+        return clean_blog_content(response.text)
+    except Exception as e:
+        logging.error(f"Error generating blog content: {str(e)}")
+        raise
+
+def stream_blog_from_transcription(transcription):
+    """Yield the raw article text chunk by chunk as Gemini produces it.
+
+    The chunks are not post-processed; feed them to a
+    postprocess.ArticleProcessor as they arrive.
+    """
+    model = get_blog_model()
+    prompt = build_blog_prompt(transcription)
+
+    try:
+        # The slot is held until the whole stream has been read.
+        chunk = None
+        with limits.backend('gemini'), metrics.span('generation'):
+            for chunk in model.generate_content(prompt, stream=True):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks that only carry finish metadata have no text parts.
+                    continue
+                if text:
+                    yield text
+        metrics.record_usage(chunk)
+    except Exception as e:
+        logging.error(f"Error streaming blog content: {str(e)}")
+        raise
+
+def use_chaptered_generation(outline):
+    return bool(
+        settings.BLOG_CHAPTERED_GENERATION
+        and outline
+        and len(outline.get('chapters') or []) >= CHAPTERED_MIN_CHAPTERS
+    )
+
+def _format_entities(entities):
+    return ', '.join(entities[:MAX_PROMPT_ENTITIES]) or 'none detected'
+
+def build_section_prompt(chapter, entities):
+    prompt = f"""Based on the following part of a YouTube video transcript,
+    write one section of a blog article. Format it using HTML tags as follows:
+    
+    1. Start with an <h2> tag for the section heading (the topic is roughly: {chapter['headline']})
+    2. Use <strong> tags for bold text (do not use markdown ** symbols)
+    3. Wrap paragraphs in <p> tags
+    4. Make key points, significant numbers, names and concepts bold using <strong> tags
+    
+    IMPORTANT: 
+    - Write only this section: no <h1>, and no introduction or conclusion for the whole article
+    - Cover all main points from this part of the transcript
+    - Ensure all sentences are complete
+    - Use only HTML tags for all formatting
+    - Spell these names and terms as written here: {_format_entities(entities)}
+    
+    Here's the transcript excerpt:
+    
+    {chapter['text']}
+    
+    Generate the section with HTML formatting:"""
+    return prompt
+
+def build_frame_prompt(outline):
+    chapters = '\n    '.join(f"- {chapter['headline']}: {chapter['summary']}" for chapter in outline['chapters'])
+    prompt = f"""A blog article is being written from a YouTube video, with one
+    section for each chapter of the video. The chapters are:
+    
+    {chapters}
+    
+    Write the parts of the article around those sections, using HTML tags:
+    
+    1. The main title in <h1> tags
+    2. An introduction of one to three paragraphs, each wrapped in <p> tags
+    3. Then this exact line on its own: {SECTIONS_MARKER}
+    4. Then an <h2>Conclusion</h2> heading followed by the concluding paragraphs in <p> tags
+    
+    IMPORTANT: 
+    - Do not write the chapter sections themselves
+    - Use <strong> tags for key points (do not use markdown ** symbols)
+    - Use only HTML tags for all formatting
+    - Start directly with the <h1> tag
+    - Spell these names and terms as written here: {_format_entities(outline['entities'])}
+    
+    Generate the title, introduction and conclusion with HTML formatting:"""
+    return prompt
+
+def split_frame(frame):
+    """Return the (head, tail) of a frame response: title and intro, then the conclusion."""
+    head, _marker, tail = frame.partition(SECTIONS_MARKER)
+    return head.strip(), tail.strip()
+
+def _generate_text(model, prompt):
+    with limits.backend('gemini'), metrics.span('generation'):
+        response = model.generate_content(prompt)
+    metrics.record_usage(response)
+    return response.text
+
+def generate_chaptered_blog(outline, on_progress=None):
+    """Write the article one chapter section at a time, in parallel Gemini calls.
+
+    A separate, short call writes the title, introduction and conclusion from
+    the chapter summaries; it needs no section text, so it runs alongside
+    them. `on_progress` receives the article so far each time the next
+    section in order is ready; each value extends the previous one.
+    """
+    model = get_blog_model()
+
+    try:
+        with ThreadPoolExecutor(max_workers=settings.BLOG_SECTION_CONCURRENCY) as pool:
+            frame = pool.submit(metrics.bind(_generate_text), model, build_frame_prompt(outline))
+            sections = [
+                pool.submit(metrics.bind(_generate_text), model, build_section_prompt(chapter, outline['entities']))
+                for chapter in outline['chapters']
+            ]
+            head, tail = split_frame(frame.result())
+            parts = [clean_blog_content(head)]
+            for section in sections:
+                parts.append(clean_blog_content(section.result()))
+                if on_progress:
+                    on_progress('\n'.join(parts))
+        parts.append(clean_blog_content(tail))
+        # Each part is cleaned and balanced on its own, so the join needs no
+        # second pass.
+        content = '\n'.join(parts)
+        if on_progress:
+            on_progress(content)
+        return content
+    except Exception as e:
+        logging.error(f"Error generating chaptered blog content: {str(e)}")
+        raise
+
+def _playlist_entries(info, depth=0):
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('_type') == 'playlist' or (entry.get('ie_key') == 'YoutubeTab' and depth < 1):
+            # A channel lists its tabs (Videos, Shorts, ...) as nested playlists.
+            nested = entry if entry.get('entries') is not None else get_playlist_info(entry['url'])
+            yield from _playlist_entries(nested, depth + 1)
+        elif entry.get('id') or entry.get('url'):
+            yield entry
+
+def get_playlist_info(link):
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        # Only list the entries; each video is extracted when its job runs.
+        'extract_flat': True,
+    }
+    with limits.backend('youtube'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(link, download=False)
+
+def _expand(links):
+    for link in links:
+        link = link.strip()
+        if not link:
+            continue
+        if extract_video_id(link):
+            yield link, ''
+            continue
+        info = get_playlist_info(link)
+        if info.get('_type') != 'playlist':
+            yield info.get('webpage_url') or link, info.get('title') or ''
+            continue
+        for entry in _playlist_entries(info):
+            yield entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}", entry.get('title') or ''
+
+def expand_links(links, limit=None):
+    """Turn video, playlist and channel URLs into a list of (video link, title) pairs.
+
+    Links to a single video are kept as they are (with no title; the job looks
+    it up). Anything else is listed through yt_dlp, which returns every entry
+    of a playlist or channel in a few requests and includes the titles.
+    Duplicate videos are dropped, and listing stops once there are `limit`.
+    """
+    videos = []
+    seen = set()
+    for link, title in _expand(links):
+        key = extract_video_id(link) or link
+        if key in seen:
+            continue
+        seen.add(key)
+        videos.append((link, title))
+        if limit is not None and len(videos) >= limit:
+            break
+    return videos
+
+def get_youtube_video(link, max_retries=3):
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'noplaylist': True,
+        # Resolve the audio format here so download_audio can reuse it.
+        'format': 'bestaudio/best',
+    }
+    
+    for attempt in range(max_retries):
+        try:
+            with limits.backend('youtube'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(link, download=False)
+                return info
+        except Exception as e:
+            logging.error(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
+            if attempt < max_retries - 1:
+                time.sleep(limits.retry_delay(attempt))
+                continue
+            raise
@@ -0,0 +1,328 @@
+"""Single-pass clean-up of the HTML that Gemini writes for an article.
+
+ArticleProcessor reads the model output once, token by token, using one
+compiled regular expression. In that single pass it:
+
+* drops code fences (```html ... ```, '''html ... '''),
+* turns markdown leftovers into HTML: **bold**, *italic* and # headings.
+  Text such as "C#", "5 * 3" or "2*3*4" is left alone,
+* keeps only allowlisted tags and drops their attributes, except the href
+  of http(s) and mailto links. script and style are removed along with
+  their content,
+* closes tags the model left open and drops stray closing tags,
+* wraps bare text in paragraphs and escapes a stray < or &.
+
+Output can be fed in chunks as it streams. The processor holds back only
+what depends on what comes next: a half-received tag, a trailing "*", or the
+text after a markdown opener until its closer arrives. An opener that is
+never closed is written out as the literal marker:
+
+    processor = ArticleProcessor()
+    html = ''.join(processor.feed(chunk) for chunk in stream)
+    html += processor.close()
+
+Everything returned so far is always a prefix of the final result.
+"""
+import html
+import re
+
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+BLOCK_TAGS = HEADING_TAGS | {'p', 'ul', 'ol', 'li', 'blockquote', 'pre', 'hr'}
+INLINE_TAGS = {'strong', 'em', 'code', 'a', 'br'}
+VOID_TAGS = {'br', 'hr'}
+TAG_ALIASES = {'b': 'strong', 'i': 'em'}
+DROP_CONTENT_TAGS = {'script', 'style'}
+SAFE_URL_SCHEMES = ('http://', 'https://', 'mailto:')
+
+# Elements that may hold blocks; everything else is closed before a new block.
+_BLOCK_CONTAINERS = ('li', 'blockquote')
+_LISTS = ('ul', 'ol')
+# Markdown is left as written inside code.
+_LITERAL_TAGS = ('code', 'pre')
+
+# How an element on the stack was opened.
+_TAG = 'tag'
+_MARKDOWN = 'markdown'
+_IMPLICIT = 'implicit'
+
+_TOKEN_RE = re.compile(r"""
+    (?P<comment><!--.*?-->)
+  | (?P<tag><(?P<closing>/?)(?P<name>[A-Za-z][A-Za-z0-9]*)(?P<attrs>(?:\s[^<>]*)?)/?>)
+  | (?P<fence>(?:```|''')[A-Za-z]*[ \t]*\n?)
+  | (?P<heading>[ \t]*(?P<hashes>\#{1,6})[ \t]+)
+  | (?P<stars>\*{1,3})
+  | (?P<entity>&(?:[A-Za-z][A-Za-z0-9]{1,31}|\#[0-9]{1,7}|\#[xX][0-9A-Fa-f]{1,6});)
+  | (?P<blank>\n[ \t]*\n\s*)
+  | (?P<newline>\n)
+  | (?P<text>(?:[^<>*&`'\#\n]|'(?!''))+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+_HREF_RE = re.compile(r"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+
+# Buffer tails that are held back until the next chunk decides their meaning.
+_PARTIAL_TAG_RE = re.compile(r'<(?:!(?:-(?:-(?:(?!-->).)*)?)?|/?(?:[A-Za-z][A-Za-z0-9]*(?:\s[^<>]*)?/?)?)\Z', re.DOTALL)
+_PARTIAL_ENTITY_RE = re.compile(r'&#?[A-Za-z0-9]{0,31}\Z')
+_PARTIAL_FENCE_RE = re.compile(r"(?:`{1,3}|'{1,3})[A-Za-z]*[ \t]*\Z")
+_PARTIAL_HEADING_RE = re.compile(r'[ \t]*\#{0,6}[ \t]*\Z')
+_PARTIAL_BLANK_RE = re.compile(r'\n\s*\Z')
+
+_ESCAPES = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
+
+
+class ArticleProcessor:
+    def __init__(self):
+        self._buffer = ''
+        # [name, how it was opened, held output, markdown marker]; held output
+        # is a list only for markdown emphasis that is not yet closed.
+        self._stack = []
+        self._holds = []
+        self._out = []
+        self._space = ''  # whitespace written once more content follows
+        self._prev = '\n'  # last character consumed, for markdown rules
+        self._skipping = None  # name of a script/style element being dropped
+        self._started = False
+
+    def feed(self, chunk):
+        """Process the next piece of output and return the HTML that is now final."""
+        self._buffer += chunk
+        return self._process(final=False)
+
+    def close(self):
+        """Process whatever is left and close every element still open."""
+        html_ = self._process(final=True)
+        self._out = []
+        self._close_to(0)
+        self._space = ''
+        return html_ + ''.join(self._out)
+
+    def _safe_end(self, buffer):
+        end = len(buffer)
+        lt = buffer.rfind('<')
+        if lt != -1 and _PARTIAL_TAG_RE.match(buffer, lt):
+            end = lt
+        while end and buffer[end - 1] == '*':
+            end -= 1
+        for pattern in (_PARTIAL_ENTITY_RE, _PARTIAL_FENCE_RE):
+            match = pattern.search(buffer, 0, end)
+            if match:
+                end = match.start()
+        line_start = buffer.rfind('\n', 0, end) + 1
+        if (line_start or self._prev == '\n') and _PARTIAL_HEADING_RE.fullmatch(buffer, line_start, end):
+            end = line_start
+        match = _PARTIAL_BLANK_RE.search(buffer, 0, end)
+        if match:
+            end = match.start()
+        return end
+
+    def _process(self, final):
+        buffer = self._buffer
+        end = len(buffer) if final else self._safe_end(buffer)
+        self._out = []
+        for match in _TOKEN_RE.finditer(buffer, 0, end):
+            kind = match.lastgroup
+            token = match.group()
+            if self._skipping:
+                if kind == 'tag' and match.group('closing') and match.group('name').lower() == self._skipping:
+                    self._skipping = None
+            else:
+                self._token(kind, token, match)
+            self._prev = token[-1]
+        self._buffer = buffer[end:]
+        return ''.join(self._out)
+
+    def _token(self, kind, token, match):
+        if kind == 'text':
+            self._text(token)
+        elif kind == 'tag':
+            self._tag(match.group('closing'), match.group('name').lower(), match.group('attrs'))
+        elif kind == 'newline':
+            self._close_markdown_heading()
+            self._emit_space(token)
+        elif kind == 'blank':
+            self._close_markdown_heading()
+            index = self._find('p')
+            if index is not None:
+                self._close_to(index)
+            self._emit_space(token)
+        elif kind == 'heading':
+            if self._prev == '\n' and not self._literal():
+                name = f"h{len(match.group('hashes'))}"
+                self._prepare_block(name)
+                self._open(name, _MARKDOWN)
+            else:
+                self._text(token)
+        elif kind == 'stars':
+            following = match.string[match.end()] if match.end() < len(match.string) else ''
+            self._stars(token, following)
+        elif kind == 'entity':
+            self._text(token)
+        elif kind == 'other':
+            self._text(_ESCAPES.get(token, token))
+        # fences and comments are dropped
+
+    def _sink(self):
+        return self._holds[-1][2] if self._holds else self._out
+
+    def _emit(self, text):
+        sink = self._sink()
+        if self._space:
+            sink.append(self._space)
+            self._space = ''
+        sink.append(text)
+        self._started = True
+
+    def _emit_space(self, text):
+        # Held back so that closing tags go before it: "text</p>\n", not "text\n</p>".
+        if self._started:
+            self._space += text
+
+    def _text(self, text):
+        if not text.strip():
+            self._emit_space(text)
+            return
+        self._ensure_flow()
+        self._emit(text.replace('>', '&gt;'))
+
+    def _tag(self, closing, name, attrs):
+        if name in DROP_CONTENT_TAGS:
+            if not closing:
+                self._skipping = name
+            return
+        name = TAG_ALIASES.get(name, name)
+        if name not in BLOCK_TAGS and name not in INLINE_TAGS:
+            return
+        if closing:
+            index = self._find(name)
+            if index is not None:
+                self._close_to(index)
+            return
+
+        if name in BLOCK_TAGS:
+            self._prepare_block(name)
+        else:
+            self._ensure_flow()
+        if name in VOID_TAGS:
+            self._emit(f"<{name}>")
+        elif name == 'a':
+            href = self._safe_href(attrs)
+            if href:
+                self._open('a', _TAG, f' href="{href}"')
+        else:
+            self._open(name, _TAG)
+
+    def _stars(self, stars, following):
+        if self._literal():
+            self._text(stars)
+            return
+        names = {1: ['em'], 2: ['strong'], 3: ['strong', 'em']}[len(stars)]
+        if not self._prev.isspace():
+            indexes = [self._find(name, _MARKDOWN) for name in names]
+            if None not in indexes:
+                self._close_to(min(indexes), resolved=indexes)
+                return
+        if following and not following.isspace() and not self._prev.isalnum():
+            self._ensure_flow()
+            for name in names:
+                self._open(name, _MARKDOWN, marker='*' if name == 'em' else '**')
+            return
+        self._text(stars)
+
+    @staticmethod
+    def _safe_href(attrs):
+        match = _HREF_RE.search(attrs or '')
+        if not match:
+            return None
+        url = html.unescape(next(group for group in match.groups() if group is not None)).strip()
+        if not url.lower().startswith(SAFE_URL_SCHEMES):
+            return None
+        return html.escape(url, quote=True)
+
+    def _literal(self):
+        return any(entry[0] in _LITERAL_TAGS for entry in self._stack)
+
+    def _find(self, name, how=None):
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == name and how in (None, self._stack[index][1]):
+                return index
+        return None
+
+    def _open(self, name, how, attrs='', marker=None):
+        if marker is None:
+            self._emit(f"<{name}{attrs}>")
+            self._stack.append([name, how, None, None])
+            return
+        # Markdown emphasis: hold what follows until the closing marker shows
+        # whether this really was emphasis.
+        self._emit('')
+        entry = [name, how, [], marker]
+        self._stack.append(entry)
+        self._holds.append(entry)
+
+    def _close_to(self, index, resolved=()):
+        """Close everything above stack position `index`.
+
+        Held markdown emphasis becomes a real element if its position is in
+        `resolved` and falls back to the literal marker otherwise.
+        """
+        while len(self._stack) > index:
+            position = len(self._stack) - 1
+            name, _how, held, marker = self._stack.pop()
+            if held is None:
+                self._sink().append(f"</{name}>")
+                continue
+            self._holds.pop()
+            if position in resolved:
+                self._sink().extend([f"<{name}>", *held, f"</{name}>"])
+            else:
+                self._sink().extend([marker, *held])
+
+    def _close_markdown_heading(self):
+        for index, (name, how, _held, _marker) in enumerate(self._stack):
+            if how == _MARKDOWN and name in HEADING_TAGS:
+                self._close_to(index)
+                return
+
+    def _container_index(self):
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] in _BLOCK_CONTAINERS:
+                return index
+        return -1
+
+    def _prepare_block(self, name):
+        if name == 'li':
+            for index in range(len(self._stack) - 1, -1, -1):
+                if self._stack[index][0] in _LISTS:
+                    self._close_to(index + 1)
+                    return
+            self._close_to(self._container_index() + 1)
+            self._open('ul', _IMPLICIT)
+            return
+        self._close_to(self._container_index() + 1)
+
+    def _ensure_flow(self):
+        top = self._stack[-1][0] if self._stack else None
+        if top in _LISTS:
+            self._open('li', _IMPLICIT)
+        elif top is None or top == 'blockquote':
+            self._open('p', _IMPLICIT)
+
+
+_BLOCK_BOUNDARY_RE = re.compile(r'</?(?:%s)\b[^>]*>' % '|'.join(sorted(BLOCK_TAGS | {'br'})), re.IGNORECASE)
+_ANY_TAG_RE = re.compile(r'<[^>]*>')
+_SPACES_RE = re.compile(r'[ \t\r\f\v]+')
+_BLANK_LINES_RE = re.compile(r'\s*\n\s*')
+
+
+def plain_text(content):
+    """Text of cleaned article HTML, one line per block element."""
+    text = _BLOCK_BOUNDARY_RE.sub('\n', content)
+    text = html.unescape(_ANY_TAG_RE.sub('', text))
+    text = _SPACES_RE.sub(' ', text)
+    return _BLANK_LINES_RE.sub('\n', text).strip()
+
+
+def clean_html(content):
+    """Clean a complete article in one call."""
+    processor = ArticleProcessor()
+    return (processor.feed(content) + processor.close()).strip()
@@ -0,0 +1,40 @@
+"""The third-party SDKs of the generation pipeline, imported on first use.
+
+Importing yt_dlp, assemblyai and google.generativeai takes well over a second
+and tens of megabytes (see benchmarks/bench_startup.py). pipeline.py and
+clients.py reach them only through the stand-ins below. A process therefore
+imports an SDK the first time it actually calls it. Web workers that only
+serve logins, the blog list and the articles never do.
+
+    from .sdk import yt_dlp
+
+    with yt_dlp.YoutubeDL(opts) as ydl:   # yt_dlp is imported here
+        ...
+
+Attributes can be patched on a stand-in like on the module
+(mock.patch('blog_generator.pipeline.yt_dlp.YoutubeDL', ...)). Such a patch
+applies to the callers of the stand-in only.
+"""
+import importlib
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr):
+        if self.__module is None:
+            # The import system serialises concurrent first imports.
+            self.__module = importlib.import_module(self.__name)
+        return getattr(self.__module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.__module is not None else 'not loaded'
+        return f"<lazy module {self.__name!r} ({state})>"
+
+
+yt_dlp = LazyModule('yt_dlp')
+aai = LazyModule('assemblyai')
+genai = LazyModule('google.generativeai')
+genai_client = LazyModule('google.generativeai.client')
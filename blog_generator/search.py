@@ -0,0 +1,98 @@
+"""Ranked full-text search over a user's articles.
+
+On PostgreSQL each post has a stored tsvector (BlogPost.search_vector)
+with a GIN index. On SQLite the same role is played by an FTS5 table,
+blog_generator_blogpost_fts, with one row per post (rowid = post id).
+Both are created by migration 0012, and index_posts() refreshes them
+whenever a post is saved. Code that writes posts with update() or
+bulk_update() has to call it too.
+
+Titles weigh more than article text in the ranking.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F
+
+FTS_TABLE = 'blog_generator_blogpost_fts'
+SEARCH_CONFIG = 'english'
+
+# Relative weight of a title match over an article text match in SQLite's bm25().
+TITLE_WEIGHT = 10.0
+
+RESULT_FIELDS = ('id', 'youtube_title', 'created_at', 'excerpt', 'reading_time')
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def _vendor(queryset):
+    return connections[queryset.db].vendor
+
+
+def search_vector():
+    return (
+        SearchVector('youtube_title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('plain_text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def index_posts(posts):
+    """Refresh the search index entries of the given posts (a BlogPost queryset)."""
+    if _vendor(posts) == 'postgresql':
+        posts.update(search_vector=search_vector())
+        return
+    rows = list(posts.values_list('id', 'youtube_title', 'plain_text'))
+    remove_posts(posts.db, [row[0] for row in rows])
+    with connections[posts.db].cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, youtube_title, plain_text) VALUES (%s, %s, %s)', rows)
+
+
+def remove_posts(using, post_ids):
+    """Drop deleted posts from the SQLite FTS table; PostgreSQL needs nothing."""
+    if not post_ids or connections[using].vendor == 'postgresql':
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', post_ids)
+
+
+def fts5_query(query):
+    """Turn user input into an FTS5 query: every word must match, the last one as a prefix."""
+    terms = _TERM_RE.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_posts(posts, query, page, page_size):
+    """Return one page of `posts` matching `query`, best match first, and whether another page follows."""
+    offset = (page - 1) * page_size
+    if _vendor(posts) == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        results = list(
+            posts
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-created_at')
+            .values(*RESULT_FIELDS)[offset:offset + page_size + 1]
+        )
+    else:
+        match = fts5_query(query)
+        if match is None:
+            return [], False
+        results = list(
+            posts
+            .extra(
+                tables=[FTS_TABLE],
+                where=[f'{FTS_TABLE}.rowid = blog_generator_blogpost.id', f'{FTS_TABLE} MATCH %s'],
+                params=[match],
+                select={'rank': f'bm25({FTS_TABLE}, %s, 1.0)'},
+                select_params=[TITLE_WEIGHT],
+                order_by=['rank', '-created_at'],
+            )
+            .values(*RESULT_FIELDS)[offset:offset + page_size + 1]
+        )
+    return results[:page_size], len(results) > page_size
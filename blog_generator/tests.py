@@ -1,3 +1,1950 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import smtplib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import urlparse
 
-# Create your tests here.
+import assemblyai as aai
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import async_pipeline, captions, clients, db_router, jobs, limits, metrics, outbox, pipeline, postprocess, video_cache
+from .fake_backends import FakeAssemblyAI, FakeSMTPServer
+from .models import (
+    BackendSlot, BlogPost, GenerationJob, OutgoingEmail, Profile, Transcript, VideoCacheEntry, VideoCacheLease, hash_reset_token,
+)
+
+
+# Jobs run on threads inside each test's transaction, where they would wait
+# on the database cache rows the test itself has locked, so the tests use a
+# local-memory cache. SharedCacheTests covers the database cache. For the
+# same reason arun_job runs its stages on the test's thread, which can see
+# the test's rows. AsyncPipelineTests covers the stage threads.
+_module_settings = override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    BLOG_WORKER_THREADS=0,
+)
+DATABASE_CACHES = {
+    'default': {'BACKEND': 'blog_generator.cache_backends.DatabaseCache', 'LOCATION': 'blog_cache'},
+}
+
+
+def setUpModule():
+    _module_settings.enable()
+
+
+def tearDownModule():
+    _module_settings.disable()
+
+
+def _submitted_transcription():
+    """Stand in for the upload and the result fetch of a transcription the async worker submits."""
+    return mock.patch.multiple(
+        'blog_generator.pipeline',
+        get_video_info=mock.Mock(return_value={'title': 'A Video', 'duration': 60}),
+        submit_transcription=mock.Mock(side_effect=lambda link, *args: f'transcript-{link[-11:]}'),
+        fetch_transcript=mock.Mock(side_effect=lambda transcript_id: (f'Transcript of {transcript_id}.', None)),
+    )
+
+
+def _skip_captions(test_case):
+    """Send jobs straight to the (mocked) audio transcription path."""
+    patcher = mock.patch('blog_generator.pipeline.get_caption_transcript', return_value=None)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+
+
+def _serialize_slot_queries(test_case):
+    """Let one thread at a time take or give back a backend slot.
+
+    SQLite's in-memory test database fails a write that meets another
+    thread's write instead of waiting for it, as other databases do.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    lock = threading.Lock()
+    for name in ['_acquire_slot', '_release_slot']:
+        def serialized(*args, query=getattr(limits, name)):
+            with lock:
+                return query(*args)
+        patcher = mock.patch.object(limits, name, serialized)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+
+
+class GenerationJobTests(TestCase):
+    def setUp(self):
+        _skip_captions(self)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.client.force_login(self.user)
+
+    def _submit(self, link='https://www.youtube.com/watch?v=abc123'):
+        return self.client.post(
+            reverse('generate-blog'),
+            data=json.dumps({'link': link}),
+            content_type='application/json',
+        )
+
+    def test_generate_blog_queues_job_and_returns_immediately(self):
+        with mock.patch('blog_generator.pipeline.transcribe_audio') as transcribe_audio:
+            response = self._submit()
+        self.assertEqual(response.status_code, 202)
+        transcribe_audio.assert_not_called()
+        job = GenerationJob.objects.get(id=response.json()['job_id'])
+        self.assertEqual(job.status, GenerationJob.STATUS_QUEUED)
+        self.assertEqual(job.user, self.user)
+
+    def test_generate_blog_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self._submit().status_code, 401)
+        self.assertFalse(GenerationJob.objects.exists())
+
+    def test_claim_is_exclusive(self):
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/abc123')
+        claimed = jobs.claim_next_job('worker-a')
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual(claimed.status, GenerationJob.STATUS_RUNNING)
+        self.assertIsNone(jobs.claim_next_job('worker-b'))
+
+    @mock.patch('blog_generator.pipeline.generate_blog_from_transcription', return_value='<h1>Title</h1><p>Body.</p>')
+    @mock.patch('blog_generator.pipeline.transcribe_audio', return_value=('Hello world.', None))
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_worker_runs_job_and_status_returns_content(self, *mocks):
+        job_id = self._submit().json()['job_id']
+        jobs.work('test-worker', once=True)
+
+        response = self.client.get(reverse('job-status', args=[job_id]))
+        data = response.json()
+        self.assertEqual(data['status'], GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(data['title'], 'A Video')
+        self.assertEqual(data['content'], '<h1>Title</h1><p>Body.</p>')
+        self.assertTrue(BlogPost.objects.filter(id=data['blog_id'], user=self.user).exists())
+
+    @mock.patch('blog_generator.pipeline.transcribe_audio', side_effect=RuntimeError('boom'))
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_failed_stage_marks_job_failed(self, *mocks):
+        job_id = self._submit().json()['job_id']
+        jobs.work('test-worker', once=True)
+
+        data = self.client.get(reverse('job-status', args=[job_id])).json()
+        self.assertEqual(data['status'], GenerationJob.STATUS_FAILED)
+        self.assertIn('Transcription failed', data['error'])
+        self.assertFalse(BlogPost.objects.exists())
+
+    def test_status_is_private_to_owner(self):
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/abc123')
+        other = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        self.client.force_login(other)
+        response = self.client.get(reverse('job-status', args=[job.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/abc123')
+        jobs.claim_next_job('crashed-worker')
+        GenerationJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_QUEUED)
+
+
+class StreamingGenerationTests(TestCase):
+    def setUp(self):
+        _skip_captions(self)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.client.force_login(self.user)
+
+    @mock.patch('blog_generator.pipeline.stream_blog_from_transcription', return_value=iter(['```html\n<h1>Ti', 'tle</h1><p>Body.</p>```']))
+    @mock.patch('blog_generator.pipeline.transcribe_audio', return_value=('Hello world.', None))
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_streaming_job_saves_post_processed_article(self, *mocks):
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/dQw4w9WgXcQ', stream=True)
+        jobs.work('test-worker', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(job.partial_content, '<h1>Title</h1><p>Body.</p>')
+        self.assertEqual(job.blog_post.generated_content, '<h1>Title</h1><p>Body.</p>')
+
+    async def _events(self, response):
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        events = []
+        for block in body.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    async def test_events_forward_new_text_until_done(self):
+        job = await GenerationJob.objects.acreate(
+            user=self.user,
+            youtube_link='https://youtu.be/dQw4w9WgXcQ',
+            youtube_title='A Video',
+            status=GenerationJob.STATUS_RUNNING,
+            stage='generation',
+            stream=True,
+            partial_content='<h1>Ti',
+        )
+
+        async def worker_progress(_seconds):
+            post = await BlogPost.objects.acreate(user=self.user, youtube_title='A Video', youtube_link=job.youtube_link, generated_content='<h1>Title</h1>')
+            await GenerationJob.objects.filter(id=job.id).aupdate(
+                partial_content='<h1>Title</h1>', status=GenerationJob.STATUS_COMPLETED, blog_post=post
+            )
+
+        await self.async_client.aforce_login(self.user)
+        with mock.patch('blog_generator.views.asyncio.sleep', side_effect=worker_progress):
+            events = await self._events(await self.async_client.get(reverse('job-events', args=[job.id])))
+
+        self.assertEqual([name for name, _ in events], ['stage', 'chunk', 'chunk', 'done'])
+        self.assertEqual(''.join(data['text'] for name, data in events if name == 'chunk'), '<h1>Title</h1>')
+        self.assertEqual(events[-1][1]['content'], '<h1>Title</h1>')
+
+    async def test_events_report_failure(self):
+        job = await GenerationJob.objects.acreate(
+            user=self.user,
+            youtube_link='https://youtu.be/dQw4w9WgXcQ',
+            status=GenerationJob.STATUS_FAILED,
+            error='Failed to generate blog content. Please try again.',
+        )
+        await self.async_client.aforce_login(self.user)
+        events = await self._events(await self.async_client.get(reverse('job-events', args=[job.id])))
+        self.assertEqual(events[-1], ('failed', {'status': 'failed', 'error': job.error}))
+
+    def test_wsgi_clients_poll_instead_of_streaming(self):
+        response = self.client.post(
+            reverse('generate-blog'), data=json.dumps({'link': 'https://youtu.be/dQw4w9WgXcQ', 'stream': True}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(response.json()['stream'])
+        job = GenerationJob.objects.get(id=response.json()['job_id'])
+        self.assertFalse(job.stream)
+        # A stream would hold a WSGI worker thread for the whole job.
+        self.assertEqual(self.client.get(reverse('job-events', args=[job.id])).status_code, 400)
+
+
+class AsyncPipelineTests(TestCase):
+    def setUp(self):
+        _skip_captions(self)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+
+    def test_async_worker_overlaps_waiting_jobs(self):
+        async def slow_transcription(transcript_id):
+            await asyncio.sleep(0.3)
+            return 'completed'
+
+        for i in range(5):
+            jobs.enqueue_job(self.user, f'https://www.youtube.com/watch?v=video{i:06d}')
+
+        with _submitted_transcription(), mock.patch('blog_generator.pipeline.yt_title', return_value='A Video'), \
+                mock.patch('blog_generator.async_pipeline.await_transcript', side_effect=slow_transcription), \
+                mock.patch('blog_generator.async_pipeline.agenerate_blog_from_transcription', mock.AsyncMock(return_value='<p>Body.</p>')):
+            started = time.monotonic()
+            async_to_sync(jobs.awork)('async-worker', concurrency=5, poll_interval=0.01, once=True)
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(
+            GenerationJob.objects.filter(status=GenerationJob.STATUS_COMPLETED).count(), 5
+        )
+        self.assertEqual(BlogPost.objects.count(), 5)
+        # Five 0.3s waits run side by side rather than back to back.
+        self.assertLess(elapsed, 1.2)
+
+    def test_async_job_records_failure(self):
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/dQw4w9WgXcQ')
+        with _submitted_transcription(), mock.patch('blog_generator.pipeline.yt_title', return_value='A Video'), \
+                mock.patch('blog_generator.pipeline.submit_transcription', side_effect=RuntimeError('asr down')):
+            async_to_sync(jobs.awork)('async-worker', poll_interval=0.01, once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertIn('Transcription failed', job.error)
+
+    def test_failed_transcript_fails_the_parked_job(self):
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/dQw4w9WgXcQ')
+        job = jobs.claim_next_job('async-worker')
+        with _submitted_transcription(), mock.patch('blog_generator.pipeline.yt_title', return_value='A Video'), \
+                mock.patch('blog_generator.async_pipeline.await_transcript', mock.AsyncMock(return_value='error')):
+            job = async_to_sync(jobs.arun_job)(job)
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertIn('Transcription failed', job.error)
+
+    @override_settings(BLOG_WORKER_THREADS=2)
+    def test_stages_run_on_worker_threads_that_close_connections(self):
+        threads = []
+        with mock.patch('blog_generator.jobs.close_old_connections') as close_old_connections:
+            async_to_sync(jobs._in_thread(lambda: threads.append(threading.current_thread())))()
+        self.assertIsNot(threads[0], threading.current_thread())
+        self.assertTrue(threads[0].name.startswith('blog-stage'))
+        # Before and after the stage, on the stage's thread.
+        self.assertEqual(close_old_connections.call_count, 2)
+
+    async def test_events_stream_asynchronously_under_asgi(self):
+        job = await GenerationJob.objects.acreate(
+            user=self.user,
+            youtube_link='https://youtu.be/dQw4w9WgXcQ',
+            status=GenerationJob.STATUS_FAILED,
+            error='Failed to get transcript',
+        )
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('job-events', args=[job.id]))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn('event: failed', body)
+
+
+def _fake_audio_file(link, info=None):
+    handle = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
+    handle.write(b'ID3fake-audio')
+    handle.close()
+    return handle.name
+
+
+def _fake_chunk_files(audio_path, windows):
+    paths = []
+    for index, _window in enumerate(windows):
+        handle = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
+        handle.write(f'chunk{index}'.encode())
+        handle.close()
+        paths.append(Path(handle.name))
+    return paths
+
+
+@override_settings(ASSEMBLYAI_API_KEY='test-key')
+@mock.patch('blog_generator.pipeline.get_video_info', return_value={'title': 'A Video', 'duration': 60})
+@mock.patch('blog_generator.pipeline.download_audio', side_effect=_fake_audio_file)
+@mock.patch('blog_generator.pipeline.TRANSCRIPT_POLL_INITIAL_INTERVAL', 0.01)
+# Committed rows, so that the threads that transcribe chunks see the slots.
+class TranscriptionModeTests(TransactionTestCase):
+    WEBHOOK_URL = 'http://testserver/assemblyai-webhook'
+
+    def setUp(self):
+        _skip_captions(self)
+        _serialize_slot_queries(self)
+        self.fake = FakeAssemblyAI(latency=0.05).start()
+        self.addCleanup(self.fake.stop)
+        base_url = mock.patch.object(aai.settings, 'base_url', self.fake.base_url)
+        base_url.start()
+        self.addCleanup(base_url.stop)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+
+    def _deliver_webhooks(self):
+        for url, headers, payload in self.fake.due_webhooks():
+            response = self.client.post(
+                urlparse(url).path, data=json.dumps(payload), content_type='application/json', headers=headers
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_poll_intervals_back_off_to_a_cap(self, *mocks):
+        intervals = pipeline.transcript_poll_intervals()
+        values = [next(intervals) for _ in range(30)]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(values[-1], pipeline.TRANSCRIPT_POLL_MAX_INTERVAL)
+
+    def test_polling_mode_against_fake_server(self, *mocks):
+        text = pipeline.get_transcription('https://youtu.be/dQw4w9WgXcQ')
+        self.assertEqual(text, 'This is a transcript from the fake AssemblyAI server.')
+        self.assertEqual(self.fake.uploads, 1)
+        self.assertGreaterEqual(self.fake.status_requests, 1)
+
+    def test_chunks_overlap_and_snap_to_pauses(self, *mocks):
+        self.assertEqual(pipeline.plan_chunks(250, 100, 10), [(0.0, 100), (90, 200), (190, 250.0)])
+        self.assertEqual(
+            pipeline.plan_chunks(250, 100, 10, silences=[(95.0, 97.0), (150.0, 152.0)]),
+            [(0.0, 96.0), (86.0, 196.0), (186.0, 250.0)],
+        )
+        self.assertEqual(pipeline.plan_chunks(80, 100, 10), [(0.0, 80.0)])
+
+    def test_stitching_drops_words_repeated_in_overlap(self, *mocks):
+        texts = [
+            'Welcome to the show. Today we discuss the history of jaz',
+            'discuss the History of jazz music and its roots.',
+            'music and its roots are in New Orleans.',
+        ]
+        self.assertEqual(
+            pipeline.stitch_transcripts(texts),
+            'Welcome to the show. Today we discuss the History of jazz music and its roots are in New Orleans.',
+        )
+
+    @override_settings(TRANSCRIPTION_CHUNK_THRESHOLD=60, TRANSCRIPTION_CHUNK_SECONDS=30, TRANSCRIPTION_CHUNK_OVERLAP=5)
+    @mock.patch('blog_generator.pipeline.split_audio', side_effect=_fake_chunk_files)
+    @mock.patch('blog_generator.pipeline.detect_silences', return_value=[])
+    def test_long_audio_is_transcribed_in_retried_chunks(self, *mocks):
+        texts = {
+            b'chunk0': 'one two three four five six',
+            b'chunk1': 'four five six seven eight nine ten',
+            b'chunk2': 'eight nine ten eleven twelve',
+        }
+        failures = []
+
+        def fail_once(audio):
+            if audio == b'chunk1' and not failures:
+                failures.append(audio)
+                return True
+            return False
+
+        self.fake.text = texts.get
+        self.fake.fail = fail_once
+        with mock.patch('blog_generator.pipeline.get_video_info', return_value={'title': 'A Video', 'duration': 80}):
+            text = pipeline.get_transcription('https://youtu.be/dQw4w9WgXcQ')
+
+        self.assertEqual(text, 'one two three four five six seven eight nine ten eleven twelve.')
+        # Three chunks plus one retry of the failed chunk, not of the whole video.
+        self.assertEqual(self.fake.uploads, 4)
+
+    @override_settings(ASSEMBLYAI_WEBHOOK_URL=WEBHOOK_URL, ASSEMBLYAI_WEBHOOK_SECRET='s3cret')
+    @mock.patch('blog_generator.pipeline.generate_blog_from_transcription', return_value='<p>Body.</p>')
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_webhook_mode_parks_and_resumes_jobs(self, *mocks):
+        first = jobs.enqueue_job(self.user, 'https://youtu.be/dQw4w9WgXcQ')
+        second = jobs.enqueue_job(self.user, 'https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+        jobs.work('test-worker', once=True)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), (GenerationJob.STATUS_WAITING, GenerationJob.STATUS_WAITING))
+        self.assertEqual(first.transcript_id, second.transcript_id)
+        self.assertEqual(self.fake.uploads, 1)
+        self.assertEqual(self.fake.status_requests, 0)
+
+        time.sleep(self.fake.latency)
+        self._deliver_webhooks()
+        jobs.work('test-worker', once=True)
+
+        self.assertEqual(
+            GenerationJob.objects.filter(status=GenerationJob.STATUS_COMPLETED).count(), 2
+        )
+        self.assertEqual(BlogPost.objects.count(), 2)
+
+    @mock.patch('blog_generator.async_pipeline.agenerate_blog_from_transcription', return_value='<p>Body.</p>')
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_async_worker_polls_parked_jobs_itself(self, *mocks):
+        jobs.enqueue_job(self.user, 'https://youtu.be/dQw4w9WgXcQ')
+        jobs.enqueue_job(self.user, 'https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+        async_to_sync(jobs.awork)('async-worker', poll_interval=0.01, once=True)
+
+        self.assertEqual(
+            GenerationJob.objects.filter(status=GenerationJob.STATUS_COMPLETED).count(), 2
+        )
+        self.assertEqual(BlogPost.objects.count(), 2)
+        # The second job parked on the first one's transcript.
+        self.assertEqual(self.fake.uploads, 1)
+        self.assertGreaterEqual(self.fake.status_requests, 1)
+
+    @override_settings(ASSEMBLYAI_WEBHOOK_SECRET='s3cret')
+    def test_webhook_rejects_wrong_secret(self, *mocks):
+        response = self.client.post(
+            reverse('assemblyai-webhook'),
+            data=json.dumps({'transcript_id': 'abc', 'status': 'completed'}),
+            content_type='application/json',
+            headers={pipeline.WEBHOOK_AUTH_HEADER: 'wrong'},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(ASSEMBLYAI_WEBHOOK_URL=WEBHOOK_URL)
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_lost_webhook_is_recovered_by_polling(self, *mocks):
+        self.fake.fail = True
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/dQw4w9WgXcQ')
+        jobs.work('test-worker', once=True)
+        time.sleep(self.fake.latency)
+
+        self.assertEqual(jobs.check_waiting_jobs(grace=timedelta(0)), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+
+
+class VideoCacheTests(TestCase):
+    VIDEO_ID = 'dQw4w9WgXcQ'
+
+    def setUp(self):
+        _skip_captions(self)
+
+    def test_extract_video_id_normalizes_url_forms(self):
+        links = [
+            f'https://www.youtube.com/watch?v={self.VIDEO_ID}',
+            f'https://youtube.com/watch?v={self.VIDEO_ID}&t=30s&list=PL123',
+            f'https://m.youtube.com/watch?feature=share&v={self.VIDEO_ID}',
+            f'https://youtu.be/{self.VIDEO_ID}?t=30',
+            f'youtu.be/{self.VIDEO_ID}',
+            f'https://www.youtube.com/shorts/{self.VIDEO_ID}',
+            f'https://www.youtube.com/embed/{self.VIDEO_ID}',
+            f'https://music.youtube.com/watch?v={self.VIDEO_ID}',
+        ]
+        for link in links:
+            self.assertEqual(video_cache.extract_video_id(link), self.VIDEO_ID, link)
+
+    def test_extract_video_id_rejects_other_urls(self):
+        self.assertIsNone(video_cache.extract_video_id('https://example.com/watch?v=dQw4w9WgXcQ'))
+        self.assertIsNone(video_cache.extract_video_id('https://www.youtube.com/watch?v=short'))
+        self.assertIsNone(video_cache.extract_video_id(''))
+
+    def test_second_lookup_is_a_hit(self):
+        compute = mock.Mock(return_value='transcript text')
+        self.assertEqual(video_cache.get_or_compute(self.VIDEO_ID, 'transcript', compute), 'transcript text')
+        self.assertEqual(video_cache.get_or_compute(self.VIDEO_ID, 'transcript', compute), 'transcript text')
+        compute.assert_called_once()
+        stats = video_cache.stats()['transcript']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertFalse(VideoCacheLease.objects.exists())
+
+    def test_expired_entries_are_misses(self):
+        video_cache.put(self.VIDEO_ID, 'article', '<p>old</p>')
+        VideoCacheEntry.objects.update(created_at=timezone.now() - timedelta(days=30))
+        self.assertIsNone(video_cache.get(self.VIDEO_ID, 'article'))
+
+    @override_settings(VIDEO_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entry_is_evicted(self):
+        video_cache.put('aaaaaaaaaaa', 'transcript', 'a')
+        video_cache.put('bbbbbbbbbbb', 'transcript', 'b')
+        VideoCacheEntry.objects.filter(video_id='bbbbbbbbbbb').update(last_accessed_at=timezone.now() - timedelta(hours=1))
+        video_cache.get('aaaaaaaaaaa', 'transcript')
+        video_cache.put('ccccccccccc', 'transcript', 'c')
+        self.assertEqual(
+            set(VideoCacheEntry.objects.values_list('video_id', flat=True)),
+            {'aaaaaaaaaaa', 'ccccccccccc'},
+        )
+
+    def test_waits_for_in_flight_computation(self):
+        # Simulate another worker holding the lease and finishing while we wait.
+        VideoCacheLease.objects.create(key=f'{self.VIDEO_ID}:transcript', expires_at=timezone.now() + timedelta(minutes=5))
+        compute = mock.Mock(return_value='duplicate work')
+
+        def leader_finishes(_seconds):
+            video_cache.put(self.VIDEO_ID, 'transcript', 'leader result')
+
+        with mock.patch('blog_generator.video_cache.time.sleep', side_effect=leader_finishes):
+            result = video_cache.get_or_compute(self.VIDEO_ID, 'transcript', compute)
+
+        self.assertEqual(result, 'leader result')
+        compute.assert_not_called()
+        self.assertEqual(video_cache.stats()['transcript']['coalesced'], 1)
+
+    def test_failed_computation_releases_lease(self):
+        with self.assertRaises(RuntimeError):
+            video_cache.get_or_compute(self.VIDEO_ID, 'transcript', mock.Mock(side_effect=RuntimeError('asr down')))
+        self.assertFalse(VideoCacheLease.objects.exists())
+        self.assertIsNone(video_cache.get(self.VIDEO_ID, 'transcript'))
+
+    @mock.patch('blog_generator.pipeline.generate_blog_from_transcription', return_value='<p>Body.</p>')
+    @mock.patch('blog_generator.pipeline.transcribe_audio', return_value=('Hello world.', None))
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_jobs_for_same_video_share_cached_results(self, yt_title, transcribe_audio, generate):
+        user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        jobs.enqueue_job(user, f'https://youtu.be/{self.VIDEO_ID}')
+        jobs.enqueue_job(user, f'https://www.youtube.com/watch?v={self.VIDEO_ID}&t=30')
+        jobs.work('test-worker', once=True)
+
+        self.assertEqual(BlogPost.objects.count(), 2)
+        transcribe_audio.assert_called_once()
+        generate.assert_called_once()
+
+
+class VideoMetadataTests(TestCase):
+    LINK = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    RAW_INFO = {
+        'id': 'dQw4w9WgXcQ',
+        'title': 'A Video',
+        'duration': 212,
+        'webpage_url': LINK,
+        'extractor': 'youtube',
+        'extractor_key': 'Youtube',
+        'format_id': '251',
+        'formats': [
+            {'format_id': '18', 'url': 'https://media.example/18', 'vcodec': 'avc1', 'acodec': 'mp4a'},
+            {'format_id': '251', 'url': 'https://media.example/251', 'vcodec': 'none', 'acodec': 'opus'},
+        ],
+        'thumbnails': [{'url': 'https://img.example/1.jpg'}],
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def test_info_is_trimmed_to_chosen_audio_format(self):
+        info = pipeline._trim_info(self.RAW_INFO)
+        self.assertEqual(info['audio_url'], 'https://media.example/251')
+        self.assertEqual([fmt['format_id'] for fmt in info['formats']], ['251'])
+        self.assertNotIn('thumbnails', info)
+
+    def test_extraction_is_shared_between_title_and_resubmissions(self):
+        with mock.patch('blog_generator.pipeline.get_youtube_video', return_value=self.RAW_INFO) as extract:
+            self.assertEqual(pipeline.yt_title(self.LINK), 'A Video')
+            self.assertEqual(pipeline.yt_title('https://youtu.be/dQw4w9WgXcQ?t=10'), 'A Video')
+        extract.assert_called_once()
+
+    def test_download_reuses_cached_info(self):
+        with mock.patch('blog_generator.pipeline.get_youtube_video', return_value=self.RAW_INFO) as extract:
+            pipeline.yt_title(self.LINK)
+            with mock.patch('blog_generator.pipeline.yt_dlp.YoutubeDL') as youtube_dl, \
+                    mock.patch('pathlib.Path.exists', return_value=True):
+                pipeline.download_audio(self.LINK)
+        extract.assert_called_once()
+        ydl = youtube_dl.return_value.__enter__.return_value
+        ydl.process_ie_result.assert_called_once()
+        self.assertEqual(ydl.process_ie_result.call_args[0][0]['audio_url'], 'https://media.example/251')
+        ydl.download.assert_not_called()
+
+
+AUTO_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.000 align:start position:0%
+today<00:00:00.500><c> we</c><00:00:01.000><c> talk</c>
+
+00:00:02.000 --> 00:00:02.010 align:start position:0%
+today we talk
+
+00:00:02.010 --> 00:00:04.000 align:start position:0%
+today we talk
+about<00:00:02.500><c> C#</c><00:00:03.000><c> &amp;</c><00:00:03.500><c> Rust</c>
+
+00:00:04.000 --> 00:00:06.000 align:start position:0%
+about C# &amp; Rust
+[Music]
+"""
+
+SRV3 = """<?xml version="1.0" encoding="utf-8" ?><timedtext format="3"><body>
+<p t="0" d="2000">Welcome back<s> everyone</s></p>
+<p t="2000" d="2000">[Applause]</p>
+<p t="4000" d="2000">let&#39;s begin</p>
+</body></timedtext>"""
+
+
+class CaptionTests(TestCase):
+    LINK = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    SPEECH = ' '.join(f'word{i}' for i in range(300))
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+
+    def _info(self, tracks):
+        return {'id': 'dQw4w9WgXcQ', 'title': 'A Video', 'duration': 120, 'caption_tracks': tracks}
+
+    def test_manual_subtitles_in_video_language_come_first(self):
+        tracks = captions.select_tracks({
+            'language': 'de',
+            'subtitles': {
+                'en': [{'ext': 'vtt', 'url': 'https://subs/en.vtt'}],
+                'de-DE': [{'ext': 'json3', 'url': 'https://subs/de.json3'}, {'ext': 'vtt', 'url': 'https://subs/de.vtt'}],
+            },
+            'automatic_captions': {
+                'de-orig': [{'ext': 'vtt', 'url': 'https://auto/de.vtt'}, {'ext': 'srv3', 'url': 'https://auto/de.srv3'}],
+                'fr': [{'ext': 'vtt', 'url': 'https://auto/fr.vtt'}],
+            },
+        })
+        self.assertEqual(
+            [(track['kind'], track['lang'], track['ext']) for track in tracks],
+            [('manual', 'de-DE', 'vtt'), ('automatic', 'de-orig', 'srv3'), ('manual', 'en', 'vtt')],
+        )
+
+    def test_vtt_rolling_lines_and_markup_are_removed(self):
+        self.assertEqual(captions.parse_vtt(AUTO_VTT), 'today we talk about C# & Rust')
+
+    def test_srv3_is_parsed(self):
+        self.assertEqual(captions.parse_srv3(SRV3), "Welcome back everyone let's begin")
+
+    def test_sparse_or_repetitive_captions_are_rejected(self):
+        self.assertTrue(captions.is_usable(self.SPEECH, duration=120))
+        self.assertFalse(captions.is_usable(self.SPEECH, duration=3600))
+        self.assertFalse(captions.is_usable('la ' * 300, duration=120))
+
+    @mock.patch('blog_generator.pipeline.generate_blog_from_transcription', return_value='<p>Body.</p>')
+    @mock.patch('blog_generator.pipeline.transcribe_audio')
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_job_uses_captions_without_downloading_audio(self, yt_title, transcribe_audio, generate):
+        track = {'lang': 'en', 'kind': 'manual', 'ext': 'vtt', 'url': 'https://subs/en.vtt'}
+        vtt = f"WEBVTT\n\n00:00:00.000 --> 00:02:00.000\n{self.SPEECH}\n"
+        with mock.patch('blog_generator.pipeline.get_video_info', return_value=self._info([track])), \
+                mock.patch('blog_generator.pipeline.download_captions', return_value=vtt):
+            job = jobs.enqueue_job(self.user, self.LINK)
+            jobs.work('test-worker', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(job.transcript_source, GenerationJob.SOURCE_CAPTIONS)
+        transcribe_audio.assert_not_called()
+        self.assertEqual(generate.call_args[0][0], f'{self.SPEECH}.')
+
+    @mock.patch('blog_generator.pipeline.transcribe_audio', return_value=('Hello world.', None))
+    def test_low_quality_captions_fall_back_to_audio(self, transcribe_audio):
+        track = {'lang': 'en', 'kind': 'automatic', 'ext': 'vtt', 'url': 'https://auto/en.vtt'}
+        vtt = "WEBVTT\n\n00:00:00.000 --> 00:00:02.000\n[Music]\n"
+        with mock.patch('blog_generator.pipeline.get_video_info', return_value=self._info([track])), \
+                mock.patch('blog_generator.pipeline.download_captions', return_value=vtt):
+            self.assertEqual(pipeline.get_transcript(self.LINK), ('Hello world.', 'asr', None))
+        transcribe_audio.assert_called_once()
+
+
+class _SectionModel:
+    """Answers frame and section prompts; earlier chapters take longer."""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.prompts = []
+
+    def _answer(self, prompt):
+        self.prompts.append(prompt)
+        if pipeline.SECTIONS_MARKER in prompt:
+            return 0, f'<h1>Title</h1><p>Intro.</p>\n{pipeline.SECTIONS_MARKER}\n<h2>Conclusion</h2><p>End.</p>'
+        for headline, delay in self.delays.items():
+            if f'roughly: {headline})' in prompt:
+                return delay, f'```html\n<h2>{headline}</h2><p>About {headline}.</p>```'
+        raise AssertionError(prompt)
+
+    def generate_content(self, prompt):
+        delay, text = self._answer(prompt)
+        time.sleep(delay)
+        return SimpleNamespace(text=text)
+
+    async def generate_content_async(self, prompt):
+        delay, text = self._answer(prompt)
+        await asyncio.sleep(delay)
+        return SimpleNamespace(text=text)
+
+
+# Committed rows, so that the threads that write sections see the slots.
+class ChapteredGenerationTests(TransactionTestCase):
+    OUTLINE = {
+        'chapters': [
+            {'start': 0, 'end': 1000, 'headline': 'Origins', 'gist': 'origins', 'summary': 'Where it began.', 'text': 'It began in 1900.'},
+            {'start': 1000, 'end': 2000, 'headline': 'Growth', 'gist': 'growth', 'summary': 'How it grew.', 'text': 'Then it grew.'},
+            {'start': 2000, 'end': 3000, 'headline': 'Today', 'gist': 'today', 'summary': 'Where it is now.', 'text': 'Now it is big.'},
+        ],
+        'entities': ['New Orleans'],
+    }
+    ARTICLE = (
+        '<h1>Title</h1><p>Intro.</p>\n<h2>Origins</h2><p>About Origins.</p>\n<h2>Growth</h2><p>About Growth.</p>\n'
+        '<h2>Today</h2><p>About Today.</p>\n<h2>Conclusion</h2><p>End.</p>'
+    )
+
+    def setUp(self):
+        _serialize_slot_queries(self)
+
+    def test_outline_keeps_each_chapters_words_and_entities(self):
+        word = lambda text, start: SimpleNamespace(text=text, start=start)
+        transcript = SimpleNamespace(
+            words=[word('Jazz', 0), word('began.', 500), word('It', 1000), word('grew.', 1500)],
+            chapters=[
+                SimpleNamespace(start=0, end=1000, headline='Origins', gist='origins', summary='s1'),
+                SimpleNamespace(start=1000, end=2000, headline='Growth', gist='growth', summary='s2'),
+            ],
+            entities=[SimpleNamespace(text='Jazz'), SimpleNamespace(text='Jazz')],
+        )
+        outline = pipeline.build_outline(transcript, offset=60000)
+        self.assertEqual([chapter['text'] for chapter in outline['chapters']], ['Jazz began.', 'It grew.'])
+        self.assertEqual(outline['chapters'][1]['start'], 61000)
+        self.assertEqual(outline['entities'], ['Jazz'])
+        self.assertFalse(pipeline.use_chaptered_generation({'chapters': outline['chapters'][:1], 'entities': []}))
+
+    def test_sections_are_generated_in_parallel_and_assembled_in_order(self):
+        model = _SectionModel({'Origins': 0.3, 'Growth': 0.2, 'Today': 0.1})
+        progress = []
+        with mock.patch('blog_generator.pipeline.get_blog_model', return_value=model), \
+                mock.patch('blog_generator.postprocess.clean_html', wraps=postprocess.clean_html) as clean:
+            started = time.monotonic()
+            article = pipeline.generate_chaptered_blog(self.OUTLINE, on_progress=progress.append)
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(article, self.ARTICLE)
+        # One pass per part (frame head, three sections, frame tail), none over the whole.
+        self.assertEqual(clean.call_count, 5)
+        self.assertEqual(len(model.prompts), 4)
+        self.assertIn('New Orleans', model.prompts[1])
+        self.assertLess(elapsed, 0.55)
+        # Every progress value extends the previous one, as job_events expects.
+        for before, after in zip(progress, progress[1:]):
+            self.assertTrue(after.startswith(before))
+
+    def test_async_sections_match_sync_result(self):
+        model = _SectionModel({'Origins': 0.1, 'Growth': 0.05, 'Today': 0.0})
+        with mock.patch('blog_generator.pipeline.get_blog_model', return_value=model):
+            article = async_to_sync(async_pipeline.agenerate_chaptered_blog)(self.OUTLINE)
+        self.assertEqual(article, self.ARTICLE)
+
+    @mock.patch('blog_generator.pipeline.get_caption_transcript', return_value=None)
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def test_streaming_job_uses_transcript_chapters(self, *mocks):
+        user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        job = jobs.enqueue_job(user, 'https://youtu.be/dQw4w9WgXcQ', stream=True)
+        model = _SectionModel({'Origins': 0, 'Growth': 0, 'Today': 0})
+        with mock.patch('blog_generator.pipeline.transcribe_audio', return_value=('Transcript.', self.OUTLINE)), \
+                mock.patch('blog_generator.pipeline.get_blog_model', return_value=model):
+            jobs.work('test-worker', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.blog_post.generated_content, self.ARTICLE)
+        self.assertIn('<h2>Today</h2>', job.partial_content)
+        self.assertEqual(video_cache.get('dQw4w9WgXcQ', 'outline'), self.OUTLINE)
+
+
+POSTPROCESS_CORPUS = Path(__file__).parent / 'testdata' / 'postprocess'
+
+
+class PostprocessTests(TestCase):
+    def _corpus(self):
+        cases = sorted(POSTPROCESS_CORPUS.glob('*.in.html'))
+        self.assertTrue(cases)
+        for source in cases:
+            expected = source.with_name(source.name.replace('.in.html', '.out.html'))
+            yield source.name, source.read_text(), expected.read_text().rstrip('\n')
+
+    def test_corpus_output_is_stable(self):
+        for name, content, expected in self._corpus():
+            with self.subTest(name):
+                self.assertEqual(postprocess.clean_html(content), expected)
+                self.assertEqual(postprocess.clean_html(expected), expected)
+
+    def test_streamed_chunks_match_one_pass(self):
+        for name, content, expected in self._corpus():
+            rng = random.Random(name)
+            for _ in range(20):
+                processor = postprocess.ArticleProcessor()
+                output, pos = '', 0
+                while pos < len(content):
+                    size = rng.randint(1, 12)
+                    output += processor.feed(content[pos:pos + size])
+                    pos += size
+                output += processor.close()
+                self.assertEqual(output.strip(), expected, name)
+
+
+@override_settings(BLOG_LIST_PAGE_SIZE=2)
+class BlogListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        other = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        BlogPost.objects.create(user=other, youtube_title='Not mine', youtube_link='https://youtu.be/x', generated_content='x')
+        now = timezone.now()
+        self.posts = []
+        for i in range(5):
+            post = BlogPost.objects.create(
+                user=self.user, youtube_title=f'Post {i}', youtube_link='https://youtu.be/x',
+                generated_content=f'<p>Article {i}</p>' + 'y' * 500,
+            )
+            # Two pairs share a timestamp, so pages must split ties by id.
+            BlogPost.objects.filter(id=post.id).update(created_at=now - timedelta(minutes=i // 2))
+            self.posts.append(post)
+        self.client.login(username='alice', password='pw')
+
+    def test_json_pages_walk_every_post_newest_first(self):
+        ids, cursor = [], None
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            data = self.client.get(reverse('blog-list-page'), params).json()
+            self.assertLessEqual(len(data['posts']), 2)
+            ids += [post['id'] for post in data['posts']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = [post.id for post in BlogPost.objects.filter(user=self.user).order_by('-created_at', '-id')]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_list_reads_only_the_start_of_each_article(self):
+        response = self.client.get(reverse('blog-list'))
+
+        articles = response.context['blog_articles']
+        self.assertEqual(len(articles), 2)
+        self.assertNotIn('generated_content', articles[0])
+        self.assertTrue(articles[0]['excerpt'].startswith('Article '))
+        self.assertTrue(response.context['next_cursor'])
+        self.assertNotContains(response, 'Not mine')
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('blog-list-page'), {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BlogPostDerivedFieldsTests(TestCase):
+    CONTENT = '<h1>Title</h1>\n<p>Fish &amp; <strong>chips</strong>.</p><ul><li>one</li></ul>'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+
+    def test_fields_are_derived_on_save(self):
+        post = BlogPost.objects.create(user=self.user, youtube_title='t', youtube_link='https://youtu.be/x', generated_content=self.CONTENT)
+        post.refresh_from_db()
+
+        self.assertEqual(post.plain_text, 'Title\nFish & chips.\none')
+        self.assertEqual(post.excerpt, 'Title Fish & chips. one')
+        self.assertEqual(post.word_count, 5)
+        self.assertEqual(post.reading_time, 1)
+
+        post.generated_content = '<p>' + 'word ' * 450 + '</p>'
+        post.save(update_fields=['generated_content'])
+        post.refresh_from_db()
+        self.assertEqual(post.word_count, 450)
+        self.assertEqual(post.reading_time, 3)
+        self.assertLessEqual(len(post.excerpt), 200)
+
+    def test_backfill_fills_existing_posts_in_batches(self):
+        for i in range(5):
+            BlogPost.objects.create(user=self.user, youtube_title=f't{i}', youtube_link='https://youtu.be/x', generated_content=self.CONTENT)
+        # Rows saved before the fields existed.
+        BlogPost.objects.update(excerpt='', plain_text='', word_count=0, reading_time=0)
+
+        out = io.StringIO()
+        call_command('backfill_blog_fields', batch_size=2, stdout=out)
+
+        self.assertIn('Backfilled 5 post(s)', out.getvalue())
+        self.assertEqual(out.getvalue().count('post(s) updated'), 3)
+        self.assertFalse(BlogPost.objects.filter(word_count=0).exists())
+        self.assertEqual(set(BlogPost.objects.values_list('excerpt', flat=True)), {'Title Fish & chips. one'})
+
+
+@override_settings(BLOG_LIST_PAGE_SIZE=2)
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        other = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        self.body_match = self._post(self.user, 'Cooking at home', '<p>A note on sourdough starters.</p>')
+        self.title_match = self._post(self.user, 'Sourdough basics', '<p>Flour, water and time.</p>')
+        self._post(self.user, 'Gardening', '<p>Tomatoes need sun.</p>')
+        self._post(other, 'Sourdough secrets', '<p>Sourdough sourdough.</p>')
+        self.client.login(username='alice', password='pw')
+
+    def _post(self, user, title, content):
+        return BlogPost.objects.create(user=user, youtube_title=title, youtube_link='https://youtu.be/x', generated_content=content)
+
+    def _search(self, **params):
+        return self.client.get(reverse('blog-search'), params)
+
+    def test_results_are_ranked_and_limited_to_the_user(self):
+        data = self._search(q='sourdough').json()
+
+        self.assertEqual([post['id'] for post in data['posts']], [self.title_match.id, self.body_match.id])
+        self.assertIsNone(data['next_page'])
+
+    def test_last_word_matches_as_prefix(self):
+        data = self._search(q='tomat').json()
+        self.assertEqual([post['title'] for post in data['posts']], ['Gardening'])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.body_match.generated_content = '<p>Nothing about bread here.</p>'
+        self.body_match.save()
+        self.assertEqual([post['id'] for post in self._search(q='sourdough').json()['posts']], [self.title_match.id])
+
+        self.title_match.delete()
+        self.assertEqual(self._search(q='sourdough').json()['posts'], [])
+
+    def test_results_are_paginated(self):
+        for i in range(3):
+            self._post(self.user, f'Bread {i}', '<p>More sourdough.</p>')
+
+        first = self._search(q='sourdough').json()
+        second = self._search(q='sourdough', page=first['next_page']).json()
+        third = self._search(q='sourdough', page=second['next_page']).json()
+
+        ids = [post['id'] for post in first['posts'] + second['posts'] + third['posts']]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertIsNone(third['next_page'])
+
+    def test_query_is_required(self):
+        self.assertEqual(self._search(q='  ').status_code, 400)
+        self.assertEqual(self._search(q='"*').json()['posts'], [])
+
+
+class BlogDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.post = BlogPost.objects.create(
+            user=self.user, youtube_title='Title', youtube_link='https://youtu.be/x', generated_content='<p>First.</p>',
+        )
+        self.url = reverse('blog-details', args=[self.post.id])
+        self.client.login(username='alice', password='pw')
+
+    def test_revalidation_returns_304(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'First.')
+        self.assertIn('private', response['Cache-Control'])
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_rendered_article_is_cached_until_the_post_is_saved(self):
+        self.client.get(self.url)
+        # update() skips save(): neither the cache nor updated_at change.
+        BlogPost.objects.filter(id=self.post.id).update(generated_content='<p>Sneaky.</p>')
+        self.assertContains(self.client.get(self.url), 'First.')
+
+        etag = self.client.get(self.url)['ETag']
+        self.post.generated_content = '<p>Second.</p>'
+        self.post.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Second.')
+
+    def test_missing_deleted_and_foreign_posts_are_404(self):
+        User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        self.client.login(username='bob', password='pw')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.login(username='alice', password='pw')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.post.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('blog-details', args=[999])).status_code, 404)
+
+
+class TranscriptStoreTests(TestCase):
+    TRANSCRIPT = 'Hello world. ' * 200
+    OUTLINE = {'chapters': [{'start': 0, 'end': 1000, 'headline': 'Hi', 'gist': 'hi', 'summary': 'Hi.', 'text': 'Hello world.'}], 'entities': []}
+
+    def setUp(self):
+        _skip_captions(self)
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.client.force_login(self.user)
+
+    def _regenerate(self, post_id):
+        return self.client.post(reverse('regenerate-blog', args=[post_id]), data='{}', content_type='application/json')
+
+    @mock.patch('blog_generator.pipeline.generate_blog_from_transcription', return_value='<p>First draft.</p>')
+    @mock.patch('blog_generator.pipeline.transcribe_audio')
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='A Video')
+    def _generate(self, yt_title, transcribe_audio, generate):
+        transcribe_audio.return_value = (self.TRANSCRIPT, None)
+        cache.set(pipeline._metadata_cache_key('https://youtu.be/abc123'), {'duration': 62.5, 'language': 'en'})
+        jobs.enqueue_job(self.user, 'https://youtu.be/abc123')
+        jobs.work('test-worker', once=True)
+        return BlogPost.objects.get()
+
+    def test_transcript_is_stored_compressed_with_metadata(self):
+        post = self._generate()
+
+        transcript = Transcript.objects.get(blog_post=post)
+        self.assertEqual(transcript.text, self.TRANSCRIPT)
+        self.assertLess(len(transcript.compressed_text), len(self.TRANSCRIPT) // 10)
+        self.assertEqual((transcript.language, transcript.duration, transcript.source), ('en', 62, GenerationJob.SOURCE_ASR))
+        self.assertIsNone(transcript.outline)
+
+        transcript.outline = self.OUTLINE
+        transcript.save()
+        self.assertEqual(Transcript.objects.get(id=transcript.id).outline, self.OUTLINE)
+
+    def test_regenerate_reruns_only_generation(self):
+        post = self._generate()
+
+        response = self._regenerate(post.id)
+        self.assertEqual(response.status_code, 202)
+        # A second request while the first is pending reuses its job.
+        self.assertEqual(self._regenerate(post.id).json()['job_id'], response.json()['job_id'])
+
+        with mock.patch('blog_generator.pipeline.transcribe_audio') as transcribe_audio, \
+                mock.patch('blog_generator.pipeline.generate_blog_from_transcription', return_value='<p>Second draft.</p>') as generate:
+            jobs.work('test-worker', once=True)
+
+        transcribe_audio.assert_not_called()
+        generate.assert_called_once_with(self.TRANSCRIPT)
+        data = self.client.get(reverse('job-status', args=[response.json()['job_id']])).json()
+        self.assertEqual((data['status'], data['blog_id']), (GenerationJob.STATUS_COMPLETED, post.id))
+        self.assertEqual(BlogPost.objects.get().generated_content, '<p>Second draft.</p>')
+
+    def test_async_regenerate_uses_the_stored_outline(self):
+        post = self._generate()
+        Transcript.objects.filter(blog_post=post).update(compressed_outline=zlib.compress(json.dumps(self.OUTLINE).encode()))
+        jobs.enqueue_regeneration(post)
+        job = jobs.claim_next_job('async-worker')
+
+        with mock.patch('blog_generator.pipeline.use_chaptered_generation', return_value=True), \
+                mock.patch('blog_generator.async_pipeline.agenerate_chaptered_blog', return_value='<p>Chaptered.</p>') as generate:
+            job = async_to_sync(jobs.arun_job)(job)
+
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(generate.call_args.args[0], self.OUTLINE)
+        self.assertEqual(BlogPost.objects.get().generated_content, '<p>Chaptered.</p>')
+
+    def test_regenerate_needs_an_owned_post_with_a_transcript(self):
+        post = BlogPost.objects.create(user=self.user, youtube_title='t', youtube_link='https://youtu.be/x', generated_content='<p>x</p>')
+        self.assertEqual(self._regenerate(post.id).status_code, 409)
+
+        other = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self._regenerate(post.id).status_code, 404)
+        self.assertFalse(GenerationJob.objects.exists())
+
+
+class BatchTests(TestCase):
+    PLAYLIST = {
+        '_type': 'playlist',
+        'entries': [
+            {'id': 'video000001', 'url': 'https://www.youtube.com/watch?v=video000001', 'title': 'One'},
+            {'id': 'video000002', 'url': 'https://www.youtube.com/watch?v=video000002', 'title': 'Two'},
+            # A channel lists its tabs as nested playlists.
+            {'_type': 'playlist', 'entries': [
+                {'id': 'video000003', 'url': 'https://www.youtube.com/watch?v=video000003', 'title': 'Three'},
+                {'id': 'video000001', 'url': 'https://www.youtube.com/watch?v=video000001', 'title': 'One'},
+            ]},
+        ],
+    }
+
+    def setUp(self):
+        _skip_captions(self)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.client.force_login(self.user)
+        patcher = mock.patch('blog_generator.pipeline.get_playlist_info', return_value=self.PLAYLIST)
+        self.get_playlist_info = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_links_are_expanded_and_deduplicated(self):
+        videos = pipeline.expand_links([
+            'https://youtu.be/video000002',
+            'https://www.youtube.com/playlist?list=PL1',
+            '',
+        ])
+        self.assertEqual(videos, [
+            ('https://youtu.be/video000002', ''),
+            ('https://www.youtube.com/watch?v=video000001', 'One'),
+            ('https://www.youtube.com/watch?v=video000003', 'Three'),
+        ])
+        self.get_playlist_info.assert_called_once_with('https://www.youtube.com/playlist?list=PL1')
+        self.assertEqual(len(pipeline.expand_links(['https://www.youtube.com/playlist?list=PL1'], limit=2)), 2)
+
+    @mock.patch('blog_generator.pipeline.generate_blog_from_transcription', return_value='<p>Body.</p>')
+    @mock.patch('blog_generator.pipeline.transcribe_audio', return_value=('Hello world.', None))
+    @mock.patch('blog_generator.pipeline.yt_title', return_value='Looked up')
+    def test_batch_endpoint_queues_jobs_and_reports_progress(self, yt_title, *mocks):
+        response = self.client.post(
+            reverse('generate-batch'),
+            data=json.dumps({'links': 'https://www.youtube.com/playlist?list=PL1 https://youtu.be/video000009', 'title': 'Course'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['total'], 4)
+        batch_url = reverse('batch-status', args=[response.json()['batch_id']])
+        self.assertEqual(self.client.get(batch_url).json()['progress']['queued'], 4)
+
+        jobs.work('test-worker', once=True)
+
+        data = self.client.get(batch_url).json()
+        self.assertEqual((data['progress']['completed'], data['progress']['done']), (4, 4))
+        self.assertIsNotNone(data['progress']['videos_per_hour'])
+        # Only the pasted video needed its title looked up.
+        self.assertEqual(yt_title.call_count, 1)
+        self.assertEqual([job['title'] for job in data['jobs']], ['One', 'Two', 'Three', 'Looked up'])
+        self.assertEqual(BlogPost.objects.filter(user=self.user).count(), 4)
+
+        other = User.objects.create_user(username='bob', email='bob@example.com', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(batch_url).status_code, 404)
+
+    def test_empty_batch_is_rejected(self):
+        response = self.client.post(reverse('generate-batch'), data=json.dumps({'links': []}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_links_that_are_not_strings_are_rejected(self):
+        for links in [5, {'a': 'https://youtu.be/dQw4w9WgXcQ'}, ['https://youtu.be/dQw4w9WgXcQ', 5], None]:
+            response = self.client.post(reverse('generate-batch'), data=json.dumps({'links': links}), content_type='application/json')
+            self.assertEqual(response.status_code, 400, links)
+        self.assertFalse(GenerationJob.objects.exists())
+
+    def test_command_runs_batch_with_stage_limits(self):
+        active = {'now': 0, 'peak': 0}
+
+        async def generate(transcription):
+            active['now'] += 1
+            active['peak'] = max(active['peak'], active['now'])
+            await asyncio.sleep(0.05)
+            active['now'] -= 1
+            return '<p>Body.</p>'
+
+        # A job outside the batch is left for the regular workers.
+        outside = jobs.enqueue_job(self.user, 'https://youtu.be/video000009')
+        out = io.StringIO()
+        with _submitted_transcription(), \
+                mock.patch('blog_generator.async_pipeline.await_transcript', mock.AsyncMock(return_value='completed')), \
+                mock.patch('blog_generator.async_pipeline.agenerate_blog_from_transcription', side_effect=generate):
+            call_command(
+                'generate_batch', 'https://www.youtube.com/playlist?list=PL1', user='alice', run=True,
+                concurrency=10, generation_concurrency=1, progress_interval=5, stdout=out,
+            )
+
+        self.assertIn('Queued batch', out.getvalue())
+        self.assertIn('3/3 done', out.getvalue())
+        self.assertIn('videos/hour', out.getvalue())
+        self.assertEqual(active['peak'], 1)
+        outside.refresh_from_db()
+        self.assertEqual(outside.status, GenerationJob.STATUS_QUEUED)
+
+
+@override_settings(ASSEMBLYAI_API_KEY='test-key')
+@mock.patch('blog_generator.pipeline.get_video_info', return_value={'title': 'A Video', 'duration': 60})
+@mock.patch('blog_generator.pipeline.download_audio', side_effect=_fake_audio_file)
+@mock.patch('blog_generator.pipeline.TRANSCRIPT_POLL_INITIAL_INTERVAL', 0.01)
+# Committed rows, so that the burst's threads see the user and the slots.
+class LimitsTests(TransactionTestCase):
+    LIMITS = {'assemblyai': {'concurrency': 2, 'rate': 2, 'burst': 2}, 'gemini': {'concurrency': 2}}
+
+    def setUp(self):
+        _skip_captions(self)
+        _serialize_slot_queries(self)
+        cache.clear()
+        # Allows two uploads at once, like a small AssemblyAI plan.
+        self.fake = FakeAssemblyAI(latency=0.05, max_concurrency=2, max_per_second=10, upload_latency=0.1).start()
+        self.addCleanup(self.fake.stop)
+        base_url = mock.patch.object(aai.settings, 'base_url', self.fake.base_url)
+        base_url.start()
+        self.addCleanup(base_url.stop)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.client.force_login(self.user)
+
+    def _transcribe_burst(self, count=6):
+        def transcribe(i):
+            try:
+                return pipeline.get_transcription(f'https://www.youtube.com/watch?v=video{i:06d}')
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            return list(pool.map(transcribe, range(count)))
+
+    @override_settings(BACKEND_LIMITS=LIMITS)
+    def test_burst_stays_within_provider_limits(self, *mocks):
+        texts = self._transcribe_burst()
+        self.assertEqual(texts, ['This is a transcript from the fake AssemblyAI server.'] * 6)
+        self.assertEqual(self.fake.rejected, 0)
+        self.assertEqual(self.fake.peak_concurrency, 2)
+
+    @mock.patch('blog_generator.limits.retry_delay', return_value=0)
+    def test_burst_without_limiter_is_rate_limited(self, *mocks):
+        with mock.patch('blog_generator.limits.backend', lambda name, slot=True: contextlib.nullcontext()):
+            self._transcribe_burst()
+        self.assertGreater(self.fake.rejected, 0)
+
+    @override_settings(BACKEND_LIMITS=LIMITS, BACKEND_RATE_LIMIT_BACKOFF=0.3)
+    def test_rate_limit_error_holds_off_every_caller(self, *mocks):
+        with self.assertRaises(aai.types.TranscriptError):
+            with limits.backend('gemini'):
+                raise aai.types.TranscriptError('Too Many Requests', 429)
+
+        started = time.monotonic()
+        with limits.backend('gemini'):
+            pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+        limits.report_rate_limited('gemini', 5)
+        with override_settings(BACKEND_WAIT_TIMEOUT=1):
+            with self.assertRaises(limits.BackendBusy) as raised:
+                with limits.backend('gemini'):
+                    pass
+        self.assertGreater(raised.exception.retry_after, 4)
+
+    @override_settings(BACKEND_LIMITS={'gemini': {'concurrency': 2, 'rate': 20, 'burst': 1}})
+    def test_async_callers_share_slots_and_tokens(self, *mocks):
+        active = {'now': 0, 'peak': 0}
+
+        async def call():
+            async with limits.abackend('gemini'):
+                active['now'] += 1
+                active['peak'] = max(active['peak'], active['now'])
+                await asyncio.sleep(0.05)
+                active['now'] -= 1
+
+        async def burst():
+            await asyncio.gather(*(call() for _ in range(6)))
+
+        started = time.monotonic()
+        async_to_sync(burst)()
+        self.assertEqual(active['peak'], 2)
+        # One token up front, then 20 a second.
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    @override_settings(
+        CACHES=DATABASE_CACHES, BACKEND_LIMITS={'gemini': {'concurrency': 1, 'rate': 1, 'burst': 2}},
+        BACKEND_WAIT_TIMEOUT=0.5,
+    )
+    def test_slot_with_the_database_cache(self, *mocks):
+        with limits.backend('gemini'):
+            self.assertNotEqual(BackendSlot.objects.get(backend='gemini').holder, '')
+            with self.assertRaises(limits.BackendBusy):
+                with limits.backend('gemini'):
+                    pass
+        self.assertEqual(BackendSlot.objects.get(backend='gemini').holder, '')
+        cache.clear()
+
+    @override_settings(BACKEND_LIMITS={'gemini': {'concurrency': 1}})
+    def test_expired_slot_goes_to_one_new_holder(self, *mocks):
+        self.assertTrue(limits._acquire_slot('gemini', 'stale'))
+        BackendSlot.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(limits._acquire_slot('gemini', 'new'))
+        self.assertFalse(limits._acquire_slot('gemini', 'other'))
+        # The stale holder finishing late does not free the new holder's slot.
+        limits._release_slot('gemini', 'stale')
+        self.assertEqual(BackendSlot.objects.get().holder, 'new')
+
+    @override_settings(BACKEND_LIMITS={'gemini': {'concurrency': 0, 'rate': 0.01, 'burst': 5}})
+    def test_bucket_started_by_another_process_is_full(self, *mocks):
+        now = time.time()
+        # The other process read its clock a moment later and started the bucket.
+        self.assertEqual(limits._token_wait('gemini', now + 0.5, 5, now), (0, 0))
+
+    @override_settings(USER_MAX_ACTIVE_JOBS=2)
+    def test_user_with_too_many_active_jobs_gets_429(self, *mocks):
+        for i in range(2):
+            jobs.enqueue_job(self.user, f'https://www.youtube.com/watch?v=video{i:06d}')
+        response = self.client.post(
+            reverse('generate-blog'), data=json.dumps({'link': 'https://youtu.be/dQw4w9WgXcQ'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(limits.ACTIVE_JOBS_RETRY_AFTER))
+        self.assertEqual(GenerationJob.objects.count(), 2)
+
+    @override_settings(USER_MAX_ACTIVE_JOBS=0, USER_DAILY_JOB_LIMIT=3)
+    @mock.patch('blog_generator.pipeline.get_playlist_info', return_value=BatchTests.PLAYLIST)
+    def test_daily_limit_counts_expanded_batches(self, *mocks):
+        GenerationJob.objects.create(
+            user=self.user, youtube_link='https://youtu.be/dQw4w9WgXcQ', status=GenerationJob.STATUS_COMPLETED,
+        )
+        response = self.client.post(
+            reverse('generate-batch'),
+            data=json.dumps({'links': 'https://www.youtube.com/playlist?list=PL1'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 429)
+        # The quota frees up a day after the earlier job.
+        self.assertAlmostEqual(int(response['Retry-After']), 24 * 60 * 60, delta=60)
+        self.assertEqual(GenerationJob.objects.count(), 1)
+
+
+def _sample(name, **labels):
+    """Current value of one sample in this process's /metrics output."""
+    line_start = name + metrics._format_labels(tuple(labels.items())) + ' '
+    for line in metrics.render().splitlines():
+        if line.startswith(line_start):
+            return float(line[len(line_start):])
+    return 0
+
+
+# Takes tokens from the gemini bucket in a separate process; prints how many
+# were available at once.
+_TAKE_TOKENS = """
+import django
+django.setup()
+from blog_generator import limits
+print(sum(limits._reserve_token('gemini') == 0 for _ in range(5)))
+"""
+
+
+class SharedCacheTests(TestCase):
+    def test_processes_share_one_token_bucket(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ, 'DJANGO_SETTINGS_MODULE': 'ai_blog_app.settings', 'SECRET_KEY': 'test',
+                'DB_ENGINE': 'django.db.backends.sqlite3', 'DB_NAME': os.path.join(tmp, 'db.sqlite3'),
+                'GEMINI_RATE_PER_SECOND': '0.01', 'GEMINI_RATE_BURST': '5',
+            }
+            env.pop('REDIS_URL', None)
+            subprocess.run(
+                [sys.executable, 'manage.py', 'createcachetable'],
+                cwd=settings.BASE_DIR, env=env, check=True, capture_output=True,
+            )
+            children = [
+                subprocess.Popen([sys.executable, '-c', _TAKE_TOKENS], cwd=settings.BASE_DIR, env=env,
+                                 stdout=subprocess.PIPE, text=True)
+                for _ in range(2)
+            ]
+            taken = [int(child.communicate(timeout=60)[0]) for child in children]
+        # One bucket of five between both processes, not five each.
+        self.assertEqual(sum(taken), 5)
+
+    @override_settings(CACHES=DATABASE_CACHES)
+    def test_incr_keeps_the_expiry(self):
+        cache.set('counter', 1, timeout=None)
+        self.assertEqual(cache.incr('counter', 2), 3)
+        self.assertEqual(async_to_sync(cache.adecr)('counter'), 2)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT expires FROM blog_cache")
+            self.assertEqual(cursor.fetchone()[0].year, 9999)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+
+class _UsageModel:
+    def generate_content(self, prompt):
+        usage = SimpleNamespace(prompt_token_count=120, candidates_token_count=40)
+        return SimpleNamespace(text='<p>Body.</p>', usage_metadata=usage)
+
+
+@override_settings(ASSEMBLYAI_API_KEY='test-key')
+@mock.patch('blog_generator.pipeline.get_video_info', return_value={'title': 'A Video', 'duration': 60})
+@mock.patch('blog_generator.pipeline.download_audio', side_effect=_fake_audio_file)
+@mock.patch('blog_generator.pipeline.TRANSCRIPT_POLL_INITIAL_INTERVAL', 0.01)
+class MetricsTests(TestCase):
+    def setUp(self):
+        _skip_captions(self)
+        self.fake = FakeAssemblyAI(latency=0.05).start()
+        self.addCleanup(self.fake.stop)
+        base_url = mock.patch.object(aai.settings, 'base_url', self.fake.base_url)
+        base_url.start()
+        self.addCleanup(base_url.stop)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+
+    @mock.patch('blog_generator.pipeline.get_blog_model', return_value=_UsageModel())
+    def test_job_stages_are_timed_and_counted(self, *mocks):
+        before = {
+            'upload': _sample('blog_stage_duration_seconds_count', stage='upload'),
+            'tokens': _sample('blog_gemini_tokens_total', kind='output'),
+            'audio': _sample('blog_audio_duration_seconds_total'),
+            'completed': _sample('blog_jobs_total', status='completed'),
+        }
+        job = jobs.enqueue_job(self.user, 'https://youtu.be/dQw4w9WgXcQ')
+        jobs.work('test-worker', once=True)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_COMPLETED)
+        self.assertEqual(set(job.timings), {'upload', 'transcription_wait', 'generation', 'save'})
+        self.assertGreaterEqual(job.timings['transcription_wait'], 0.04)
+        self.assertEqual(_sample('blog_stage_duration_seconds_count', stage='upload'), before['upload'] + 1)
+        self.assertEqual(_sample('blog_gemini_tokens_total', kind='output'), before['tokens'] + 40)
+        self.assertEqual(_sample('blog_audio_duration_seconds_total'), before['audio'] + 60)
+        self.assertEqual(_sample('blog_jobs_total', status='completed'), before['completed'] + 1)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('job-status', args=[job.id])).json()['timings'], job.timings)
+
+    def test_download_and_transcode_are_timed_apart(self, *mocks):
+        before = _sample('blog_stage_duration_seconds_count', stage='transcode')
+        downloaded = _sample('blog_audio_bytes_total', direction='download')
+        (on_progress,), (on_postprocess,) = pipeline._download_hooks()
+        with metrics.collect() as timings:
+            on_progress({'status': 'downloading', 'downloaded_bytes': 512})
+            on_progress({'status': 'finished', 'downloaded_bytes': 1024})
+            on_postprocess({'status': 'started', 'postprocessor': 'ExtractAudio'})
+            on_postprocess({'status': 'finished', 'postprocessor': 'ExtractAudio'})
+            on_postprocess({'status': 'finished', 'postprocessor': 'MoveFiles'})
+        self.assertEqual(set(timings), {'download', 'transcode'})
+        self.assertEqual(_sample('blog_stage_duration_seconds_count', stage='transcode'), before + 1)
+        self.assertEqual(_sample('blog_audio_bytes_total', direction='download'), downloaded + 1024)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_metrics_endpoint_needs_staff_or_token(self, *mocks):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer scrape-token'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE blog_stage_duration_seconds histogram', response.content.decode())
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(BLOG_TIMING_HEADER=True)
+    def test_timing_header_is_optional(self, *mocks):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('blog-list'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[0-9.]+$')
+        with override_settings(BLOG_TIMING_HEADER=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('blog-list')))
+
+
+class ClientsTests(TestCase):
+    def setUp(self):
+        clients.reset()
+        self.addCleanup(clients.reset)
+
+    @override_settings(ASSEMBLYAI_API_KEY='key-one')
+    def test_assemblyai_client_is_shared_until_the_key_changes(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            transcribers = list(pool.map(lambda _: clients.transcriber(), range(8)))
+        self.assertEqual(len({id(transcriber) for transcriber in transcribers}), 1)
+        client = clients.assemblyai_client()
+        self.assertEqual(client.settings.api_key, 'key-one')
+
+        with override_settings(ASSEMBLYAI_API_KEY='key-two'):
+            self.assertEqual(clients.assemblyai_client().settings.api_key, 'key-two')
+            self.assertIsNot(clients.transcriber(), transcribers[0])
+
+    @override_settings(GEMINI_API_KEY='gemini-key')
+    def test_gemini_is_configured_once(self):
+        with mock.patch('blog_generator.clients.genai.configure') as configure:
+            models = [pipeline.get_blog_model() for _ in range(3)]
+        configure.assert_called_once_with(api_key='gemini-key')
+        self.assertIs(models[0], models[2])
+        self.assertEqual(models[0]._generation_config, clients.GENERATION_CONFIG)
+
+    def test_override_swaps_in_fakes(self):
+        model, transcriber = SimpleNamespace(), SimpleNamespace()
+        with clients.override(blog_model=model, transcriber=transcriber):
+            self.assertIs(pipeline.get_blog_model(), model)
+            self.assertIs(clients.transcriber(), transcriber)
+        with self.assertRaises(TypeError):
+            with clients.override(gemini=model):
+                pass
+
+
+class LazySdkTests(TestCase):
+    def test_web_workers_boot_without_the_sdks(self):
+        code = (
+            "import sys, django; django.setup(); import ai_blog_app.urls; "
+            "print(','.join(name for name in ('yt_dlp', 'assemblyai', 'google.generativeai') if name in sys.modules))"
+        )
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), '')
+
+    def test_stand_in_imports_on_first_use(self):
+        from .sdk import LazyModule
+        module = LazyModule('colorsys')
+        self.assertIn('not loaded', repr(module))
+        self.assertEqual(module.rgb_to_hsv(1, 0, 0), (0, 1, 1))
+        with mock.patch.object(module, 'rgb_to_hsv', return_value='patched'):
+            self.assertEqual(module.rgb_to_hsv(1, 0, 0), 'patched')
+        self.assertEqual(module.rgb_to_hsv(1, 0, 0), (0, 1, 1))
+
+
+# Stands in for FFmpeg: writes an Ogg stream for the audio URL, or fails
+# halfway through like an expired YouTube URL.
+_FAKE_FFMPEG = '''#!{python}
+import sys
+url = sys.argv[sys.argv.index('-i') + 1]
+sys.stdout.buffer.write(b'OggS' + b'a' * 200000)
+sys.stdout.flush()
+if 'expired' in url:
+    sys.stderr.write('Server returned 403 Forbidden')
+    sys.exit(1)
+'''
+
+
+@override_settings(ASSEMBLYAI_API_KEY='test-key')
+@mock.patch('blog_generator.pipeline.download_audio', side_effect=_fake_audio_file)
+@mock.patch('blog_generator.pipeline.TRANSCRIPT_POLL_INITIAL_INTERVAL', 0.01)
+class AudioStreamingTests(TestCase):
+    def setUp(self):
+        _skip_captions(self)
+        self.uploaded = []
+        self.fake = FakeAssemblyAI(latency=0.05, text=lambda audio: self.uploaded.append(audio) or 'Streamed words.').start()
+        self.addCleanup(self.fake.stop)
+        base_url = mock.patch.object(aai.settings, 'base_url', self.fake.base_url)
+        base_url.start()
+        self.addCleanup(base_url.stop)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media_root = Path(directory.name)
+        ffmpeg = self.media_root / 'ffmpeg'
+        ffmpeg.write_text(_FAKE_FFMPEG.format(python=sys.executable))
+        ffmpeg.chmod(0o755)
+        overrides = override_settings(FFMPEG_BINARY=str(ffmpeg), MEDIA_ROOT=str(self.media_root / 'media'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _info(self, url):
+        info = {'title': 'A Video', 'duration': 60, 'audio_url': url, 'formats': [{'protocol': 'https', 'acodec': 'opus'}]}
+        return mock.patch('blog_generator.pipeline.get_video_info', return_value=info)
+
+    def test_short_video_is_uploaded_straight_from_ffmpeg(self, download_audio, *mocks):
+        uploaded = _sample('blog_audio_bytes_total', direction='upload')
+        with self._info('https://media.example/ok'):
+            text = pipeline.get_transcription('https://youtu.be/dQw4w9WgXcQ')
+        self.assertEqual(text, 'Streamed words.')
+        download_audio.assert_not_called()
+        self.assertEqual(self.uploaded, [b'OggS' + b'a' * 200000])
+        self.assertEqual(_sample('blog_audio_bytes_total', direction='upload'), uploaded + 200004)
+        self.assertFalse((self.media_root / 'media' / 'temp_audio').exists())
+
+    def test_failed_stream_is_not_uploaded_and_falls_back_to_a_download(self, download_audio, *mocks):
+        # The path of the async worker: submit without a webhook, then poll on the event loop.
+        with self._info('https://media.example/expired'):
+            transcript_id = pipeline.submit_transcription('https://youtu.be/dQw4w9WgXcQ')
+        self.assertEqual(async_to_sync(async_pipeline.await_transcript)(transcript_id), 'completed')
+        self.assertEqual(pipeline.fetch_transcript(transcript_id)[0], 'Streamed words.')
+        download_audio.assert_called_once()
+        self.assertEqual(self.uploaded, [b'ID3fake-audio'])
+
+    def test_long_video_is_downloaded_for_chunking(self, *mocks):
+        info = {'audio_url': 'https://media.example/ok', 'formats': [{'protocol': 'https'}]}
+        self.assertTrue(pipeline.can_stream_audio({**info, 'duration': 60}))
+        self.assertFalse(pipeline.can_stream_audio({**info, 'duration': 60 * 60 * 3}))
+        self.assertFalse(pipeline.can_stream_audio({'duration': 60}))
+
+    def test_janitor_removes_only_old_files(self, *mocks):
+        temp_dir = pipeline.get_temp_dir()
+        temp_dir.mkdir(parents=True)
+        old, fresh = temp_dir / 'old.mp3', temp_dir / 'fresh.mp3.part'
+        old.write_bytes(b'audio')
+        fresh.write_bytes(b'audio')
+        os.utime(old, (time.time() - 60 * 60 * 7,) * 2)
+        output = io.StringIO()
+        call_command('clean_temp_audio', stdout=output)
+        self.assertIn('Removed 1 temp audio file(s)', output.getvalue())
+        self.assertEqual(list(temp_dir.iterdir()), [fresh])
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+
+    def test_login_by_email_skips_the_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('login'), {'email': 'alice@example.com', 'password': 'pw'})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.id)
+        user_queries = [query['sql'] for query in queries if 'auth_user' in query['sql']]
+        # The email lookup and the last_login update.
+        self.assertEqual(len(user_queries), 2)
+        self.assertFalse([query for query in queries if 'blog_generator_profile' in query['sql']])
+
+    def test_login_errors(self):
+        response = self.client.post(reverse('login'), {'email': 'alice@example.com', 'password': 'wrong'})
+        self.assertContains(response, 'Invalid credentials')
+        response = self.client.post(reverse('login'), {'email': 'bob@example.com', 'password': 'pw'})
+        self.assertContains(response, 'No account found with this email')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_profile_is_saved_only_when_changed(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertFalse([query for query in queries if 'blog_generator_profile' in query['sql']])
+
+        user.profile.set_reset_token('token', 60)
+        user.save()
+        self.assertEqual(Profile.objects.get(user=user).reset_token_hash, hash_reset_token('token'))
+
+        Profile.objects.filter(user=user).delete()
+        user = User.objects.get(pk=user.pk)
+        user.save()
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+
+    def test_profile_error_is_logged(self):
+        user = User.objects.get(pk=self.user.pk)
+        with mock.patch.object(Profile.objects, 'get_or_create', side_effect=ValueError('broken')), \
+                self.assertLogs(level='ERROR') as logs:
+            user.save()
+        self.assertIn('Error saving profile: broken', logs.output[0])
+
+    def test_email_is_indexed(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'auth_user')
+        self.assertEqual(constraints['auth_user_email_idx']['columns'], ['email'])
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.smtp = FakeSMTPServer().start()
+        self.addCleanup(self.smtp.stop)
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=self.smtp.host, EMAIL_PORT=self.smtp.port, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='', DEFAULT_FROM_EMAIL='blog@example.com',
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(5):
+            outbox.queue_mail(f'Subject {i}', 'Body', [f'user{i}@example.com'])
+        self.assertEqual(outbox.send_batch('test', batch_size=3), (3, 3))
+        self.assertEqual(outbox.send_batch('test', batch_size=3), (2, 2))
+        self.assertEqual(outbox.send_batch('test', batch_size=3), (0, 0))
+        self.assertEqual(self.smtp.connections, 2)
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(self.smtp.messages[0]['to'], ['<user0@example.com>'])
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_SENT).count(), 5)
+
+    def test_failing_message_keeps_the_batch_on_one_connection(self):
+        outbox.queue_mail('First', 'Body', ['a@example.com'])
+        outbox.queue_mail('Bad\nheader', 'Body', ['b@example.com'])
+        outbox.queue_mail('Third', 'Body', ['c@example.com'])
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(outbox.send_batch('test'), (3, 2))
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(len(self.smtp.messages), 2)
+
+    def test_lost_connection_is_reopened_once(self):
+        for i in range(3):
+            outbox.queue_mail(f'Subject {i}', 'Body', [f'user{i}@example.com'])
+        real_send = smtplib.SMTP.sendmail
+        calls = []
+
+        def drop_first(smtp, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                smtp.close()
+                raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+            return real_send(smtp, *args, **kwargs)
+
+        with mock.patch.object(smtplib.SMTP, 'sendmail', drop_first), self.assertLogs(level='ERROR'):
+            self.assertEqual(outbox.send_batch('test'), (3, 2))
+        self.assertEqual(self.smtp.connections, 2)
+
+    def test_failed_reconnect_hands_back_the_rest_of_the_batch(self):
+        for i in range(3):
+            outbox.queue_mail(f'Subject {i}', 'Body', [f'user{i}@example.com'])
+
+        def drop_connection(smtp, *args, **kwargs):
+            smtp.close()
+            self.smtp.stop()
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+        with mock.patch.object(smtplib.SMTP, 'sendmail', drop_connection), self.assertLogs(level='ERROR'):
+            self.assertEqual(outbox.send_batch('test'), (3, 0))
+        first, *rest = OutgoingEmail.objects.order_by('id')
+        self.assertEqual(first.attempts, 1)
+        # Not tried over a connection per message, and due again for any sender.
+        for email in rest:
+            self.assertEqual((email.attempts, email.worker), (0, ''))
+            self.assertLessEqual(email.next_attempt_at, timezone.now())
+
+    @override_settings(EMAIL_TIMEOUT=10)
+    def test_lease_covers_the_batch(self):
+        for i in range(3):
+            outbox.queue_mail(f'Subject {i}', 'Body', [f'user{i}@example.com'])
+        started = timezone.now()
+        email = outbox.claim_due('test', 10)[0]
+        # Connecting and three sends, each allowed four timeouts.
+        lease = email.next_attempt_at - started
+        self.assertAlmostEqual(lease.total_seconds(), 4 * 10 * 4, delta=5)
+
+    def test_message_claimed_by_another_sender_is_skipped(self):
+        outbox.queue_mail('Subject', 'Body', ['a@example.com'])
+        stale = outbox.claim_due('one', 10)
+        # The first sender stalled until its lease ran out and another took over.
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(len(outbox.claim_due('two', 10)), 1)
+        with mock.patch('blog_generator.outbox.claim_due', return_value=stale), self.assertLogs(level='WARNING'):
+            self.assertEqual(outbox.send_batch('one'), (1, 0))
+        self.assertEqual(self.smtp.messages, [])
+        self.assertTrue(OutgoingEmail.objects.get().worker.startswith('two:'))
+
+    def test_failure_is_retried_with_backoff(self):
+        self.smtp.fail_next = 1
+        failing = outbox.queue_mail('First', 'Body', ['a@example.com'])
+        outbox.queue_mail('Second', 'Body', ['b@example.com'])
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(outbox.send_batch('test'), (2, 1))
+        # The 451 left the connection usable for the next message.
+        self.assertEqual(self.smtp.connections, 1)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (OutgoingEmail.STATUS_PENDING, 1))
+        self.assertGreater(failing.next_attempt_at, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(outbox.send_batch('test'), (0, 0))
+
+        OutgoingEmail.objects.filter(pk=failing.pk).update(next_attempt_at=timezone.now())
+        outbox.send_batch('test')
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (OutgoingEmail.STATUS_SENT, 2))
+
+    @override_settings(MAIL_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        self.smtp.stop()
+        email = outbox.queue_mail('Subject', 'Body', ['a@example.com'])
+        with self.assertLogs(level='ERROR'):
+            outbox.send_batch('test')
+            OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            outbox.send_batch('test')
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutgoingEmail.STATUS_FAILED, 2))
+        self.assertTrue(email.last_error)
+
+    def test_claimed_mail_is_not_claimed_again(self):
+        outbox.queue_mail('Subject', 'Body', ['a@example.com'])
+        self.assertEqual(len(outbox.claim_due('one', 10)), 1)
+        self.assertEqual(outbox.claim_due('two', 10), [])
+
+    def test_run_mail_sender_once(self):
+        outbox.queue_mail('Subject', 'Body', ['a@example.com'])
+        call_command('run_mail_sender', once=True)
+        self.assertEqual(len(self.smtp.messages), 1)
+
+
+class PasswordResetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='old')
+
+    def _request_reset(self):
+        with mock.patch('blog_generator.views.get_random_string', return_value='t' * 32):
+            response = self.client.post(reverse('forgot_password'), {'email': 'alice@example.com'})
+        self.assertContains(response, 'Password reset instructions')
+        return 't' * 32
+
+    def test_reset_mail_is_queued_and_token_hashed(self):
+        token = self._request_reset()
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to, ['alice@example.com'])
+        self.assertIn(f'/reset-password/{token}', email.body)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.reset_token_hash, hash_reset_token(token))
+        self.assertNotIn(token, profile.reset_token_hash)
+
+    def test_reset_with_valid_token(self):
+        token = self._request_reset()
+        response = self.client.post(
+            reverse('reset_password', args=[token]), {'password': 'new', 'confirm_password': 'new'},
+        )
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new'))
+        self.assertIsNone(Profile.objects.get(user=self.user).reset_token_hash)
+
+    def test_expired_token_is_rejected_and_cleared(self):
+        token = self._request_reset()
+        Profile.objects.filter(user=self.user).update(reset_token_expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.client.post(
+            reverse('reset_password', args=[token]), {'password': 'new', 'confirm_password': 'new'},
+        )
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('old'))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(Profile.clear_expired_reset_tokens(), 1)
+        self.assertEqual(len(queries), 1)
+        self.assertIsNone(Profile.objects.get(user=self.user).reset_token_hash)
+
+
+def _post_queries(queries):
+    return [query for query in queries if 'blog_generator_blogpost' in query['sql']]
+
+
+class ConnectionSettingsTests(TestCase):
+    def _database_settings(self, module, **env):
+        code = (
+            f"import {module}; from django.conf import settings; "
+            "print(settings.DATABASES['default']['CONN_MAX_AGE'], settings.DATABASES['default'].get('OPTIONS', {}))"
+        )
+        env = {
+            **{name: value for name, value in os.environ.items() if not name.startswith('DB_')},
+            'DJANGO_SETTINGS_MODULE': 'ai_blog_app.settings', 'SECRET_KEY': 'test', **env,
+        }
+        return subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+
+    def test_asgi_does_not_keep_connections(self):
+        self.assertEqual(self._database_settings('ai_blog_app.asgi', DB_ENGINE='django.db.backends.sqlite3'), '0 {}')
+        # Unless told to.
+        self.assertEqual(
+            self._database_settings('ai_blog_app.asgi', DB_ENGINE='django.db.backends.sqlite3', DB_CONN_MAX_AGE='60'),
+            '60 {}',
+        )
+
+    def test_pool_replaces_persistent_connections(self):
+        output = self._database_settings('ai_blog_app.settings', DB_POOL_MAX_SIZE='4', DB_CONN_MAX_AGE='60')
+        self.assertEqual(output, "0 {'pool': {'min_size': 2, 'max_size': 4}}")
+
+
+# Committed rows, so that the replica's connection sees them.
+class ReplicaRoutingTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A second connection to the test database stands in for a replica.
+        # It is added only now, as the test runner checks the models against
+        # every alias in `databases` before any test runs.
+        connections.settings['replica'] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        cls.databases = cls.databases | {'replica'}
+        cls.addClassCleanup(cls._remove_replica)
+
+    @classmethod
+    def _remove_replica(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        replicas = override_settings(DB_REPLICAS=['replica'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        self.addCleanup(db_router._down_until.clear)
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pw')
+        self.post = BlogPost.objects.create(
+            user=self.user, youtube_title='Title', youtube_link='https://youtu.be/x', generated_content='<p>Hi</p>',
+        )
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def _get(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connection) as primary:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return _post_queries(replica), _post_queries(primary)
+
+    def test_read_only_views_read_from_replica(self):
+        urls = [
+            reverse('blog-list'), reverse('blog-list-page'), reverse('blog-search') + '?q=title',
+            reverse('blog-details', args=[self.post.pk]),
+        ]
+        for url in urls:
+            replica, primary = self._get(url)
+            self.assertTrue(replica, url)
+            self.assertFalse(primary, url)
+
+    def test_finished_job_keeps_reads_on_primary(self):
+        job = GenerationJob.objects.create(
+            user=self.user, youtube_link=self.post.youtube_link, status=GenerationJob.STATUS_COMPLETED,
+            blog_post=self.post,
+        )
+        self.client.get(reverse('job-status', args=[job.id]))
+        self.assertIn(db_router.PIN_COOKIE, self.client.cookies)
+        replica, primary = self._get(reverse('blog-list'))
+        self.assertFalse(replica)
+        self.assertTrue(primary)
+
+    def test_forged_or_expired_pin_is_ignored(self):
+        self.client.cookies[db_router.PIN_COOKIE] = '1'
+        replica, primary = self._get(reverse('blog-list'))
+        self.assertTrue(replica)
+        self.assertFalse(primary)
+
+        response = db_router.pin_to_primary(HttpResponse())
+        self.client.cookies[db_router.PIN_COOKIE] = response.cookies[db_router.PIN_COOKIE].value
+        with override_settings(DB_REPLICA_PIN_SECONDS=0):
+            time.sleep(1)
+            replica, primary = self._get(reverse('blog-list'))
+        self.assertTrue(replica)
+
+    def test_unreachable_replica_is_skipped(self):
+        replica = connections['replica']
+        replica.close()
+        with mock.patch.dict(replica.settings_dict, NAME='/nonexistent/replica.sqlite3'):
+            replica.connection = None
+            with self.assertLogs(level='ERROR'):
+                response = self.client.get(reverse('blog-list'))
+            self.assertContains(response, 'Title')
+            # Not retried until DB_REPLICA_RETRY_SECONDS have passed.
+            self.assertEqual(db_router.choose_replica(), db_router.PRIMARY)
+
+    @override_settings(CACHES=DATABASE_CACHES)
+    def test_writes_and_migrations_use_primary(self):
+        router = db_router.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_write(BlogPost), db_router.PRIMARY)
+        self.assertFalse(router.allow_migrate('replica', 'blog_generator'))
+        self.assertIsNone(router.allow_migrate('default', 'blog_generator'))
+        token = db_router._read_alias.set('replica')
+        try:
+            self.assertEqual(router.db_for_read(cache.cache_model_class), db_router.PRIMARY)
+            # A view that reads its own writes back says so with read_from_primary().
+            router.db_for_write(BlogPost)
+            self.assertEqual(router.db_for_read(BlogPost), 'replica')
+        finally:
+            db_router._read_alias.reset(token)
@@ -7,8 +7,18 @@ urlpatterns = [
     path('signup', views.user_signup, name='signup'),
     path('logout', views.user_logout, name='logout'),
     path('generate-blog', views.generate_blog, name='generate-blog'),
+    path('generate-batch', views.generate_batch, name='generate-batch'),
+    path('batches/<int:batch_id>/', views.batch_status, name='batch-status'),
+    path('jobs/<int:job_id>/', views.job_status, name='job-status'),
+    path('jobs/<int:job_id>/events', views.job_events, name='job-events'),
+    path('assemblyai-webhook', views.assemblyai_webhook, name='assemblyai-webhook'),
+    path('cache-stats', views.cache_stats, name='cache-stats'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
     path('blog-list', views.blog_list, name='blog-list'),
+    path('blog-list/page', views.blog_list_page, name='blog-list-page'),
+    path('blog-list/search', views.search_blogs, name='blog-search'),
     path('blog-details/<int:pk>/', views.blog_details, name='blog-details'),
+    path('blog-details/<int:pk>/regenerate', views.regenerate_blog, name='regenerate-blog'),
     path('forgot-password/', views.forgot_password, name='forgot_password'),
     path('reset-password/<str:token>/', views.reset_password, name='reset_password'),
 ]
\ No newline at end of file
@@ -0,0 +1,202 @@
+import logging
+import re
+import time
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CacheCounter, VideoCacheEntry, VideoCacheLease
+
+CACHED_FIELDS = ('transcript', 'article')
+
+_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_HOSTS = ('youtube.com', 'youtube-nocookie.com')
+_PATH_PREFIXES = ('shorts', 'embed', 'live', 'v')
+
+
+def extract_video_id(link):
+    """Return the 11 character YouTube video id for any common URL form, or None."""
+    if not link:
+        return None
+    link = link.strip()
+    if '://' not in link:
+        link = f"https://{link}"
+    parsed = urlparse(link)
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+
+    candidate = ''
+    parts = [part for part in parsed.path.split('/') if part]
+    if host == 'youtu.be':
+        candidate = parts[0] if parts else ''
+    elif host in _YOUTUBE_HOSTS:
+        if parsed.path.rstrip('/') == '/watch':
+            candidate = parse_qs(parsed.query).get('v', [''])[0]
+        elif len(parts) > 1 and parts[0] in _PATH_PREFIXES:
+            candidate = parts[1]
+
+    return candidate if _VIDEO_ID_RE.match(candidate) else None
+
+
+def _ttl():
+    return timedelta(seconds=settings.VIDEO_CACHE_TTL)
+
+
+def _increment(name, amount=1):
+    updated = CacheCounter.objects.filter(name=name).update(value=F('value') + amount)
+    if not updated:
+        try:
+            with transaction.atomic():
+                CacheCounter.objects.create(name=name, value=amount)
+        except IntegrityError:
+            CacheCounter.objects.filter(name=name).update(value=F('value') + amount)
+
+
+def get(video_id, field, count=False):
+    """Return the cached value of `field` for a video, or None on a miss.
+
+    With `count`, the lookup is added to the hit/miss counters.
+    """
+    entry = VideoCacheEntry.objects.filter(
+        video_id=video_id,
+        created_at__gte=timezone.now() - _ttl(),
+    ).values('id', field).first()
+    if not entry or entry[field] is None:
+        if count:
+            _increment(f"{field}_miss")
+        return None
+    if count:
+        _increment(f"{field}_hit")
+    VideoCacheEntry.objects.filter(id=entry['id']).update(last_accessed_at=timezone.now())
+    return entry[field]
+
+
+def put(video_id, field, value):
+    now = timezone.now()
+    updated = VideoCacheEntry.objects.filter(
+        video_id=video_id,
+        created_at__gte=now - _ttl(),
+    ).update(**{field: value, 'last_accessed_at': now})
+    if not updated:
+        # Missing or expired: start a fresh entry so the TTL restarts.
+        VideoCacheEntry.objects.filter(video_id=video_id).delete()
+        try:
+            with transaction.atomic():
+                VideoCacheEntry.objects.create(video_id=video_id, last_accessed_at=now, **{field: value})
+        except IntegrityError:
+            VideoCacheEntry.objects.filter(video_id=video_id).update(**{field: value, 'last_accessed_at': now})
+    evict()
+
+
+def evict():
+    """Drop expired entries, then least recently used ones above the size bound."""
+    removed, _ = VideoCacheEntry.objects.filter(created_at__lt=timezone.now() - _ttl()).delete()
+    overflow = VideoCacheEntry.objects.count() - settings.VIDEO_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale_ids = list(
+            VideoCacheEntry.objects.order_by('last_accessed_at').values_list('id', flat=True)[:overflow]
+        )
+        removed += VideoCacheEntry.objects.filter(id__in=stale_ids).delete()[0]
+    return removed
+
+
+def _acquire_lease(key):
+    now = timezone.now()
+    VideoCacheLease.objects.filter(key=key, expires_at__lt=now).delete()
+    try:
+        with transaction.atomic():
+            VideoCacheLease.objects.create(
+                key=key,
+                expires_at=now + timedelta(seconds=settings.VIDEO_CACHE_LEASE_TIMEOUT),
+            )
+        return True
+    except IntegrityError:
+        return False
+
+
+def release_lease(key):
+    VideoCacheLease.objects.filter(key=key).delete()
+
+
+def claim(video_id, field, waited=False):
+    """One attempt at the lookup of get_or_compute.
+
+    Returns (value, None) on a hit, (None, key) when the caller now holds the
+    lease `key` and must compute the value, or (None, None) while someone
+    else computes it. `waited` says an earlier attempt found it busy.
+    """
+    value = get(video_id, field)
+    if value is None:
+        key = f"{video_id}:{field}"
+        if not _acquire_lease(key):
+            return None, None
+        # Another caller may have finished between the lookup and the lease.
+        value = get(video_id, field)
+        if value is None:
+            _increment(f"{field}_miss")
+            return None, key
+        release_lease(key)
+    _increment(f"{field}_hit")
+    if waited:
+        _increment(f"{field}_coalesced")
+    return value, None
+
+
+def store(video_id, field, value):
+    """Cache a value computed under claim()'s lease; a failure is only logged."""
+    if value:
+        try:
+            put(video_id, field, value)
+        except Exception as e:
+            logging.error(f"Failed to cache {field} for {video_id}: {str(e)}")
+
+
+def get_or_compute(video_id, field, compute, poll_interval=1.0):
+    """Return the cached `field` for a video, computing and storing it on a miss.
+
+    Only one caller at a time computes a given (video, field) pair, across
+    threads and worker processes. Everyone else waits for that result
+    instead of starting a second download or LLM call. If the computing
+    caller fails, the next waiter takes over.
+    """
+    if field not in CACHED_FIELDS:
+        raise ValueError(f"Unknown cache field: {field}")
+    if not video_id:
+        return compute()
+
+    value, key = claim(video_id, field)
+    while value is None and key is None:
+        time.sleep(poll_interval)
+        value, key = claim(video_id, field, waited=True)
+    if key is None:
+        return value
+
+    try:
+        value = compute()
+        store(video_id, field, value)
+        return value
+    finally:
+        release_lease(key)
+
+
+def stats():
+    counters = dict(CacheCounter.objects.values_list('name', 'value'))
+    result = {'entries': VideoCacheEntry.objects.count()}
+    for field in CACHED_FIELDS:
+        hits = counters.get(f"{field}_hit", 0)
+        misses = counters.get(f"{field}_miss", 0)
+        lookups = hits + misses
+        result[field] = {
+            'hits': hits,
+            'misses': misses,
+            'coalesced': counters.get(f"{field}_coalesced", 0),
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        }
+    return result
@@ -4,22 +4,37 @@ from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Substr
+from django.template.defaultfilters import truncatechars
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.conf import settings
+import asyncio
+import base64
 import json
-import yt_dlp
+import logging
 import os
-import assemblyai as aai
-import google.generativeai as genai
 import time
-import logging
-import tempfile
-from google.generativeai import GenerativeModel
-import uuid
-from pathlib import Path
-from .models import BlogPost
-from django.core.mail import send_mail
-from django.utils.crypto import get_random_string
+from datetime import datetime
+from .models import BlogPost, GenerationBatch, GenerationJob, Profile, Transcript, blog_detail_cache_key, hash_reset_token
+from .outbox import queue_mail
+from .jobs import astart_inline_job, enqueue_batch, enqueue_job, enqueue_regeneration, resume_transcript_jobs
+from . import db_router, limits, metrics, pipeline, search, video_cache
+from .db_router import replica_reads
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, get_random_string
+
+def _too_many_requests(message, retry_after=None):
+    response = JsonResponse({'error': message}, status=429)
+    if retry_after:
+        response['Retry-After'] = str(int(retry_after) or 1)
+    return response
 
 # Create your views here.
 @login_required
@@ -27,279 +42,447 @@ def index(request):
     return render(request, 'index.html')
 
 @csrf_exempt
-def generate_blog(request):
+async def generate_blog(request):
     if request.method == 'POST':
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+
         try:
             data = json.loads(request.body)
             yt_link = data['link']
+            stream = bool(data.get('stream', False)) and _can_stream(request)
         except (KeyError, json.JSONDecodeError):
             return JsonResponse({'error': 'Invalid data sent'}, status=400)
 
-        try:
-            # Start with getting the title
-            title = yt_title(yt_link)
-            
-            # Return an initial response to keep the connection alive
-            response = JsonResponse({
-                'status': 'processing',
-                'message': 'Starting download and transcription...',
-                'title': title
-            })
-            response['X-Accel-Buffering'] = 'no'
-            
-            # Get transcript with progress updates
-            try:
-                transcription = get_transcription(yt_link)
-                if not transcription:
-                    return JsonResponse({'error': "Failed to get transcript"}, status=500)
-            except Exception as e:
-                logging.error(f"Transcription failed: {str(e)}")
-                return JsonResponse({
-                    'error': "Transcription failed. Please try again with a shorter video or contact support."
-                }, status=500)
-
-            # Generate blog content
-            try:
-                blog_content = generate_blog_from_transcription(transcription)
-                if not blog_content:
-                    return JsonResponse({'error': "Failed to generate blog article"}, status=500)
-            except Exception as e:
-                logging.error(f"Blog generation failed: {str(e)}")
-                return JsonResponse({
-                    'error': "Failed to generate blog content. Please try again."
-                }, status=500)
-
-            # Save blog article
-            try:
-                new_blog_article = BlogPost.objects.create(
-                    user=request.user,
-                    youtube_title=title,
-                    youtube_link=yt_link,
-                    generated_content=blog_content
-                )
-                new_blog_article.save()
-            except Exception as e:
-                logging.error(f"Failed to save blog: {str(e)}")
-                return JsonResponse({
-                    'error': "Failed to save blog article. Please try again."
-                }, status=500)
+        refusal = await sync_to_async(limits.check_admission)(user)
+        if refusal:
+            return _too_many_requests(*refusal)
 
-            return JsonResponse({'content': blog_content, 'title': title})
-            
+        try:
+            # The pipeline runs in the run_blog_workers processes; the client
+            # polls job_status (or listens on job_events) until it is ready.
+            job = await sync_to_async(enqueue_job)(user, yt_link, stream=stream)
+            if settings.BLOG_ASGI_INLINE_JOBS and isinstance(request, ASGIRequest):
+                # Let this server's event loop run the job instead of a worker.
+                await astart_inline_job(job, f"asgi-{os.getpid()}")
         except Exception as e:
-            logging.error(f"Error in generate_blog: {str(e)}")
+            logging.error(f"Failed to queue blog generation: {str(e)}")
             return JsonResponse({
                 'error': "An unexpected error occurred. Please try again."
             }, status=500)
+
+        return JsonResponse({'job_id': job.id, 'status': job.status, 'stream': job.stream}, status=202)
     else:
         return JsonResponse({'error': 'Invalid request method'}, status=405)
 
-def yt_title(link):
+@csrf_exempt
+async def generate_batch(request):
+    """Queue a job for every video in a playlist, a channel or a list of links."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
     try:
-        info = get_youtube_video(link)
-        return info.get('title', 'Untitled Video')
-    except Exception as e:
-        logging.error(f"Error getting title: {str(e)}")
-        return 'Untitled Video'
-
-def get_temp_filepath():
-    temp_dir = Path(settings.MEDIA_ROOT) / 'temp_audio'
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    return temp_dir / f"{uuid.uuid4()}.mp3"
-
-def download_audio(link):
-    output_path = get_temp_filepath()
-    
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'ffmpeg_location': r"C:\Users\Admin\AppData\Local\Microsoft\WinGet\Links\ffmpeg.exe",
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
-        'outtmpl': str(output_path.with_suffix('')),
-        'quiet': True,
-        # Add options for large file handling
-        'buffersize': 1024 * 1024,  # 1MB buffer size
-        'socket_timeout': 300,  # 5 minutes timeout
-        'retries': 10,  # Number of retries
-        'fragment_retries': 10,
-        'continuedl': True,  # Continue partial downloads
-    }
-    
+        data = json.loads(request.body)
+        links = data['links']
+        if isinstance(links, str):
+            links = links.split()
+        if not isinstance(links, list) or not all(isinstance(link, str) for link in links):
+            raise TypeError('links must be a string or a list of strings')
+        title = str(data.get('title', ''))
+        stream = bool(data.get('stream', False)) and _can_stream(request)
+    except (KeyError, TypeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Invalid data sent'}, status=400)
+
+    # A playlist counts as one video here; the daily limit is checked again
+    # below once it is expanded.
+    refusal = await sync_to_async(limits.check_admission)(user, new_jobs=len(links))
+    if refusal:
+        return _too_many_requests(*refusal)
+
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([link])
-            final_path = output_path.with_suffix('.mp3')
-            if not final_path.exists():
-                raise FileNotFoundError("Audio download failed")
-            return str(final_path)
+        # Listing a playlist is a blocking yt_dlp call. The jobs are left to
+        # the workers (even with BLOG_ASGI_INLINE_JOBS), whose per-stage
+        # limits keep a large batch in check.
+        batch = await sync_to_async(enqueue_batch)(user, links, title=title, stream=stream)
+    except limits.QuotaExceeded as e:
+        return _too_many_requests(str(e), e.retry_after)
+    except limits.BackendBusy as e:
+        return _too_many_requests("The service is busy. Please try again shortly.", e.retry_after)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
-        logging.error(f"Download error: {str(e)}")
-        if output_path.exists():
-            output_path.unlink(missing_ok=True)
-        raise
+        logging.error(f"Failed to queue blog batch: {str(e)}")
+        return JsonResponse({
+            'error': "An unexpected error occurred. Please try again."
+        }, status=500)
+
+    return JsonResponse({'batch_id': batch.id, 'total': await batch.jobs.acount()}, status=202)
 
-def get_transcription(link):
-    audio_path = None
-    max_retries = 3
+def batch_status(request, batch_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    batch = GenerationBatch.objects.filter(id=batch_id, user=request.user).first()
+    if batch is None:
+        return JsonResponse({'error': 'Batch not found'}, status=404)
+
+    jobs = batch.jobs.order_by('id').values('id', 'youtube_link', 'youtube_title', 'status', 'error', 'blog_post_id')
+    return JsonResponse({
+        'batch_id': batch.id,
+        'title': batch.title,
+        'progress': batch.progress(),
+        'jobs': [
+            {
+                'job_id': job['id'],
+                'link': job['youtube_link'],
+                'title': job['youtube_title'],
+                'status': job['status'],
+                'error': job['error'],
+                'blog_id': job['blog_post_id'],
+            }
+            for job in jobs
+        ],
+    })
+
+@csrf_exempt
+async def regenerate_blog(request, pk):
+    """Rewrite a saved article from its stored transcript, without downloading or transcribing again."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
 
     try:
-        audio_path = Path(download_audio(link))
-        if not audio_path.exists():
-            raise FileNotFoundError("Audio file not found")
-            
-        aai.settings.api_key = os.getenv("ASSEMBLYAI_API_KEY")
-        transcriber = aai.Transcriber()
-
-        # Enhanced configuration for better transcription
-        config = aai.TranscriptionConfig(
-            language_detection=True,
-            punctuate=True,
-            format_text=True,
-            content_safety=False,
-            webhook_url=None,
-            speaker_labels=False,
-            auto_chapters=True,  # Enable auto-chapters for better segmentation
-            entity_detection=True  # Better entity recognition
-        )
+        data = json.loads(request.body or '{}')
+        stream = bool(data.get('stream', False)) and _can_stream(request)
+    except (AttributeError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Invalid data sent'}, status=400)
 
-        for attempt in range(max_retries):
-            try:
-                transcript = transcriber.transcribe(
-                    str(audio_path),
-                    config=config
-                )
-                
-                while transcript.status != 'completed':
-                    if transcript.status == 'error':
-                        raise Exception(f"Transcription failed: {transcript.error}")
-                    time.sleep(5)
-                    transcript = transcriber.get_transcript(transcript.id)
-
-                # Verify the transcription is complete and ends with proper punctuation
-                text = transcript.text.strip()
-                if not text.endswith(('.', '!', '?')):
-                    text += '.'
-                
-                return text
+    blog_post = await (
+        BlogPost.objects
+        .filter(id=pk, user=user)
+        .only('id', 'user_id', 'youtube_link', 'youtube_title')
+        .annotate(has_transcript=Exists(Transcript.objects.filter(blog_post=OuterRef('pk'))))
+        .afirst()
+    )
+    if blog_post is None:
+        return JsonResponse({'error': 'Blog post not found'}, status=404)
+    if not blog_post.has_transcript:
+        return JsonResponse({'error': 'No stored transcript for this blog post'}, status=409)
 
-            except Exception as e:
-                logging.error(f"Transcription attempt {attempt + 1} failed: {str(e)}")
-                if attempt == max_retries - 1:
-                    raise
-                time.sleep(2 ** attempt)
-        
+    try:
+        # A second click while a rewrite is pending joins that job.
+        job = await GenerationJob.objects.filter(
+            blog_post=blog_post, regenerate=True,
+            status__in=[GenerationJob.STATUS_QUEUED, GenerationJob.STATUS_RUNNING],
+        ).afirst()
+        if job is None:
+            refusal = await sync_to_async(limits.check_admission)(user)
+            if refusal:
+                return _too_many_requests(*refusal)
+            job = await sync_to_async(enqueue_regeneration)(blog_post, stream=stream)
+            if settings.BLOG_ASGI_INLINE_JOBS and isinstance(request, ASGIRequest):
+                await astart_inline_job(job, f"asgi-{os.getpid()}")
     except Exception as e:
-        logging.error(f"Transcription error: {str(e)}")
-        raise
-    finally:
-        if audio_path and audio_path.exists():
-            try:
-                audio_path.unlink()
-            except OSError:
-                pass
-
-def generate_blog_from_transcription(transcription):
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    
-    model = GenerativeModel('gemini-pro')
-    
-    # Adjusted generation config for more complete and coherent output
-    generation_config = {
-        "temperature": 0.7,
-        "top_p": 0.8,
-        "top_k": 40,
-        "max_output_tokens": 8192  # Ensure we get a complete response
+        logging.error(f"Failed to queue blog regeneration: {str(e)}")
+        return JsonResponse({
+            'error': "An unexpected error occurred. Please try again."
+        }, status=500)
+
+    return JsonResponse({'job_id': job.id, 'status': job.status, 'stream': job.stream}, status=202)
+
+def job_status(request, job_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        job = GenerationJob.objects.select_related('blog_post').get(id=job_id, user=request.user)
+    except GenerationJob.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+
+    payload = {
+        'job_id': job.id,
+        'status': job.status,
+        'stage': job.stage,
+        'title': job.youtube_title,
+        'transcript_source': job.transcript_source,
+        'timings': job.timings,
     }
-    
-    model.generation_config = generation_config
-    
-    prompt = f"""Based on the following transcript from a YouTube video, 
-    write a comprehensive blog article. Format it using HTML tags as follows:
-    
-    1. Use <h1> tags for the main title
-    2. Use <h2> tags for section headings
-    3. Use <strong> tags for bold text (do not use markdown ** symbols)
-    4. Wrap paragraphs in <p> tags
-    5. Throughout the content:
-       - Make important key points bold using <strong> tags
-       - Emphasize significant statistics and numbers using <strong> tags
-       - Highlight crucial phrases and main takeaways using <strong> tags
-       - Make names, dates, and key concepts stand out using <strong> tags
-    
-    IMPORTANT: 
-    - Ensure all sentences are complete
-    - Cover all main points from the transcript
-    - Each section should have a proper conclusion
-    - The article should have a clear introduction and conclusion
-    - Do not use markdown symbols like * or ** for formatting
-    - Do not use # for headings
-    - Use only HTML tags for all formatting
-    - Start directly with the <h1> tag
-    - End with a proper concluding paragraph
-    
-    Here's the transcript:
-    
-    {transcription}
-    
-    Generate the blog article with HTML formatting:"""
-    
+    if job.status == GenerationJob.STATUS_COMPLETED and job.blog_post:
+        payload['content'] = job.blog_post.generated_content
+        payload['blog_id'] = job.blog_post.id
+        # The client's next page views must show the post before the replicas do.
+        return db_router.pin_to_primary(JsonResponse(payload))
+    elif job.status == GenerationJob.STATUS_FAILED:
+        payload['error'] = job.error
+    return JsonResponse(payload)
+
+# How often job_events checks the job row for new output, and how long it
+# stays quiet before sending a keep-alive comment.
+EVENT_POLL_INTERVAL = 0.25
+EVENT_KEEPALIVE_INTERVAL = 15
+
+def _can_stream(request):
+    """Whether job_events may stream to this request's client.
+
+    Under WSGI a stream would hold one of the server's few worker threads
+    for the whole job, so clients poll job_status there instead. The views
+    that start a job answer with the mode the client should use.
+    """
+    return isinstance(request, ASGIRequest)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _job_event_tick(job_id, user_id, state):
+    """Return the SSE messages now due for a job and whether the job is finished."""
+    # Only the text appended since the last event is read from the row.
+    job = (
+        GenerationJob.objects
+        .filter(id=job_id, user_id=user_id)
+        .annotate(new_text=Substr('partial_content', state['sent'] + 1))
+        .values('status', 'stage', 'youtube_title', 'error', 'blog_post_id', 'new_text')
+        .first()
+    )
+    if job is None:
+        return [_sse('failed', {'error': 'Job not found'})], True
+
+    events = []
+    if job['stage'] != state['stage']:
+        state['stage'] = job['stage']
+        events.append(_sse('stage', {'stage': job['stage'], 'title': job['youtube_title']}))
+    if job['new_text']:
+        state['sent'] += len(job['new_text'])
+        events.append(_sse('chunk', {'text': job['new_text']}))
+
+    if job['status'] == GenerationJob.STATUS_COMPLETED:
+        content = BlogPost.objects.filter(id=job['blog_post_id']).values_list('generated_content', flat=True).first()
+        events.append(_sse('done', {
+            'status': job['status'],
+            'title': job['youtube_title'],
+            'content': content,
+            'blog_id': job['blog_post_id'],
+        }))
+        return events, True
+    if job['status'] == GenerationJob.STATUS_FAILED:
+        events.append(_sse('failed', {'status': job['status'], 'error': job['error']}))
+        return events, True
+    return events, False
+
+async def _ajob_event_stream(job_id, user_id):
+    # Django buffers synchronous iterators completely under ASGI, so the
+    # stream has to be an async generator to reach the browser chunk by chunk.
+    state = {'sent': 0, 'stage': None}
+    last_sent_at = time.monotonic()
+    while True:
+        events, finished = await sync_to_async(_job_event_tick)(job_id, user_id, state)
+        for event in events:
+            yield event
+        if finished:
+            return
+        if events:
+            last_sent_at = time.monotonic()
+        elif time.monotonic() - last_sent_at >= EVENT_KEEPALIVE_INTERVAL:
+            yield ': keep-alive\n\n'
+            last_sent_at = time.monotonic()
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+def job_events(request, job_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if not GenerationJob.objects.filter(id=job_id, user=request.user).exists():
+        return JsonResponse({'error': 'Job not found'}, status=404)
+
+    if not _can_stream(request):
+        return JsonResponse({'error': 'Event streams are not available; poll the job status instead'}, status=400)
+
+    response = StreamingHttpResponse(_ajob_event_stream(job_id, request.user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@csrf_exempt
+def assemblyai_webhook(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    secret = settings.ASSEMBLYAI_WEBHOOK_SECRET
+    if secret and not constant_time_compare(request.headers.get(pipeline.WEBHOOK_AUTH_HEADER, ''), secret):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
     try:
-        response = model.generate_content(prompt)
-        content = response.text.strip()
-        
-        # Clean up formatting
-        content = content.replace('**', '')
-        content = content.replace('*', '')
-        content = content.replace('#', '')
-        
-        # Remove code block markers
-        content = content.replace('```html', '').replace('```', '')
-        content = content.replace("'''html", '').replace("'''", '')
-        
-        # Ensure content ends with proper HTML closure
-        if not content.lower().endswith('</p>'):
-            last_paragraph = content.split('</p>')[-1].strip()
-            if last_paragraph:
-                if not last_paragraph.endswith('.'):
-                    last_paragraph += '.'
-                content = content.rstrip() + '</p>'
-        
-        return content.strip()
-    except Exception as e:
-        logging.error(f"Error generating blog content: {str(e)}")
-        raise
+        data = json.loads(request.body)
+        transcript_id = data['transcript_id']
+        status = data['status']
+    except (KeyError, json.JSONDecodeError):
+        return JsonResponse({'error': 'Invalid data sent'}, status=400)
+
+    resumed = resume_transcript_jobs(transcript_id, status)
+    return JsonResponse({'resumed': resumed})
+
+def cache_stats(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse(video_cache.stats())
+
+def prometheus_metrics(request):
+    """This process's pipeline metrics in the Prometheus text format; workers serve their own."""
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(settings.METRICS_TOKEN) and constant_time_compare(authorization, f"Bearer {settings.METRICS_TOKEN}")
+    if not (token_ok or request.user.is_staff):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# Characters of each article's excerpt shown on blog-list.
+BLOG_LIST_EXCERPT_CHARS = 80
 
+def _encode_cursor(post):
+    value = f"{post['created_at'].isoformat()}|{post['id']}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        created_at, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(post_id)
+    except ValueError:
+        return None
+
+def _blog_page(user, cursor=None):
+    """Return one page of a user's posts, newest first, and the cursor of the next page.
+
+    Pages are found by (created_at, id) keyset rather than OFFSET, so each
+    page is an index range scan however deep the user scrolls. Only the
+    columns the list shows are read, never the article itself.
+    """
+    page_size = settings.BLOG_LIST_PAGE_SIZE
+    posts = BlogPost.objects.filter(user=user)
+    if cursor:
+        created_at, post_id = cursor
+        posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id))
+    posts = list(
+        posts
+        .order_by('-created_at', '-id')
+        .values('id', 'youtube_title', 'created_at', 'excerpt', 'reading_time')[:page_size + 1]
+    )
+    next_cursor = _encode_cursor(posts[page_size - 1]) if len(posts) > page_size else None
+    return posts[:page_size], next_cursor
+
+def _list_item(post):
+    return {
+        'id': post['id'],
+        'title': post['youtube_title'],
+        'excerpt': truncatechars(post['excerpt'], BLOG_LIST_EXCERPT_CHARS),
+        'reading_time': post['reading_time'],
+        'created_at': post['created_at'].isoformat(),
+    }
+
+@login_required
+@replica_reads
 def blog_list(request):
-    blog_articles = BlogPost.objects.filter(user=request.user)
-    return render(request, 'all-blogs.html', {'blog_articles': blog_articles})
+    blog_articles, next_cursor = _blog_page(request.user)
+    return render(request, 'all-blogs.html', {'blog_articles': blog_articles, 'next_cursor': next_cursor})
 
+@replica_reads
+def blog_list_page(request):
+    """JSON pages of blog-list for infinite scroll: ?cursor=<next_cursor of the previous page>."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        cursor = _decode_cursor(cursor)
+        if cursor is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    posts, next_cursor = _blog_page(request.user, cursor)
+    return JsonResponse({
+        'posts': [_list_item(post) for post in posts],
+        'next_cursor': next_cursor,
+    })
+
+@replica_reads
+def search_blogs(request):
+    """Ranked full-text search over the user's articles: ?q=<words>&page=<n>."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid page'}, status=400)
+    if not query:
+        return JsonResponse({'error': 'Missing search query'}, status=400)
+
+    posts, has_next = search.search_posts(
+        BlogPost.objects.filter(user=request.user), query, page, settings.BLOG_LIST_PAGE_SIZE,
+    )
+    return JsonResponse({
+        'posts': [_list_item(post) for post in posts],
+        'page': page,
+        'next_page': page + 1 if has_next else None,
+    })
+
+def _blog_etag(post):
+    return f'"post-{post["id"]}-{int(post["updated_at"].timestamp() * 1_000_000)}"'
+
+@login_required
+@replica_reads
 def blog_details(request, pk):
-    blog_article_detail = BlogPost.objects.get(id=pk)
-    if request.user == blog_article_detail.user:
-        return render(request, 'blog-details.html', {'blog_article_detail': blog_article_detail})
-    else:
-        return redirect('/')
+    # The ownership check is part of the lookup: someone else's post is as
+    # missing as a post that does not exist.
+    post = BlogPost.objects.filter(id=pk, user=request.user).values('id', 'updated_at').first()
+    if post is None and db_router.reading_from_replica():
+        # Perhaps just created and not replicated yet.
+        db_router.read_from_primary()
+        post = BlogPost.objects.filter(id=pk, user=request.user).values('id', 'updated_at').first()
+    if post is None:
+        raise Http404('Blog post not found')
+
+    etag = _blog_etag(post)
+    last_modified = post['updated_at'].timestamp()
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # Articles rarely change, so the rendered article is cached; the ETag
+        # check also catches rows changed without a save() (e.g. bulk_update).
+        key = blog_detail_cache_key(pk)
+        cached = cache.get(key)
+        if cached is None or cached['etag'] != etag:
+            blog_article_detail = BlogPost.objects.defer('plain_text', 'search_vector').get(id=pk)
+            cached = {
+                'etag': etag,
+                'html': render_to_string('blog-article.html', {'blog_article_detail': blog_article_detail}),
+            }
+            cache.set(key, cached, settings.BLOG_DETAIL_CACHE_TTL)
+        response = render(request, 'blog-details.html', {'article_html': cached['html'], 'post_id': pk})
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Per-user content: the browser may keep it but must revalidate.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 def user_login(request):
     if request.method == 'POST':
         email = request.POST['email']
         password = request.POST['password']
          
-        try:
-            user = User.objects.get(email=email)
-            user = authenticate(request, username=user.username, password=password)
-            if user is not None:
-                login(request, user)
-                return redirect('/')
-            else:
-                error_message = 'Invalid credentials'
-                return render(request, 'login.html', {'error_message': error_message})
-        except User.DoesNotExist:
+        # One query: EmailBackend finds the user by email and checks the
+        # password together.
+        user = authenticate(request, email=email, password=password)
+        if user is not None:
+            login(request, user)
+            return redirect('/')
+        if User.objects.filter(email=email).exists():
+            error_message = 'Invalid credentials'
+        else:
             error_message = 'No account found with this email'
-            return render(request, 'login.html', {'error_message': error_message})
+        return render(request, 'login.html', {'error_message': error_message})
         
     return render(request, 'login.html')
 
@@ -321,7 +504,6 @@ def user_signup(request):
                     email=email,
                     password=password
                 )
-                user.save()
                 login(request, user)
                 return redirect('/')
             except Exception as e:
@@ -337,80 +519,60 @@ def user_logout(request):
     logout(request)
     return redirect('/')
 
-def get_youtube_video(link, max_retries=3):
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': True,
-    }
-    
-    for attempt in range(max_retries):
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(link, download=False)
-                return info
-        except Exception as e:
-            logging.error(f"Attempt {attempt + 1}/{max_retries} failed: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(2 ** attempt)
-                continue
-            raise
-
 def forgot_password(request):
     if request.method == 'POST':
         email = request.POST.get('email')
-        try:
-            user = User.objects.get(email=email)
-            # Generate token
-            token = get_random_string(32)
-            # Save token to user (you might want to create a separate model for this)
-            user.profile.reset_token = token
-            user.profile.save()
-            
-            # Create reset link
-            reset_link = f"{request.scheme}://{request.get_host()}/reset-password/{token}"
-            
-            # Send email
-            send_mail(
-                'Reset Your Password',
-                f'Click the following link to reset your password: {reset_link}',
-                settings.DEFAULT_FROM_EMAIL,
-                [email],
-                fail_silently=False,
-            )
-            
-            return render(request, 'forgot-password.html', {
-                'success_message': 'Password reset instructions have been sent to your email.'
-            })
-            
-        except User.DoesNotExist:
+        user = User.objects.filter(email=email).order_by('pk').first()
+        if user is None:
             return render(request, 'forgot-password.html', {
                 'error_message': 'No account found with this email address.'
             })
-            
+
+        token = get_random_string(32)
+        # Only a hash of the token is stored, and it expires.
+        profile, _created = Profile.objects.get_or_create(user=user)
+        profile.set_reset_token(token, settings.PASSWORD_RESET_TOKEN_TTL)
+        profile.save(update_fields=['reset_token_hash', 'reset_token_expires_at'])
+
+        reset_link = f"{request.scheme}://{request.get_host()}/reset-password/{token}"
+        # Sent by run_mail_sender, so a slow mail server does not hold up the request.
+        queue_mail(
+            'Reset Your Password',
+            f'Click the following link to reset your password: {reset_link}',
+            [email],
+        )
+
+        return render(request, 'forgot-password.html', {
+            'success_message': 'Password reset instructions have been sent to your email.'
+        })
+
     return render(request, 'forgot-password.html')
 
 def reset_password(request, token):
-    try:
-        user = User.objects.get(profile__reset_token=token)
-        
-        if request.method == 'POST':
-            password = request.POST.get('password')
-            confirm_password = request.POST.get('confirm_password')
-            
-            if password != confirm_password:
-                return render(request, 'reset-password.html', {
-                    'error_message': 'Passwords do not match.'
-                })
-                
-            user.set_password(password)
-            user.profile.reset_token = None
-            user.profile.save()
-            user.save()
-            
-            return redirect('login')
-            
-        return render(request, 'reset-password.html')
-        
-    except User.DoesNotExist:
-        return redirect('login')
\ No newline at end of file
+    profile = (
+        Profile.objects
+        .select_related('user')
+        .filter(reset_token_hash=hash_reset_token(token), reset_token_expires_at__gt=timezone.now())
+        .first()
+    )
+    if profile is None:
+        return redirect('login')
+
+    if request.method == 'POST':
+        password = request.POST.get('password')
+        confirm_password = request.POST.get('confirm_password')
+
+        if password != confirm_password:
+            return render(request, 'reset-password.html', {
+                'error_message': 'Passwords do not match.'
+            })
+
+        user = profile.user
+        user.set_password(password)
+        profile.clear_reset_token()
+        profile.save(update_fields=['reset_token_hash', 'reset_token_expires_at'])
+        user.save()
+
+        return redirect('login')
+
+    return render(request, 'reset-password.html')
\ No newline at end of file